@@ -0,0 +1,350 @@
+"""Local stand-in servers for the OpenAI Responses API and the Ollama /api/chat endpoint.
+
+The servers return synthetic text with configurable latency, token rate and
+error injection, so the real tutor classes can be benchmarked without paying
+for model calls.
+"""
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator
+
+class LatencyProfile:
+	"""Latency, token rate and error behavior of a stand-in server.
+
+	Parameters:
+		first_token_ms: Median delay before the first token, in milliseconds.
+		first_token_sigma: Spread of the log-normal first-token delay (0 makes it fixed).
+		tokens_per_second: Generation speed after the first token.
+		output_tokens: Number of tokens in a tutoring answer.
+		short_output_tokens: Number of tokens in a self-reference answer.
+		error_rate: Probability that a request fails.
+		error_status: HTTP status returned for injected failures.
+		seed: Optional random seed for reproducible runs.
+	"""
+
+	def __init__(self, first_token_ms: float = 300.0, first_token_sigma: float = 0.3, tokens_per_second: float = 80.0,
+				 output_tokens: int = 200, short_output_tokens: int = 8, error_rate: float = 0.0,
+				 error_status: int = 500, seed: int | None = None) -> None:
+		"""Create a profile.
+
+		Parameters:
+			first_token_ms: Median delay before the first token, in milliseconds.
+			first_token_sigma: Spread of the log-normal first-token delay (0 makes it fixed).
+			tokens_per_second: Generation speed after the first token.
+			output_tokens: Number of tokens in a tutoring answer.
+			short_output_tokens: Number of tokens in a self-reference answer.
+			error_rate: Probability that a request fails.
+			error_status: HTTP status returned for injected failures.
+			seed: Optional random seed for reproducible runs.
+		"""
+		if tokens_per_second <= 0:
+			raise ValueError("Token rate must be positive")
+		if not 0.0 <= error_rate <= 1.0:
+			raise ValueError("Error rate must be between 0 and 1")
+		self.first_token_ms: float = first_token_ms
+		self.first_token_sigma: float = first_token_sigma
+		self.tokens_per_second: float = tokens_per_second
+		self.output_tokens: int = output_tokens
+		self.short_output_tokens: int = short_output_tokens
+		self.error_rate: float = error_rate
+		self.error_status: int = error_status
+		self.__random: random.Random = random.Random(seed)
+		self.__lock: threading.Lock = threading.Lock()
+
+	def sample_first_token_delay(self) -> float:
+		"""Return a first-token delay in seconds."""
+		with self.__lock:
+			factor: float = math.exp(self.__random.gauss(0.0, self.first_token_sigma)) if self.first_token_sigma > 0 else 1.0
+		return self.first_token_ms * factor / 1000.0
+
+	def should_fail(self) -> bool:
+		"""Return whether the current request should fail."""
+		with self.__lock:
+			return self.__random.random() < self.error_rate
+
+	def token_interval(self) -> float:
+		"""Return the delay between two generated tokens in seconds."""
+		return 1.0 / self.tokens_per_second
+
+	def to_dict(self) -> dict[str, Any]:
+		"""Return the profile settings for result files."""
+		return {"first_token_ms": self.first_token_ms, "first_token_sigma": self.first_token_sigma,
+				"tokens_per_second": self.tokens_per_second, "output_tokens": self.output_tokens,
+				"short_output_tokens": self.short_output_tokens, "error_rate": self.error_rate,
+				"error_status": self.error_status}
+
+
+def _is_helper_prompt(text: str) -> bool:
+	"""Whether a prompt is one of the short self-reference prompts."""
+	return "Respond ONLY" in text or "Respond only" in text or "Respond with" in text
+
+def _synthetic_tokens(count: int) -> list[str]:
+	"""Return `count` word tokens of filler text."""
+	words: list[str] = ["recursion", "is", "when", "a", "function", "calls", "itself", "to", "solve", "smaller", "problems"]
+	return [(" " if index else "") + words[index % len(words)] for index in range(count)]
+
+def _profile_answer() -> str:
+	"""Return a structured self-reference answer."""
+	return json.dumps({"area_of_knowledge": "Computer science", "tutor_role": "Computer science tutor"})
+
+def _estimate_tokens(text: str) -> int:
+	"""Roughly estimate the number of tokens in a prompt."""
+	return max(1, len(text) // 4)
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+	"""Shared request plumbing for both stand-in servers."""
+	protocol_version: str = "HTTP/1.1"
+	profile: LatencyProfile = LatencyProfile()
+
+	def log_message(self, format: str, *args: Any) -> None:
+		"""Silence per-request logging."""
+		pass
+
+	def _read_json(self) -> dict[str, Any]:
+		"""Read the JSON request body."""
+		length: int = int(self.headers.get("Content-Length", "0"))
+		return json.loads(self.rfile.read(length) or b"{}")
+
+	def _send_json(self, status: int, payload: dict[str, Any]) -> None:
+		"""Send a complete JSON response."""
+		body: bytes = json.dumps(payload).encode("utf-8")
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def _start_chunked(self, content_type: str) -> None:
+		"""Start a chunked streaming response."""
+		self.send_response(200)
+		self.send_header("Content-Type", content_type)
+		self.send_header("Transfer-Encoding", "chunked")
+		self.end_headers()
+
+	def _send_chunk(self, data: bytes) -> None:
+		"""Send one chunk of a streaming response."""
+		self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+		self.wfile.flush()
+
+	def _end_chunked(self) -> None:
+		"""Terminate a chunked streaming response."""
+		self.wfile.write(b"0\r\n\r\n")
+		self.wfile.flush()
+
+	def _generate(self, text_tokens: list[str]) -> Iterator[str]:
+		"""Yield tokens with the configured first-token delay and token rate."""
+		time.sleep(self.profile.sample_first_token_delay())
+		interval: float = self.profile.token_interval()
+		for index, token in enumerate(text_tokens):
+			if index:
+				time.sleep(interval)
+			yield token
+
+	def _answer_tokens(self, prompt: str, structured: bool) -> list[str]:
+		"""Return the tokens of the synthetic answer for a prompt."""
+		if structured:
+			return [_profile_answer()]
+		if _is_helper_prompt(prompt):
+			return _synthetic_tokens(self.profile.short_output_tokens)
+		return _synthetic_tokens(self.profile.output_tokens)
+
+
+class MockOpenAIHandler(_MockHandler):
+	"""Handler speaking the subset of the OpenAI Responses API used by AICore."""
+
+	def do_POST(self) -> None:
+		"""Serve POST /v1/responses."""
+		if not self.path.rstrip("/").endswith("/responses"):
+			self._send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+			return
+		request: dict[str, Any] = self._read_json()
+		if self.profile.should_fail():
+			self._send_json(self.profile.error_status, {"error": {"message": "Injected failure", "type": "server_error"}})
+			return
+		prompt: str = self.__prompt_text(request.get("input", ""))
+		structured: bool = ((request.get("text") or {}).get("format") or {}).get("type") == "json_schema"
+		tokens: list[str] = self._answer_tokens(prompt, structured)
+		input_tokens: int = _estimate_tokens(prompt + str(request.get("instructions", "")))
+		response_id: str = f"resp_{uuid.uuid4().hex}"
+		if not request.get("stream"):
+			text: str = "".join(self._generate(tokens))
+			self._send_json(200, self.__response(response_id, request, text, input_tokens, len(tokens)))
+			return
+		self._start_chunked("text/event-stream")
+		self.__send_event({"type": "response.created", "sequence_number": 0,
+						   "response": self.__response(response_id, request, "", input_tokens, 0, "in_progress")})
+		item_id: str = f"msg_{uuid.uuid4().hex}"
+		generated: list[str] = []
+		for sequence_number, token in enumerate(self._generate(tokens), start=1):
+			generated.append(token)
+			self.__send_event({"type": "response.output_text.delta", "item_id": item_id, "output_index": 0,
+							   "content_index": 0, "delta": token, "logprobs": [], "sequence_number": sequence_number})
+		self.__send_event({"type": "response.completed", "sequence_number": len(tokens) + 1,
+						   "response": self.__response(response_id, request, "".join(generated), input_tokens, len(tokens))})
+		self._end_chunked()
+
+	def __send_event(self, event: dict[str, Any]) -> None:
+		"""Send one server-sent event."""
+		self._send_chunk(f"event: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+
+	@staticmethod
+	def __prompt_text(request_input: Any) -> str:
+		"""Flatten the request input into plain text."""
+		if isinstance(request_input, str):
+			return request_input
+		parts: list[str] = []
+		for item in request_input or []:
+			content: Any = item.get("content", "") if isinstance(item, dict) else ""
+			parts.append(content if isinstance(content, str) else json.dumps(content))
+		return "\n".join(parts)
+
+	@staticmethod
+	def __response(response_id: str, request: dict[str, Any], text: str, input_tokens: int, output_tokens: int,
+				   status: str = "completed") -> dict[str, Any]:
+		"""Build a Response object payload."""
+		output: list[dict[str, Any]] = []
+		if text:
+			output.append({"type": "message", "id": f"msg_{response_id}", "role": "assistant", "status": "completed",
+						   "content": [{"type": "output_text", "text": text, "annotations": []}]})
+		return {"id": response_id, "object": "response", "created_at": time.time(), "status": status,
+				"model": request.get("model", "mock"), "output": output, "parallel_tool_calls": True,
+				"tool_choice": "auto", "tools": [], "previous_response_id": request.get("previous_response_id"),
+				"usage": {"input_tokens": input_tokens, "input_tokens_details": {"cached_tokens": 0},
+						  "output_tokens": output_tokens, "output_tokens_details": {"reasoning_tokens": 0},
+						  "total_tokens": input_tokens + output_tokens}}
+
+
+class MockOllamaHandler(_MockHandler):
+	"""Handler speaking the subset of the Ollama API used by AICore."""
+
+	def do_POST(self) -> None:
+		"""Serve POST /api/chat."""
+		if self.path.rstrip("/") != "/api/chat":
+			self._send_json(404, {"error": "not found"})
+			return
+		request: dict[str, Any] = self._read_json()
+		if self.profile.should_fail():
+			self._send_json(self.profile.error_status, {"error": "injected failure"})
+			return
+		messages: list[dict[str, Any]] = request.get("messages") or []
+		prompt: str = str(messages[-1].get("content", "")) if messages else ""
+		structured: bool = bool(request.get("format"))
+		tokens: list[str] = self._answer_tokens(prompt, structured) if messages else []
+		prompt_tokens: int = sum(_estimate_tokens(str(message.get("content", ""))) for message in messages)
+		started: float = time.perf_counter()
+		if not request.get("stream", True):
+			text: str = "".join(self._generate(tokens))
+			self._send_json(200, self.__chunk(request, text, True, prompt_tokens, len(tokens), started))
+			return
+		self._start_chunked("application/x-ndjson")
+		for token in self._generate(tokens):
+			self._send_chunk((json.dumps(self.__chunk(request, token, False, 0, 0, started)) + "\n").encode("utf-8"))
+		self._send_chunk((json.dumps(self.__chunk(request, "", True, prompt_tokens, len(tokens), started)) + "\n").encode("utf-8"))
+		self._end_chunked()
+
+	@staticmethod
+	def __chunk(request: dict[str, Any], content: str, done: bool, prompt_tokens: int, output_tokens: int,
+				started: float) -> dict[str, Any]:
+		"""Build one chat response chunk."""
+		chunk: dict[str, Any] = {"model": request.get("model", "mock"),
+								 "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+								 "message": {"role": "assistant", "content": content}, "done": done}
+		if done:
+			elapsed_ns: int = int((time.perf_counter() - started) * 1e9)
+			chunk.update({"done_reason": "stop", "total_duration": elapsed_ns, "load_duration": 0,
+						  "prompt_eval_count": prompt_tokens, "prompt_eval_duration": 0,
+						  "eval_count": output_tokens, "eval_duration": elapsed_ns})
+		return chunk
+
+
+class MockServer:
+	"""A stand-in server running on a background thread.
+
+	Parameters:
+		handler: MockOpenAIHandler or MockOllamaHandler.
+		profile: Latency profile of the server.
+		host: Interface to bind to.
+		port: Port to bind to; 0 picks a free port.
+	"""
+
+	@property
+	def url(self) -> str:
+		"""Base URL of the running server."""
+		host, port = self.__server.server_address[:2]
+		return f"http://{host}:{port}"
+
+	def __init__(self, handler: type[_MockHandler], profile: LatencyProfile, host: str = "127.0.0.1", port: int = 0) -> None:
+		"""Bind the server; call start() to begin serving.
+
+		Parameters:
+			handler: MockOpenAIHandler or MockOllamaHandler.
+			profile: Latency profile of the server.
+			host: Interface to bind to.
+			port: Port to bind to; 0 picks a free port.
+		"""
+		handler_class: type[_MockHandler] = type(handler.__name__, (handler,), {"profile": profile})
+		self.__server: ThreadingHTTPServer = ThreadingHTTPServer((host, port), handler_class)
+		self.__server.daemon_threads = True
+		self.__thread: threading.Thread | None = None
+
+	def start(self) -> "MockServer":
+		"""Start serving on a daemon thread."""
+		self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+		self.__thread.start()
+		return self
+
+	def stop(self) -> None:
+		"""Stop serving and release the port."""
+		self.__server.shutdown()
+		self.__server.server_close()
+
+	def __enter__(self) -> "MockServer":
+		return self.start()
+
+	def __exit__(self, *exc_info: Any) -> None:
+		self.stop()
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+	"""Add latency profile options to a command line parser."""
+	parser.add_argument("--first-token-ms", type=float, default=300.0, help="median delay before the first token")
+	parser.add_argument("--first-token-sigma", type=float, default=0.3, help="spread of the log-normal first-token delay")
+	parser.add_argument("--tokens-per-second", type=float, default=80.0, help="generation speed after the first token")
+	parser.add_argument("--output-tokens", type=int, default=200, help="tokens in a tutoring answer")
+	parser.add_argument("--short-output-tokens", type=int, default=8, help="tokens in a self-reference answer")
+	parser.add_argument("--error-rate", type=float, default=0.0, help="probability that a request fails")
+	parser.add_argument("--error-status", type=int, default=500, help="HTTP status of injected failures")
+	parser.add_argument("--seed", type=int, default=None, help="random seed for reproducible runs")
+
+def profile_from_arguments(arguments: argparse.Namespace) -> LatencyProfile:
+	"""Build a LatencyProfile from parsed profile options."""
+	return LatencyProfile(arguments.first_token_ms, arguments.first_token_sigma, arguments.tokens_per_second,
+						  arguments.output_tokens, arguments.short_output_tokens, arguments.error_rate,
+						  arguments.error_status, arguments.seed)
+
+def main(argv: list[str] | None = None) -> None:
+	"""Run one stand-in server in the foreground."""
+	parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Run a local stand-in model server.")
+	parser.add_argument("backend", choices=["openai", "ollama"])
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=0)
+	add_profile_arguments(parser)
+	arguments: argparse.Namespace = parser.parse_args(argv)
+	handler: type[_MockHandler] = MockOpenAIHandler if arguments.backend == "openai" else MockOllamaHandler
+	server: MockServer = MockServer(handler, profile_from_arguments(arguments), arguments.host, arguments.port).start()
+	print(f"Serving {arguments.backend} stand-in at {server.url}", flush=True)
+	try:
+		while True:
+			time.sleep(3600)
+	except KeyboardInterrupt:
+		server.stop()
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,250 @@
+"""Trace replay: drive explain_this with the traffic of a recorded trace, open loop, at the recorded or a scaled rate.
+
+Record a trace by running a tutor with TRACE_PATH set (and TRACE_PAYLOADS=true
+to replay the real questions). Every recorded explanation call becomes one
+explain_this request, sent at its recorded arrival time divided by the scale,
+whether or not earlier requests have finished; requests of one conversation
+go to one tutor, one at a time, like a student waiting for the answer.
+Latency is measured from the scheduled arrival, so time spent waiting for a
+free worker counts. Each scale runs in its own process, against the backend
+configured in the environment or, with --stub, against a local stand-in server.
+
+Example:
+	python benchmarks/replay_trace.py trace.jsonl --backend openai --stub --scales 1 2 4 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, NamedTuple
+from mock_servers import MockOllamaHandler, MockOpenAIHandler, MockServer, add_profile_arguments, profile_from_arguments
+from run_benchmarks import backend_environment
+from tutor_load import PACKAGE_DIRECTORIES, QUESTIONS, load_tutor_class, summarize
+
+BENCHMARK_DIRECTORY: str = os.path.dirname(os.path.abspath(__file__))
+
+class ReplayRequest(NamedTuple):
+	"""One explain_this request of a replay."""
+	offset: float
+	conversation: str
+	question: str
+	recorded_duration: float
+
+
+def question_for(prompt_hash: str, prompt: str | None) -> str:
+	"""Return the question to replay for a recorded prompt.
+
+	Recorded payloads are replayed as they are; the Ollama tutor wraps the
+	question in an instruction prompt, which is unwrapped. Without payloads a
+	stand-in question is derived from the hash, so repeated prompts stay
+	repeated and caches see the recorded hit pattern.
+
+	Parameters:
+		prompt_hash: Recorded hash of the prompt.
+		prompt: Recorded prompt, or None.
+
+	Returns:
+		str: Question for explain_this.
+	"""
+	if prompt:
+		start: int = prompt.find("Question: ")
+		end: int = prompt.rfind("\nExplanation:")
+		return prompt[start + len("Question: "):end] if 0 <= start < end else prompt
+	return f"{QUESTIONS[int(prompt_hash, 16) % len(QUESTIONS)]} ({prompt_hash})"
+
+def load_requests(backend: str, trace_path: str, stages: list[str], limit: int = 0) -> list[ReplayRequest]:
+	"""Read the requests to replay from a trace, with arrivals relative to the first one.
+
+	Parameters:
+		backend: "openai" or "ollama"; its package, already on the path, reads the trace.
+		trace_path: Trace file written by the recorder.
+		stages: Recorded stages replayed as explain_this requests.
+		limit: Largest number of requests replayed (0 for all).
+
+	Returns:
+		list[ReplayRequest]: Requests in order of arrival.
+	"""
+	if backend == "openai":
+		from ai_trace import TraceEntry, read_trace
+	else:
+		from ollama_ai_trace import TraceEntry, read_trace
+	entries: list[TraceEntry] = sorted((entry for entry in read_trace(trace_path) if entry.stage in stages),
+									   key=lambda entry: entry.arrival)
+	if limit > 0:
+		entries = entries[:limit]
+	if not entries:
+		return []
+	first: float = entries[0].arrival
+	return [ReplayRequest(entry.arrival - first, entry.conversation, question_for(entry.prompt_hash, entry.prompt),
+						  entry.duration) for entry in entries]
+
+def replay(backend: str, tutor_class: type, config_class: type, requests: list[ReplayRequest], scale: float,
+		   max_in_flight: int) -> dict[str, Any]:
+	"""Send the requests open loop at `scale` times their recorded rate and measure the results.
+
+	Parameters:
+		backend: "openai" or "ollama".
+		tutor_class: Tutor class of the backend.
+		config_class: Config class of the backend.
+		requests: Requests in order of arrival.
+		scale: Arrival rate multiplier; 2 sends the trace in half the time.
+		max_in_flight: Worker threads, the most requests served at once; later ones wait and their wait counts.
+
+	Returns:
+		dict: Metrics of the replay.
+	"""
+	if scale <= 0:
+		raise ValueError("Scale must be positive")
+	config: Any = config_class()
+	tutors: dict[str, tuple[Any, threading.Lock]] = {}
+	tutors_lock: threading.Lock = threading.Lock()
+	results: list[dict[str, Any]] = []
+	results_lock: threading.Lock = threading.Lock()
+
+	def serve(request: ReplayRequest, due: float) -> None:
+		with tutors_lock:
+			if request.conversation not in tutors:
+				tutors[request.conversation] = (tutor_class(config), threading.Lock())
+			tutor, conversation_lock = tutors[request.conversation]
+		error: str | None = None
+		with conversation_lock:
+			started: float = time.perf_counter()
+			try:
+				tutor.explain_this(request.question)
+			except Exception as exception:
+				error = type(exception).__name__
+		finished: float = time.perf_counter()
+		with results_lock:
+			results.append({"latency": finished - due, "service": finished - started, "wait": started - due,
+							"finished": finished, "error": error})
+
+	lag: float = 0.0
+	started: float = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+		for request in requests:
+			due: float = started + request.offset / scale
+			delay: float = due - time.perf_counter()
+			if delay > 0:
+				time.sleep(delay)
+			lag = max(lag, time.perf_counter() - due)
+			executor.submit(serve, request, due)
+	succeeded: list[dict[str, Any]] = [result for result in results if result["error"] is None]
+	span: float = requests[-1].offset / scale if requests else 0.0
+	elapsed: float = max((result["finished"] for result in results), default=started) - started
+	return {
+		"backend": backend,
+		"scale": scale,
+		"requests": len(results),
+		"errors": len(results) - len(succeeded),
+		"conversations": len(tutors),
+		"offered_rps": round(len(requests) / span, 3) if span > 0 else None,
+		"throughput_rps": round(len(succeeded) / elapsed, 3) if elapsed > 0 else None,
+		"wall_time_s": round(elapsed, 3),
+		"max_dispatch_lag_ms": round(lag * 1000.0, 3),
+		"latency": summarize([result["latency"] for result in succeeded]),
+		"service_time": summarize([result["service"] for result in succeeded]),
+		"queue_wait": summarize([result["wait"] for result in succeeded]),
+		"recorded_latency": summarize([request.recorded_duration for request in requests])
+	}
+
+def run_scale(backend: str, trace_path: str, scale: float, stages: list[str], limit: int, max_in_flight: int,
+			  environment: dict[str, str]) -> dict[str, Any]:
+	"""Replay the trace at one scale in a fresh worker process, so caches and pools start cold every time.
+
+	Returns:
+		dict: Metrics reported by the worker.
+	"""
+	command: list[str] = [sys.executable, os.path.abspath(__file__), trace_path, "--worker", "--backend", backend,
+						  "--scales", str(scale), "--stages", *stages, "--limit", str(limit),
+						  "--max-in-flight", str(max_in_flight)]
+	completed: subprocess.CompletedProcess = subprocess.run(command, env=environment, capture_output=True, text=True)
+	if completed.returncode != 0:
+		raise RuntimeError(f"Replay worker for {backend} at scale {scale} failed:\n{completed.stderr}")
+	return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def add_degradation(runs: list[dict[str, Any]]) -> None:
+	"""Compare every run with the one at the lowest scale: throughput gained per rate multiple and tail latency growth.
+
+	Parameters:
+		runs: Metrics of the runs, updated in place.
+	"""
+	if not runs:
+		return
+	base: dict[str, Any] = min(runs, key=lambda run: run["scale"])
+	for run in runs:
+		factor: float = run["scale"] / base["scale"]
+		throughput: Any = run["throughput_rps"]
+		base_throughput: Any = base["throughput_rps"]
+		run["throughput_efficiency"] = (round(throughput / (base_throughput * factor), 3)
+										if throughput and base_throughput else None)
+		for percentile in ("p95_ms", "p99_ms"):
+			value: Any = run["latency"][percentile]
+			base_value: Any = base["latency"][percentile]
+			run[f"{percentile[:3]}_growth"] = round(value / base_value, 3) if value and base_value else None
+
+def format_run(metrics: dict[str, Any]) -> str:
+	"""Return a one-line summary of a replay."""
+	latency: dict[str, Any] = metrics["latency"]
+	return (f"{metrics['backend']:>6} x{metrics['scale']:<6} offered={metrics['offered_rps']}rps "
+			f"throughput={metrics['throughput_rps']}rps ({metrics.get('throughput_efficiency')} of ideal) "
+			f"p50={latency['p50_ms']}ms p95={latency['p95_ms']}ms p99={latency['p99_ms']}ms "
+			f"(p99 x{metrics.get('p99_growth')}) errors={metrics['errors']}")
+
+def main(argv: list[str] | None = None) -> None:
+	"""Parse arguments and replay the trace at every scale, or at one scale in worker mode."""
+	parser: argparse.ArgumentParser = argparse.ArgumentParser(description=__doc__,
+															  formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("trace", help="trace file recorded with TRACE_PATH")
+	parser.add_argument("--backend", choices=sorted(PACKAGE_DIRECTORIES), default="openai")
+	parser.add_argument("--scales", nargs="+", type=float, default=[1.0, 2.0, 4.0],
+						help="arrival rate multipliers; 1 replays the recorded rate")
+	parser.add_argument("--stages", nargs="+", default=["explain"], help="recorded stages replayed as explain_this requests")
+	parser.add_argument("--limit", type=int, default=0, help="largest number of requests replayed (0 for all)")
+	parser.add_argument("--max-in-flight", type=int, default=256, help="most requests served at once")
+	parser.add_argument("--stub", action="store_true", help="replay against a local stand-in server")
+	parser.add_argument("--output", default=None, help="result file (default: benchmarks/results/replay-<timestamp>.json)")
+	parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+	add_profile_arguments(parser)
+	arguments: argparse.Namespace = parser.parse_args(argv)
+	trace_path: str = os.path.abspath(arguments.trace)
+
+	if arguments.worker:
+		tutor_class, config_class = load_tutor_class(arguments.backend)
+		requests: list[ReplayRequest] = load_requests(arguments.backend, trace_path, arguments.stages, arguments.limit)
+		print(json.dumps(replay(arguments.backend, tutor_class, config_class, requests, arguments.scales[0],
+								arguments.max_in_flight)))
+		return
+
+	runs: list[dict[str, Any]] = []
+	server: MockServer | None = None
+	if arguments.stub:
+		handler: type = MockOpenAIHandler if arguments.backend == "openai" else MockOllamaHandler
+		server = MockServer(handler, profile_from_arguments(arguments)).start()
+	try:
+		environment: dict[str, str] = (backend_environment(arguments.backend, server.url) if server is not None
+									   else dict(os.environ))
+		# The recorder must not append the replayed traffic to the trace being replayed.
+		environment.pop("TRACE_PATH", None)
+		for scale in arguments.scales:
+			runs.append(run_scale(arguments.backend, trace_path, scale, arguments.stages, arguments.limit,
+								  arguments.max_in_flight, environment))
+	finally:
+		if server is not None:
+			server.stop()
+	add_degradation(runs)
+	for run in runs:
+		print(format_run(run))
+	output: str = arguments.output or os.path.join(BENCHMARK_DIRECTORY, "results",
+												   time.strftime("replay-%Y%m%d-%H%M%S") + ".json")
+	os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+	with open(output, "w", encoding="utf-8") as output_file:
+		json.dump({"created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "trace": trace_path,
+				   "stub": arguments.stub, "runs": runs}, output_file, indent=2)
+	print(f"Results written to {output}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,170 @@
+"""Benchmark suite: run the real tutors against local stand-in servers across concurrency levels.
+
+Results are written as JSON, and --compare prints the change of every metric
+against an earlier result file.
+
+Example:
+	python benchmarks/run_benchmarks.py --backends openai ollama --concurrency 1 8 32 --sessions 64
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any
+from mock_servers import (LatencyProfile, MockOllamaHandler, MockOpenAIHandler, MockServer,
+						  add_profile_arguments, profile_from_arguments)
+
+BENCHMARK_DIRECTORY: str = os.path.dirname(os.path.abspath(__file__))
+
+COMPARED_METRICS: list[tuple[str, ...]] = [
+	("latency", "p50_ms"), ("latency", "p95_ms"), ("latency", "p99_ms"),
+	("time_to_first_token", "p50_ms"), ("time_to_first_token", "p95_ms"), ("time_to_first_token", "p99_ms"),
+	("requests_per_second",), ("memory_per_session_bytes",), ("errors",)
+]
+
+def backend_environment(backend: str, server_url: str) -> dict[str, str]:
+	"""Return the environment that points a tutor package at a stand-in server.
+
+	Parameters:
+		backend: "openai" or "ollama".
+		server_url: Base URL of the stand-in server.
+
+	Returns:
+		dict[str, str]: Environment for the load worker process.
+	"""
+	environment: dict[str, str] = dict(os.environ)
+	if backend == "openai":
+		environment.update({"OPENAI_API_KEY": "mock-key", "MODEL_NAME": "mock-model",
+							"OPENAI_BASE_URL": f"{server_url}/v1"})
+	else:
+		environment.update({"MODEL_ID": "mock-model", "TEMPERATURE": "0.7", "OLLAMA_HOST": server_url})
+		environment.setdefault("AMOUNT_BEFORE_SUMMARIZING", "20")
+	return environment
+
+def run_level(backend: str, server_url: str, concurrency: int, sessions: int, questions_per_session: int,
+			  memory_sessions: int) -> dict[str, Any]:
+	"""Run one load worker process and return its metrics.
+
+	Parameters:
+		backend: "openai" or "ollama".
+		server_url: Base URL of the stand-in server.
+		concurrency: Number of sessions running at once.
+		sessions: Total number of sessions.
+		questions_per_session: Number of questions per session.
+		memory_sessions: Number of sessions used for the memory probe.
+
+	Returns:
+		dict: Metrics reported by the worker.
+	"""
+	command: list[str] = [sys.executable, os.path.join(BENCHMARK_DIRECTORY, "tutor_load.py"), backend,
+						  "--concurrency", str(concurrency), "--sessions", str(sessions),
+						  "--questions-per-session", str(questions_per_session),
+						  "--memory-sessions", str(memory_sessions)]
+	completed: subprocess.CompletedProcess = subprocess.run(command, env=backend_environment(backend, server_url),
+															capture_output=True, text=True)
+	if completed.returncode != 0:
+		raise RuntimeError(f"Load worker for {backend} failed:\n{completed.stderr}")
+	return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def run_suite(backends: list[str], concurrency_levels: list[int], sessions: int, questions_per_session: int,
+			  memory_sessions: int, profile: LatencyProfile) -> dict[str, Any]:
+	"""Run every backend at every concurrency level against fresh stand-in servers.
+
+	Parameters:
+		backends: Backends to measure.
+		concurrency_levels: Concurrency levels to measure.
+		sessions: Sessions per level.
+		questions_per_session: Questions per session.
+		memory_sessions: Sessions used for the memory probe.
+		profile: Latency profile of the stand-in servers.
+
+	Returns:
+		dict: Result document with the profile and one entry per run.
+	"""
+	runs: list[dict[str, Any]] = []
+	for backend in backends:
+		handler: type = MockOpenAIHandler if backend == "openai" else MockOllamaHandler
+		with MockServer(handler, profile) as server:
+			for concurrency in concurrency_levels:
+				metrics: dict[str, Any] = run_level(backend, server.url, concurrency, sessions,
+													questions_per_session, memory_sessions)
+				runs.append(metrics)
+				print(format_run(metrics), flush=True)
+	return {"created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "profile": profile.to_dict(),
+			"sessions": sessions, "questions_per_session": questions_per_session, "runs": runs}
+
+def format_run(metrics: dict[str, Any]) -> str:
+	"""Return a one-line summary of a run."""
+	latency: dict[str, Any] = metrics["latency"]
+	first_token: dict[str, Any] = metrics["time_to_first_token"]
+	return (f"{metrics['backend']:>6} c={metrics['concurrency']:<4} "
+			f"p50={latency['p50_ms']}ms p95={latency['p95_ms']}ms p99={latency['p99_ms']}ms "
+			f"ttft50={first_token['p50_ms']}ms rps={metrics['requests_per_second']} "
+			f"errors={metrics['errors']} mem/session={metrics.get('memory_per_session_bytes')}B")
+
+def _metric(run: dict[str, Any], path: tuple[str, ...]) -> Any:
+	"""Return a nested metric of a run, or None."""
+	value: Any = run
+	for key in path:
+		value = value.get(key) if isinstance(value, dict) else None
+	return value
+
+def compare(baseline: dict[str, Any], current: dict[str, Any]) -> list[str]:
+	"""Describe how every metric changed between two result documents.
+
+	Parameters:
+		baseline: Earlier result document.
+		current: New result document.
+
+	Returns:
+		list[str]: One line per metric present in both documents.
+	"""
+	baseline_runs: dict[tuple[str, int], dict[str, Any]] = {
+		(run["backend"], run["concurrency"]): run for run in baseline.get("runs", [])
+	}
+	lines: list[str] = []
+	for run in current.get("runs", []):
+		previous: dict[str, Any] | None = baseline_runs.get((run["backend"], run["concurrency"]))
+		if previous is None:
+			continue
+		for path in COMPARED_METRICS:
+			old: Any = _metric(previous, path)
+			new: Any = _metric(run, path)
+			if old is None or new is None:
+				continue
+			change: str = f"{(new - old) / old * 100.0:+.1f}%" if old else "n/a"
+			lines.append(f"{run['backend']:>6} c={run['concurrency']:<4} {'.'.join(path):<28} {old} -> {new} ({change})")
+	return lines
+
+def main(argv: list[str] | None = None) -> None:
+	"""Parse arguments, run the suite, store the results and optionally compare them."""
+	parser: argparse.ArgumentParser = argparse.ArgumentParser(description=__doc__,
+															  formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--backends", nargs="+", choices=["openai", "ollama"], default=["openai", "ollama"])
+	parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+	parser.add_argument("--sessions", type=int, default=64, help="sessions per concurrency level")
+	parser.add_argument("--questions-per-session", type=int, default=1)
+	parser.add_argument("--memory-sessions", type=int, default=16, help="sessions used for the memory probe (0 skips it)")
+	parser.add_argument("--output", default=None, help="result file (default: benchmarks/results/<timestamp>.json)")
+	parser.add_argument("--compare", default=None, help="earlier result file to compare against")
+	add_profile_arguments(parser)
+	arguments: argparse.Namespace = parser.parse_args(argv)
+
+	results: dict[str, Any] = run_suite(arguments.backends, arguments.concurrency, arguments.sessions,
+										arguments.questions_per_session, arguments.memory_sessions,
+										profile_from_arguments(arguments))
+	output: str = arguments.output or os.path.join(BENCHMARK_DIRECTORY, "results",
+												   time.strftime("%Y%m%d-%H%M%S") + ".json")
+	os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+	with open(output, "w", encoding="utf-8") as output_file:
+		json.dump(results, output_file, indent=2)
+	print(f"Results written to {output}")
+	if arguments.compare:
+		with open(arguments.compare, encoding="utf-8") as baseline_file:
+			for line in compare(json.load(baseline_file), results):
+				print(line)
+
+if __name__ == "__main__":
+	main()
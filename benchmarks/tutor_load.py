@@ -0,0 +1,166 @@
+"""Load worker: drive one tutor package against a model server and print latency metrics as JSON.
+
+Both tutor packages use the same module names, so each backend is measured
+in its own process; run_benchmarks.py starts this script once per run.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+QUESTIONS: list[str] = [
+	"Can you explain the concept of recursion in programming?",
+	"What is a derivative in calculus?",
+	"How does photosynthesis work?",
+	"Why does the moon have phases?",
+	"What is the difference between a list and a tuple in Python?",
+	"How do interest rates affect inflation?",
+	"What causes the seasons on Earth?",
+	"How does public key cryptography work?"
+]
+
+PACKAGE_DIRECTORIES: dict[str, str] = {"openai": "gpt-5-nano-based-tutor", "ollama": "phi4-based-tutor"}
+
+def percentile(values: list[float], share: float) -> float | None:
+	"""Return the nearest-rank percentile of a list of values.
+
+	Parameters:
+		values: Measured values.
+		share: Percentile as a fraction, e.g. 0.95.
+
+	Returns:
+		float | None: Percentile value, or None for an empty list.
+	"""
+	if not values:
+		return None
+	ordered: list[float] = sorted(values)
+	rank: int = max(1, min(len(ordered), math.ceil(share * len(ordered))))
+	return ordered[rank - 1]
+
+def summarize(values: list[float]) -> dict[str, float | None]:
+	"""Return p50, p95 and p99 of a list of values in milliseconds."""
+	return {name: (None if value is None else round(value * 1000.0, 3))
+			for name, value in (("p50_ms", percentile(values, 0.50)),
+								("p95_ms", percentile(values, 0.95)),
+								("p99_ms", percentile(values, 0.99)))}
+
+def load_tutor_class(backend: str) -> tuple[type, type]:
+	"""Import the tutor and config classes of a backend's package.
+
+	Parameters:
+		backend: "openai" or "ollama".
+
+	Returns:
+		tuple[type, type]: Tutor class and config class.
+	"""
+	repository: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+	sys.path.insert(0, os.path.join(repository, PACKAGE_DIRECTORIES[backend]))
+	import ai_tutor
+	if backend == "openai":
+		import ai_config
+		return ai_tutor.AITutor, ai_config.AIConfig
+	import ollama_ai_config
+	return ai_tutor.KnowledgeGuideAI, ollama_ai_config.OllamaAIConfig
+
+def run_session(tutor_class: type, config: Any, session: int, questions_per_session: int) -> list[dict[str, Any]]:
+	"""Run one tutoring session and time every question.
+
+	Parameters:
+		tutor_class: AITutor or KnowledgeGuideAI.
+		config: Config instance shared by all sessions.
+		session: Session number, used to make questions unique.
+		questions_per_session: Number of questions asked in the session.
+
+	Returns:
+		list[dict]: One timing record per question.
+	"""
+	tutor: Any = tutor_class(config)
+	records: list[dict[str, Any]] = []
+	for index in range(questions_per_session):
+		question: str = f"{QUESTIONS[(session + index) % len(QUESTIONS)]} (session {session}, question {index})"
+		started: float = time.perf_counter()
+		first_token: float | None = None
+		try:
+			for _ in tutor.explain_this_stream(question):
+				if first_token is None:
+					first_token = time.perf_counter() - started
+			records.append({"latency": time.perf_counter() - started, "ttft": first_token, "error": None})
+		except Exception as error:
+			records.append({"latency": time.perf_counter() - started, "ttft": None, "error": type(error).__name__})
+	return records
+
+def measure_memory_per_session(tutor_class: type, config: Any, sessions: int) -> float:
+	"""Return the traced memory retained per session after one question each, in bytes."""
+	tracemalloc.start()
+	try:
+		baseline: int = tracemalloc.get_traced_memory()[0]
+		tutors: list[Any] = []
+		for session in range(sessions):
+			tutor: Any = tutor_class(config)
+			try:
+				tutor.explain_this(f"{QUESTIONS[session % len(QUESTIONS)]} (memory probe {session})")
+			except Exception:
+				pass
+			tutors.append(tutor)
+		return (tracemalloc.get_traced_memory()[0] - baseline) / max(sessions, 1)
+	finally:
+		tracemalloc.stop()
+
+def run_load(backend: str, concurrency: int, sessions: int, questions_per_session: int, memory_sessions: int) -> dict[str, Any]:
+	"""Run sessions with bounded concurrency and aggregate the metrics.
+
+	Parameters:
+		backend: "openai" or "ollama".
+		concurrency: Number of sessions running at once.
+		sessions: Total number of sessions.
+		questions_per_session: Number of questions per session.
+		memory_sessions: Number of sessions used for the memory probe (0 skips it).
+
+	Returns:
+		dict: Metrics of the run.
+	"""
+	tutor_class, config_class = load_tutor_class(backend)
+	config: Any = config_class()
+	started: float = time.perf_counter()
+	with ThreadPoolExecutor(max_workers=concurrency) as executor:
+		results: list[list[dict[str, Any]]] = list(executor.map(
+			lambda session: run_session(tutor_class, config, session, questions_per_session), range(sessions)
+		))
+	elapsed: float = time.perf_counter() - started
+	records: list[dict[str, Any]] = [record for session_records in results for record in session_records]
+	succeeded: list[dict[str, Any]] = [record for record in records if record["error"] is None]
+	metrics: dict[str, Any] = {
+		"backend": backend,
+		"concurrency": concurrency,
+		"sessions": sessions,
+		"questions_per_session": questions_per_session,
+		"requests": len(records),
+		"errors": len(records) - len(succeeded),
+		"wall_time_s": round(elapsed, 3),
+		"requests_per_second": round(len(succeeded) / elapsed, 3) if elapsed > 0 else None,
+		"latency": summarize([record["latency"] for record in succeeded]),
+		"time_to_first_token": summarize([record["ttft"] for record in succeeded if record["ttft"] is not None])
+	}
+	if memory_sessions > 0:
+		metrics["memory_per_session_bytes"] = round(measure_memory_per_session(tutor_class, config, memory_sessions))
+	return metrics
+
+def main(argv: list[str] | None = None) -> None:
+	"""Parse arguments, run the load and print the metrics as JSON."""
+	parser: argparse.ArgumentParser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("backend", choices=sorted(PACKAGE_DIRECTORIES))
+	parser.add_argument("--concurrency", type=int, default=1)
+	parser.add_argument("--sessions", type=int, default=10)
+	parser.add_argument("--questions-per-session", type=int, default=1)
+	parser.add_argument("--memory-sessions", type=int, default=0)
+	arguments: argparse.Namespace = parser.parse_args(argv)
+	print(json.dumps(run_load(arguments.backend, arguments.concurrency, arguments.sessions,
+							  arguments.questions_per_session, arguments.memory_sessions)))
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,218 @@
+"""AreaClassifier: local keyword classifier that infers the area of knowledge without a model call."""
+import json
+import math
+import re
+import threading
+from collections import Counter
+from typing import Iterable, Sequence
+
+_TOKEN_PATTERN: re.Pattern[str] = re.compile(r"[a-z0-9][a-z0-9+#]*")
+
+STOP_WORDS: frozenset[str] = frozenset((
+	"a", "about", "affect", "an", "and", "are", "as", "at", "be", "between", "by", "can", "cause", "causes",
+	"concept", "could", "did", "difference", "do", "does", "example", "examples", "explain", "for", "from",
+	"give", "happen", "happens", "has", "have", "how", "i", "if", "in", "into", "is", "it", "its", "me",
+	"mean", "means", "my", "of", "on", "or", "please", "should", "simple", "so", "tell", "terms", "that",
+	"the", "their", "them", "there", "these", "this", "to", "us", "use", "used", "was", "way", "we", "what",
+	"when", "where", "which", "who", "why", "will", "with", "work", "works", "would", "you", "your"
+))
+
+def tokenize(text: str) -> list[str]:
+	"""Split text into lowercase terms, dropping stop words and single characters.
+
+	Parameters:
+		text: Text to split.
+
+	Returns:
+		list[str]: Terms in order of appearance.
+	"""
+	return [token for token in _TOKEN_PATTERN.findall(text.lower()) if len(token) > 1 and token not in STOP_WORDS]
+
+
+class AreaClassifier:
+	"""Classify questions into the subjects of a taxonomy with an IDF-weighted inverted index.
+
+	Every subject is described by keywords or example questions. The index
+	maps each term to the subjects using it, so a question is scored with one
+	dictionary lookup per term. A subject's score is the IDF-weighted share of
+	the question's terms it contains; terms unknown to the taxonomy get the
+	highest weight, so questions mostly about something else do not look
+	confident, and terms shared by many subjects count little.
+
+	Parameters:
+		taxonomy: Subject name -> keywords or example questions.
+		min_score: Minimal share of the question the best subject must cover.
+		min_margin: Minimal lead of the best subject over the second, as a share of the best score.
+	"""
+
+	@property
+	def subjects(self) -> tuple[str, ...]:
+		"""Subjects known to the classifier."""
+		return self.__subjects
+
+	@property
+	def hits(self) -> int:
+		"""Number of questions classified confidently."""
+		return self.__hits
+
+	@property
+	def misses(self) -> int:
+		"""Number of questions left to the model."""
+		return self.__misses
+
+	def __init__(self, taxonomy: dict[str, Sequence[str]], min_score: float = 0.5, min_margin: float = 0.25) -> None:
+		"""Build the inverted index from a taxonomy.
+
+		Parameters:
+			taxonomy: Subject name -> keywords or example questions.
+			min_score: Minimal share of the question the best subject must cover.
+			min_margin: Minimal lead of the best subject over the second, as a share of the best score.
+		"""
+		self.__subjects: tuple[str, ...] = tuple(subject for subject, texts in taxonomy.items() if texts)
+		self.__min_score: float = min_score
+		self.__min_margin: float = min_margin
+		self.__hits: int = 0
+		self.__misses: int = 0
+
+		subject_terms: list[set[str]] = [{term for text in taxonomy[subject] for term in tokenize(text)}
+										 for subject in self.__subjects]
+		document_frequency: Counter[str] = Counter(term for terms in subject_terms for term in terms)
+		subject_count: int = len(self.__subjects)
+		self.__idf: dict[str, float] = {term: math.log((1 + subject_count) / (1 + frequency)) + 1.0
+										for term, frequency in document_frequency.items()}
+		# Weight of a term never seen in the taxonomy (document frequency 0).
+		self.__unknown_idf: float = math.log(1 + subject_count) + 1.0
+		self.__index: dict[str, tuple[int, ...]] = {}
+		for term in document_frequency:
+			self.__index[term] = tuple(subject_index for subject_index, terms in enumerate(subject_terms) if term in terms)
+
+	@classmethod
+	def from_file(cls, path: str, min_score: float = 0.5, min_margin: float = 0.25) -> "AreaClassifier":
+		"""Load a taxonomy JSON file ({"subject": ["keyword or example", ...]}) and build the index.
+
+		Parameters:
+			path: Taxonomy file.
+			min_score: Minimal share of the question the best subject must cover.
+			min_margin: Minimal lead of the best subject over the second, as a share of the best score.
+
+		Returns:
+			AreaClassifier: Classifier for the taxonomy.
+		"""
+		with open(path, encoding="utf-8") as taxonomy_file:
+			taxonomy: dict[str, list[str]] = json.load(taxonomy_file)
+		return cls(taxonomy, min_score, min_margin)
+
+	def scores(self, question: str) -> list[tuple[str, float]]:
+		"""Return the share of the question covered by every matching subject, best first.
+
+		Parameters:
+			question: The user's question.
+
+		Returns:
+			list[tuple[str, float]]: (subject, score) pairs with a non-zero score.
+		"""
+		terms: set[str] = set(tokenize(question))
+		if not terms:
+			return []
+		accumulated: dict[int, float] = {}
+		total: float = 0.0
+		for term in terms:
+			weight: float = self.__idf.get(term, self.__unknown_idf)
+			total += weight
+			for subject_index in self.__index.get(term, ()):
+				accumulated[subject_index] = accumulated.get(subject_index, 0.0) + weight
+		return sorted(((self.__subjects[subject_index], score / total) for subject_index, score in accumulated.items()),
+					  key=lambda pair: pair[1], reverse=True)
+
+	def classify(self, question: str) -> str | None:
+		"""Return the subject of a question, or None when the classifier is not confident.
+
+		Parameters:
+			question: The user's question.
+
+		Returns:
+			str | None: Subject name, or None to fall back to the model.
+		"""
+		ranked: list[tuple[str, float]] = self.scores(question)
+		if ranked:
+			best: float = ranked[0][1]
+			second: float = ranked[1][1] if len(ranked) > 1 else 0.0
+			if best >= self.__min_score and best - second >= self.__min_margin * best:
+				self.__hits += 1
+				return ranked[0][0]
+		self.__misses += 1
+		return None
+
+
+def build_taxonomy(examples: Iterable[tuple[str, str]], min_examples: int = 3, max_terms: int = 50) -> dict[str, list[str]]:
+	"""Build a keyword taxonomy from (question, area of knowledge) pairs answered by the model.
+
+	Areas are grouped case-insensitively under their most frequent spelling.
+	Every area with enough examples keeps its highest-weighted TF-IDF terms
+	among those used by at least two of its questions.
+
+	Parameters:
+		examples: (question, area of knowledge) pairs.
+		min_examples: Minimal number of questions for an area to be kept.
+		max_terms: Maximal number of keywords per area.
+
+	Returns:
+		dict[str, list[str]]: Area -> keywords, ready to be written as a taxonomy file.
+	"""
+	spellings: dict[str, Counter[str]] = {}
+	term_counts: dict[str, Counter[str]] = {}
+	question_counts: Counter[str] = Counter()
+	for question, area in examples:
+		area = area.strip().strip(".")
+		if not area:
+			continue
+		key: str = area.lower()
+		spellings.setdefault(key, Counter())[area] += 1
+		term_counts.setdefault(key, Counter()).update(set(tokenize(question)))
+		question_counts[key] += 1
+
+	kept: list[str] = [key for key in term_counts if question_counts[key] >= min_examples]
+	document_frequency: Counter[str] = Counter(term for key in kept for term in term_counts[key])
+	taxonomy: dict[str, list[str]] = {}
+	for key in sorted(kept):
+		ranked: list[tuple[float, str]] = sorted(
+			((count * (math.log((1 + len(kept)) / (1 + document_frequency[term])) + 1.0), term)
+			 for term, count in term_counts[key].items() if count >= 2),
+			reverse=True
+		)
+		taxonomy[spellings[key].most_common(1)[0][0]] = [term for _, term in ranked[:max_terms]]
+	return taxonomy
+
+_area_log_lock: threading.Lock = threading.Lock()
+
+def log_area(path: str, question: str, area_of_knowledge: str) -> None:
+	"""Append a model-inferred area of knowledge to a JSONL log used by build_area_index.py.
+
+	Parameters:
+		path: Log file.
+		question: The user's question.
+		area_of_knowledge: Area answered by the model.
+	"""
+	line: str = json.dumps({"question": question, "area_of_knowledge": area_of_knowledge}, ensure_ascii=False)
+	with _area_log_lock, open(path, "a", encoding="utf-8") as log_file:
+		log_file.write(line + "\n")
+
+_shared_classifiers: dict[tuple[str, float, float], AreaClassifier] = {}
+_shared_classifiers_lock: threading.Lock = threading.Lock()
+
+def shared_classifier(path: str, min_score: float, min_margin: float) -> AreaClassifier:
+	"""Return a process-wide AreaClassifier for the given taxonomy file and thresholds.
+
+	Parameters:
+		path: Taxonomy file.
+		min_score: Minimal share of the question the best subject must cover.
+		min_margin: Minimal lead of the best subject over the second, as a share of the best score.
+
+	Returns:
+		AreaClassifier: Classifier shared by every caller using the same settings.
+	"""
+	key: tuple[str, float, float] = (path, min_score, min_margin)
+	with _shared_classifiers_lock:
+		if key not in _shared_classifiers:
+			_shared_classifiers[key] = AreaClassifier.from_file(path, min_score, min_margin)
+		return _shared_classifiers[key]
@@ -0,0 +1,177 @@
+"""ResponseCache: LRU/TTL cache for self-reference answers with an optional SQLite backend."""
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class ResponseCache:
+	"""Cache short model answers keyed by normalized prompt parts.
+
+	Entries live in an in-memory LRU and expire after a TTL. When a path is
+	given, entries are also stored in SQLite so they survive restarts; every
+	write prunes the expired rows and the least recently used ones beyond
+	max_size, so the file stays bounded.
+
+	Parameters:
+		max_size: Maximum number of entries kept in memory.
+		ttl_seconds: Lifetime of an entry in seconds.
+		path: Optional SQLite database path for persistence.
+	"""
+
+	@property
+	def hits(self) -> int:
+		"""Number of lookups answered from the cache."""
+		return self.__hits
+
+	@property
+	def misses(self) -> int:
+		"""Number of lookups not found in the cache."""
+		return self.__misses
+
+	def __init__(self, max_size: int = 1024, ttl_seconds: float = 86400.0, path: str | None = None) -> None:
+		"""Create the cache and open the SQLite backend if requested.
+
+		Parameters:
+			max_size: Maximum number of entries kept in memory.
+			ttl_seconds: Lifetime of an entry in seconds.
+			path: Optional SQLite database path for persistence.
+		"""
+		if max_size <= 0:
+			raise ValueError("Cache size must be positive")
+		self.__max_size: int = max_size
+		self.__ttl_seconds: float = ttl_seconds
+		self.__entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+		self.__lock: threading.Lock = threading.Lock()
+		self.__hits: int = 0
+		self.__misses: int = 0
+		# Keys read since the last write; their last use is written to SQLite with the next write.
+		self.__used: dict[str, float] = {}
+		self.__connection: sqlite3.Connection | None = None
+		if path:
+			self.__connection = sqlite3.connect(path, check_same_thread=False)
+			self.__connection.execute(
+				"CREATE TABLE IF NOT EXISTS response_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL,"
+				" used_at REAL NOT NULL DEFAULT 0)"
+			)
+			columns: set[str] = {row[1] for row in self.__connection.execute("PRAGMA table_info(response_cache)")}
+			if "used_at" not in columns:
+				# Databases written before rows tracked their last use.
+				self.__connection.execute("ALTER TABLE response_cache ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+				self.__connection.execute("UPDATE response_cache SET used_at = stored_at")
+			with self.__lock:
+				self.__prune(time.time())
+			self.__connection.commit()
+
+	@staticmethod
+	def normalize(text: str) -> str:
+		"""Normalize text so that trivially different prompts share a key.
+
+		Parameters:
+			text: Text to normalize.
+
+		Returns:
+			str: Lower-cased text with collapsed whitespace and trimmed punctuation.
+		"""
+		return " ".join(text.lower().split()).strip(" .,;:!?")
+
+	@classmethod
+	def make_key(cls, *parts: str) -> str:
+		"""Build a cache key from one or more prompt parts.
+
+		Parameters:
+			parts: Prompt parts that determine the answer.
+
+		Returns:
+			str: Cache key.
+		"""
+		return "\x1f".join(cls.normalize(part) for part in parts)
+
+	def get(self, key: str) -> str | None:
+		"""Return the cached value for a key, or None if missing or expired.
+
+		Parameters:
+			key: Cache key built with make_key.
+
+		Returns:
+			str | None: Cached value.
+		"""
+		now: float = time.time()
+		with self.__lock:
+			entry: tuple[float, str] | None = self.__entries.get(key)
+			if entry is not None and now - entry[0] > self.__ttl_seconds:
+				del self.__entries[key]
+				entry = None
+			if entry is None and self.__connection is not None:
+				row = self.__connection.execute(
+					"SELECT stored_at, value FROM response_cache WHERE key = ?", (key,)
+				).fetchone()
+				if row is not None and now - row[0] <= self.__ttl_seconds:
+					entry = (row[0], row[1])
+					self.__store_in_memory(key, entry)
+			if entry is None:
+				self.__misses += 1
+				return None
+			self.__entries.move_to_end(key)
+			self.__hits += 1
+			if self.__connection is not None:
+				self.__used[key] = now
+			return entry[1]
+
+	def set(self, key: str, value: str) -> None:
+		"""Store a value under a key.
+
+		Parameters:
+			key: Cache key built with make_key.
+			value: Value to cache.
+		"""
+		entry: tuple[float, str] = (time.time(), value)
+		with self.__lock:
+			self.__store_in_memory(key, entry)
+			if self.__connection is not None:
+				self.__connection.execute(
+					"INSERT OR REPLACE INTO response_cache (key, value, stored_at, used_at) VALUES (?, ?, ?, ?)",
+					(key, value, entry[0], entry[0])
+				)
+				self.__prune(entry[0])
+				self.__connection.commit()
+
+	def __prune(self, now: float) -> None:
+		"""Record recent reads, then delete expired rows and the least recently used ones beyond max_size; the caller holds the lock."""
+		assert self.__connection is not None
+		if self.__used:
+			self.__connection.executemany("UPDATE response_cache SET used_at = MAX(used_at, ?) WHERE key = ?",
+										  [(used_at, key) for key, used_at in self.__used.items()])
+			self.__used.clear()
+		self.__connection.execute("DELETE FROM response_cache WHERE stored_at < ?", (now - self.__ttl_seconds,))
+		self.__connection.execute(
+			"DELETE FROM response_cache WHERE key NOT IN (SELECT key FROM response_cache ORDER BY used_at DESC LIMIT ?)",
+			(self.__max_size,)
+		)
+
+	def __store_in_memory(self, key: str, entry: tuple[float, str]) -> None:
+		"""Put an entry into the in-memory LRU, evicting the oldest ones."""
+		self.__entries[key] = entry
+		self.__entries.move_to_end(key)
+		while len(self.__entries) > self.__max_size:
+			self.__entries.popitem(last=False)
+
+
+_shared_caches: dict[tuple[int, float, str | None], ResponseCache] = {}
+_shared_caches_lock: threading.Lock = threading.Lock()
+
+def shared_cache(max_size: int, ttl_seconds: float, path: str | None) -> ResponseCache:
+	"""Return a process-wide ResponseCache for the given settings.
+
+	Parameters:
+		max_size: Maximum number of entries kept in memory.
+		ttl_seconds: Lifetime of an entry in seconds.
+		path: Optional SQLite database path for persistence.
+
+	Returns:
+		ResponseCache: Cache shared by every caller using the same settings.
+	"""
+	key: tuple[int, float, str | None] = (max_size, ttl_seconds, path)
+	with _shared_caches_lock:
+		if key not in _shared_caches:
+			_shared_caches[key] = ResponseCache(max_size, ttl_seconds, path)
+		return _shared_caches[key]
@@ -0,0 +1,134 @@
+"""Process-wide registry of pooled OpenAI clients shared by all AICore instances."""
+import asyncio
+import threading
+import weakref
+import httpx
+import openai
+from ai_config import AIConfig
+from ai_resilience import Cancellation
+from typing import Any
+
+_ClientKey = tuple[str, int, int, float, float, bool]
+
+_clients: dict[_ClientKey, openai.OpenAI] = {}
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[_ClientKey, openai.AsyncOpenAI]] = weakref.WeakKeyDictionary()
+_clients_lock: threading.Lock = threading.Lock()
+
+# Stream events that end a response; each carries the whole Response.
+_FINAL_EVENTS: frozenset[str] = frozenset(("response.completed", "response.incomplete", "response.failed"))
+
+def _client_key(config: AIConfig) -> _ClientKey:
+	"""Return the settings that identify a shared client.
+
+	Parameters:
+		config: Configuration with the API key and HTTP pool settings.
+
+	Returns:
+		tuple: Key of the client in the registry.
+	"""
+	return (config.openai_api_key,
+			config.http_max_connections,
+			config.http_max_keepalive_connections,
+			config.http_keepalive_expiry,
+			config.http_timeout,
+			config.http2_enabled)
+
+def _limits(config: AIConfig) -> httpx.Limits:
+	"""Build connection pool limits from the configuration.
+
+	Parameters:
+		config: Configuration with the HTTP pool settings.
+
+	Returns:
+		httpx.Limits: Pool limits for the HTTP client.
+	"""
+	return httpx.Limits(max_connections=config.http_max_connections,
+						max_keepalive_connections=config.http_max_keepalive_connections,
+						keepalive_expiry=config.http_keepalive_expiry)
+
+def get_client(config: AIConfig) -> openai.OpenAI:
+	"""Return the shared OpenAI client for the given configuration.
+
+	Parameters:
+		config: Configuration with the API key and HTTP pool settings.
+
+	Returns:
+		openai.OpenAI: Client whose keep-alive pool is shared by every caller with the same settings.
+	"""
+	key: _ClientKey = _client_key(config)
+	with _clients_lock:
+		if key not in _clients:
+			http_client: httpx.Client = httpx.Client(limits=_limits(config),
+													 timeout=config.http_timeout,
+													 http2=config.http2_enabled)
+			# Retries are made by the CallPolicy of AICore, which respects deadlines.
+			_clients[key] = openai.OpenAI(api_key=config.openai_api_key,
+										  timeout=config.http_timeout,
+										  max_retries=0,
+										  http_client=http_client)
+		return _clients[key]
+
+def get_async_client(config: AIConfig) -> openai.AsyncOpenAI:
+	"""Return the shared asynchronous OpenAI client for the given configuration and event loop.
+
+	Asynchronous connection pools are bound to the event loop that opened
+	them, so one client is kept per running loop and dropped with it.
+
+	Parameters:
+		config: Configuration with the API key and HTTP pool settings.
+
+	Returns:
+		openai.AsyncOpenAI: Client shared by every caller with the same settings on the same loop.
+
+	Raises:
+		RuntimeError: If called outside a running event loop.
+	"""
+	loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+	key: _ClientKey = _client_key(config)
+	with _clients_lock:
+		loop_clients: dict[_ClientKey, openai.AsyncOpenAI] = _async_clients.setdefault(loop, {})
+		if key not in loop_clients:
+			http_client: httpx.AsyncClient = httpx.AsyncClient(limits=_limits(config),
+															   timeout=config.http_timeout,
+															   http2=config.http2_enabled)
+			loop_clients[key] = openai.AsyncOpenAI(api_key=config.openai_api_key,
+												   timeout=config.http_timeout,
+												   max_retries=0,
+												   http_client=http_client)
+		return loop_clients[key]
+
+def create_cancellable(client: openai.OpenAI, request: dict[str, Any], cancellation: Cancellation,
+					   options: dict[str, Any]) -> Any:
+	"""Create a response as a stream and return it once complete, stopping once the attempt is abandoned.
+
+	Leaving the stream closes the request, which makes the server stop
+	generating and frees the attempt's scheduler slot and connection; a plain
+	call would keep all of them until the whole answer was generated.
+
+	Parameters:
+		client: OpenAI client.
+		request: Keyword arguments for responses.create, without "stream".
+		cancellation: Cancellation of the running attempt.
+		options: Request options, such as the timeout.
+
+	Returns:
+		Response: Response carried by the final event of the stream.
+
+	Raises:
+		TimeoutError: If the attempt is abandoned before the response is complete.
+	"""
+	stream: Any = client.responses.create(**request, **options, stream=True)
+	try:
+		for event in stream:
+			if cancellation.cancelled:
+				raise TimeoutError("Model call abandoned")
+			if event.type in _FINAL_EVENTS:
+				return event.response
+	finally:
+		stream.close()
+	raise openai.APIConnectionError(message="The stream ended without a response", request=stream.response.request)
+
+def is_transient_error(error: BaseException) -> bool:
+	"""Whether an OpenAI error is worth another attempt: timeouts, lost connections, rate limits and server errors."""
+	return isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError,
+							  openai.InternalServerError))
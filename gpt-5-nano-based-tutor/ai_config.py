@@ -6,45 +6,58 @@ class AIConfig:
     Configuration class to load environment variables.
     """
 
-    def __get_config_value(self, key: str):
+    def __get_config_value(self, key: str, default: str | None = None):
         """
-        Get the value of an environment variable.
+        Get the value of an environment variable, or the default if it is not set.
         """
         if not key:
             raise ValueError("Key must be provided")
 
         value: str | None = os.getenv(key)
         if not value:
+            if default is not None:
+                return default
             raise ValueError(f"Environment variable '{key}' not found")
 
         return value
 
-    def _get_str(self, key: str) -> str:
+    def _get_str(self, key: str, default: str | None = None) -> str:
         """
         Get a string value from the environment variables.
         """
-        return self.__get_config_value(key)
+        return self.__get_config_value(key, default)
 
-    def _get_int(self, key: str) -> int:
+    def _get_int(self, key: str, default: int | None = None) -> int:
         """
         Get an integer value from the environment variables.
         """
-        value = self.__get_config_value(key)
+        value = self.__get_config_value(key, None if default is None else str(default))
         try:
             return int(value)
         except ValueError:
             raise ValueError(f"Environment variable '{key}' must be an integer")
 
-    def _get_float(self, key: str) -> float:
+    def _get_float(self, key: str, default: float | None = None) -> float:
         """
         Get a float value from the environment variables.
         """
-        value = self.__get_config_value(key)
+        value = self.__get_config_value(key, None if default is None else str(default))
         try:
             return float(value)
         except ValueError:
             raise ValueError(f"Environment variable '{key}' must be a float")
 
+    def _get_bool(self, key: str, default: bool | None = None) -> bool:
+        """
+        Get a boolean value ("true"/"false", "1"/"0", "yes"/"no") from the environment variables.
+        """
+        value = self.__get_config_value(key, None if default is None else str(default)).strip().lower()
+        if value in ("1", "true", "yes", "on"):
+            return True
+        if value in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(f"Environment variable '{key}' must be a boolean")
+
     @property
     def openai_api_key(self) -> str:
         """
@@ -63,7 +76,489 @@ class AIConfig:
             self.__model_name = self._get_str("MODEL_NAME")
         return self.__model_name
 
+    @property
+    def tutor_model(self) -> str:
+        """
+        Get the model that writes the explanations (defaults to MODEL_NAME).
+        """
+        if self.__tutor_model is None:
+            self.__tutor_model = self._get_str("TUTOR_MODEL", "") or self.model_name
+        return self.__tutor_model
+
+    @property
+    def tutor_reasoning_effort(self) -> str | None:
+        """
+        Get the reasoning effort of the explanation calls, or None to use the model's default.
+        """
+        return self._get_str("TUTOR_REASONING_EFFORT", "") or None
+
+    @property
+    def self_reference_model(self) -> str:
+        """
+        Get the model used for the self-reference helper calls (defaults to MODEL_NAME).
+        """
+        if self.__self_reference_model is None:
+            self.__self_reference_model = self._get_str("SELF_REFERENCE_MODEL", "") or self.model_name
+        return self.__self_reference_model
+
+    @property
+    def self_reference_reasoning_effort(self) -> str | None:
+        """
+        Get the reasoning effort of the self-reference helper calls ("none" sends no reasoning setting).
+        """
+        effort: str = self._get_str("SELF_REFERENCE_REASONING_EFFORT", "medium")
+        return None if effort.lower() == "none" else effort
+
+    @property
+    def self_reference_backend(self) -> str:
+        """
+        Get the backend of the self-reference helper calls: "openai", or "ollama" to run them on a local model.
+        """
+        backend: str = self._get_str("SELF_REFERENCE_BACKEND", "openai").lower()
+        if backend not in ("openai", "ollama"):
+            raise ValueError("Environment variable 'SELF_REFERENCE_BACKEND' must be 'openai' or 'ollama'")
+        return backend
+
+    @property
+    def ollama_host(self) -> str | None:
+        """
+        Get the Ollama server URL used by the Ollama backend, or None for the client's default.
+        """
+        return self._get_str("OLLAMA_HOST", "") or None
+
+    @property
+    def self_reference_cache_size(self) -> int:
+        """
+        Get the maximum number of cached self-reference answers (0 disables the cache).
+        """
+        if self.__self_reference_cache_size is None:
+            self.__self_reference_cache_size = self._get_int("SELF_REFERENCE_CACHE_SIZE", 1024)
+        return self.__self_reference_cache_size
+
+    @property
+    def self_reference_cache_ttl(self) -> float:
+        """
+        Get the lifetime of cached self-reference answers in seconds.
+        """
+        if self.__self_reference_cache_ttl is None:
+            self.__self_reference_cache_ttl = self._get_float("SELF_REFERENCE_CACHE_TTL", 86400.0)
+        return self.__self_reference_cache_ttl
+
+    @property
+    def self_reference_cache_path(self) -> str | None:
+        """
+        Get the SQLite path used to persist self-reference answers, or None to keep them in memory only.
+        """
+        return self._get_str("SELF_REFERENCE_CACHE_PATH", "") or None
+
+    @property
+    def self_reference_history_window(self) -> int:
+        """
+        Get the number of previous self-reference turns sent with each helper call (0 makes helper calls stateless).
+        """
+        if self.__self_reference_history_window is None:
+            self.__self_reference_history_window = self._get_int("SELF_REFERENCE_HISTORY_WINDOW", 0)
+        return self.__self_reference_history_window
+
+    @property
+    def area_taxonomy_path(self) -> str | None:
+        """
+        Get the taxonomy JSON file of the local area-of-knowledge classifier, or None to always ask the model.
+        """
+        return self._get_str("AREA_TAXONOMY_PATH", "") or None
+
+    @property
+    def area_classifier_min_score(self) -> float:
+        """
+        Get the share of a question the best subject must cover for the local classifier to answer.
+        """
+        if self.__area_classifier_min_score is None:
+            self.__area_classifier_min_score = self._get_float("AREA_CLASSIFIER_MIN_SCORE", 0.5)
+        return self.__area_classifier_min_score
+
+    @property
+    def area_classifier_min_margin(self) -> float:
+        """
+        Get the lead over the second subject, as a share of the best score, the local classifier requires.
+        """
+        if self.__area_classifier_min_margin is None:
+            self.__area_classifier_min_margin = self._get_float("AREA_CLASSIFIER_MIN_MARGIN", 0.25)
+        return self.__area_classifier_min_margin
+
+    @property
+    def area_log_path(self) -> str | None:
+        """
+        Get the JSONL file that areas inferred by the model are appended to (for build_area_index.py), or None.
+        """
+        return self._get_str("AREA_LOG_PATH", "") or None
+
+    @property
+    def speculation_role_overlap(self) -> float:
+        """
+        Get the share of the inferred area's words that must appear in the area a speculative answer was written for to keep it.
+        """
+        if self.__speculation_role_overlap is None:
+            self.__speculation_role_overlap = self._get_float("SPECULATION_ROLE_OVERLAP", 0.5)
+        return self.__speculation_role_overlap
+
+    @property
+    def http_max_connections(self) -> int:
+        """
+        Get the maximum number of connections in the shared HTTP pool.
+        """
+        if self.__http_max_connections is None:
+            self.__http_max_connections = self._get_int("HTTP_MAX_CONNECTIONS", 100)
+        return self.__http_max_connections
+
+    @property
+    def http_max_keepalive_connections(self) -> int:
+        """
+        Get the maximum number of idle keep-alive connections in the shared HTTP pool.
+        """
+        if self.__http_max_keepalive_connections is None:
+            self.__http_max_keepalive_connections = self._get_int("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+        return self.__http_max_keepalive_connections
+
+    @property
+    def http_keepalive_expiry(self) -> float:
+        """
+        Get the number of seconds an idle keep-alive connection is kept open.
+        """
+        if self.__http_keepalive_expiry is None:
+            self.__http_keepalive_expiry = self._get_float("HTTP_KEEPALIVE_EXPIRY", 30.0)
+        return self.__http_keepalive_expiry
+
+    @property
+    def http_timeout(self) -> float:
+        """
+        Get the HTTP timeout in seconds for model calls.
+        """
+        if self.__http_timeout is None:
+            self.__http_timeout = self._get_float("HTTP_TIMEOUT", 600.0)
+        return self.__http_timeout
+
+    @property
+    def http2_enabled(self) -> bool:
+        """
+        Get whether HTTP/2 is used for model calls (requires the "h2" package).
+        """
+        if self.__http2_enabled is None:
+            self.__http2_enabled = self._get_bool("HTTP2_ENABLED", False)
+        return self.__http2_enabled
+
+    @property
+    def prompt_cache_namespace(self) -> str:
+        """
+        Get the prefix of the prompt_cache_key sent with every call (empty disables the key).
+        """
+        if self.__prompt_cache_namespace is None:
+            self.__prompt_cache_namespace = self._get_str("PROMPT_CACHE_NAMESPACE", "tutor")
+        return self.__prompt_cache_namespace
+
+    @property
+    def single_flight_enabled(self) -> bool:
+        """
+        Get whether identical calls in flight at the same time share one model call.
+        """
+        if self.__single_flight_enabled is None:
+            self.__single_flight_enabled = self._get_bool("SINGLE_FLIGHT", True)
+        return self.__single_flight_enabled
+
+    @property
+    def max_concurrent_calls(self) -> int:
+        """
+        Get the maximal number of OpenAI calls in flight at once (0 for no limit).
+        """
+        if self.__max_concurrent_calls is None:
+            self.__max_concurrent_calls = self._get_int("MAX_CONCURRENT_CALLS", 16)
+        return self.__max_concurrent_calls
+
+    @property
+    def interactive_reserved_calls(self) -> int:
+        """
+        Get the number of concurrent call slots only interactive calls may use.
+        """
+        if self.__interactive_reserved_calls is None:
+            self.__interactive_reserved_calls = self._get_int("INTERACTIVE_RESERVED_CALLS", 2)
+        return self.__interactive_reserved_calls
+
+    @property
+    def rate_limit_rpm(self) -> float:
+        """
+        Get the client-side limit of OpenAI requests per minute (0 for no limit).
+        """
+        if self.__rate_limit_rpm is None:
+            self.__rate_limit_rpm = self._get_float("RATE_LIMIT_RPM", 0.0)
+        return self.__rate_limit_rpm
+
+    @property
+    def rate_limit_tpm(self) -> float:
+        """
+        Get the client-side limit of estimated OpenAI tokens per minute (0 for no limit).
+        """
+        if self.__rate_limit_tpm is None:
+            self.__rate_limit_tpm = self._get_float("RATE_LIMIT_TPM", 0.0)
+        return self.__rate_limit_tpm
+
+    @property
+    def ollama_max_concurrent_calls(self) -> int:
+        """
+        Get the maximal number of helper calls in flight on the Ollama server (0 for no limit).
+        """
+        if self.__ollama_max_concurrent_calls is None:
+            self.__ollama_max_concurrent_calls = self._get_int("OLLAMA_MAX_CONCURRENT_CALLS", 2)
+        return self.__ollama_max_concurrent_calls
+
+    @property
+    def call_timeout(self) -> float:
+        """
+        Get the seconds allowed per model call attempt (0 for the HTTP timeout only).
+        """
+        if self.__call_timeout is None:
+            self.__call_timeout = self._get_float("CALL_TIMEOUT", 120.0)
+        return self.__call_timeout
+
+    @property
+    def request_deadline(self) -> float:
+        """
+        Get the seconds allowed for a whole explanation, all stages included (0 for no deadline).
+        """
+        if self.__request_deadline is None:
+            self.__request_deadline = self._get_float("REQUEST_DEADLINE", 0.0)
+        return self.__request_deadline
+
+    @property
+    def max_attempts(self) -> int:
+        """
+        Get the number of attempts per model call, including the first.
+        """
+        if self.__max_attempts is None:
+            self.__max_attempts = self._get_int("MAX_ATTEMPTS", 3)
+        return self.__max_attempts
+
+    @property
+    def retry_backoff_base(self) -> float:
+        """
+        Get the upper bound of the first pause between attempts, in seconds.
+        """
+        if self.__retry_backoff_base is None:
+            self.__retry_backoff_base = self._get_float("RETRY_BACKOFF_BASE", 0.5)
+        return self.__retry_backoff_base
+
+    @property
+    def retry_backoff_max(self) -> float:
+        """
+        Get the largest upper bound of a pause between attempts, in seconds.
+        """
+        if self.__retry_backoff_max is None:
+            self.__retry_backoff_max = self._get_float("RETRY_BACKOFF_MAX", 8.0)
+        return self.__retry_backoff_max
+
+    @property
+    def hedge_requests(self) -> bool:
+        """
+        Get whether a duplicate call is sent when the first one outlasts the hedge quantile.
+        """
+        if self.__hedge_requests is None:
+            self.__hedge_requests = self._get_bool("HEDGE_REQUESTS", False)
+        return self.__hedge_requests
+
+    @property
+    def hedge_quantile(self) -> float:
+        """
+        Get the latency quantile after which a call is hedged.
+        """
+        if self.__hedge_quantile is None:
+            self.__hedge_quantile = self._get_float("HEDGE_QUANTILE", 0.95)
+        return self.__hedge_quantile
+
+    @property
+    def hedge_min_samples(self) -> int:
+        """
+        Get the number of observed latencies needed before calls are hedged.
+        """
+        if self.__hedge_min_samples is None:
+            self.__hedge_min_samples = self._get_int("HEDGE_MIN_SAMPLES", 20)
+        return self.__hedge_min_samples
+
+    @property
+    def router_backends(self) -> tuple[str, ...]:
+        """
+        Get the backends calls are routed between, in order of preference (e.g. "ollama,openai"; empty for OpenAI only).
+        """
+        if self.__router_backends is None:
+            backends: tuple[str, ...] = tuple(backend.strip().lower()
+                                              for backend in self._get_str("ROUTER_BACKENDS", "").split(",")
+                                              if backend.strip())
+            if any(backend not in ("openai", "ollama") for backend in backends):
+                raise ValueError("Environment variable 'ROUTER_BACKENDS' may only list 'openai' and 'ollama'")
+            self.__router_backends = backends
+        return self.__router_backends
+
+    @property
+    def ollama_model(self) -> str:
+        """
+        Get the Ollama model that answers the calls routed to the Ollama backend.
+        """
+        if self.__ollama_model == "":
+            self.__ollama_model = self._get_str("OLLAMA_MODEL")
+        return self.__ollama_model
+
+    @property
+    def router_ewma_alpha(self) -> float:
+        """
+        Get the weight of the newest latency in a backend's moving average.
+        """
+        if self.__router_ewma_alpha is None:
+            self.__router_ewma_alpha = self._get_float("ROUTER_EWMA_ALPHA", 0.3)
+        return self.__router_ewma_alpha
+
+    @property
+    def router_latency_slack(self) -> float:
+        """
+        Get how many times slower than the fastest backend a preferred backend may be and still be chosen first.
+        """
+        if self.__router_latency_slack is None:
+            self.__router_latency_slack = self._get_float("ROUTER_LATENCY_SLACK", 3.0)
+        return self.__router_latency_slack
+
+    @property
+    def router_failure_threshold(self) -> int:
+        """
+        Get the number of consecutive failed calls after which a backend is taken out of rotation.
+        """
+        if self.__router_failure_threshold is None:
+            self.__router_failure_threshold = self._get_int("ROUTER_FAILURE_THRESHOLD", 3)
+        return self.__router_failure_threshold
+
+    @property
+    def router_cooldown(self) -> float:
+        """
+        Get the seconds a failing backend stays out of rotation before it is tried again.
+        """
+        if self.__router_cooldown is None:
+            self.__router_cooldown = self._get_float("ROUTER_COOLDOWN", 30.0)
+        return self.__router_cooldown
+
+    @property
+    def session_store(self) -> str | None:
+        """
+        Get the backend that persists tutoring sessions: "sqlite", "log", or None to keep them in memory only.
+        """
+        backend: str = self._get_str("SESSION_STORE", "none").lower()
+        if backend not in ("none", "sqlite", "log"):
+            raise ValueError("Environment variable 'SESSION_STORE' must be 'none', 'sqlite' or 'log'")
+        return None if backend == "none" else backend
+
+    @property
+    def session_store_path(self) -> str:
+        """
+        Get the SQLite database file or log directory of the session store.
+        """
+        return self._get_str("SESSION_STORE_PATH", "sessions.db" if self.session_store == "sqlite" else "sessions")
+
+    @property
+    def session_history_window(self) -> int:
+        """
+        Get the number of most recent turns of a stored session kept in memory.
+        """
+        if self.__session_history_window is None:
+            self.__session_history_window = self._get_int("SESSION_HISTORY_WINDOW", 20)
+        return self.__session_history_window
+
+    @property
+    def session_max_chars(self) -> int:
+        """
+        Get the most characters of conversation a session keeps in memory before dropping its oldest turns (0 for no cap).
+        """
+        if self.__session_max_chars is None:
+            self.__session_max_chars = self._get_int("SESSION_MAX_CHARS", 32000)
+        return self.__session_max_chars
+
+    @property
+    def session_pool_size(self) -> int:
+        """
+        Get the number of sessions the tutor service keeps in memory before evicting the least recently used one.
+        """
+        if self.__session_pool_size is None:
+            self.__session_pool_size = self._get_int("SESSION_POOL_SIZE", 20000)
+        return self.__session_pool_size
+
+    @property
+    def session_idle_timeout(self) -> float:
+        """
+        Get the seconds after which the tutor service evicts an unused session (0 to evict only when the pool is full).
+        """
+        if self.__session_idle_timeout is None:
+            self.__session_idle_timeout = self._get_float("SESSION_IDLE_TIMEOUT", 1800.0)
+        return self.__session_idle_timeout
+
+    @property
+    def trace_path(self) -> str | None:
+        """
+        Get the trace file every ask call is recorded to for replay, or None to record nothing.
+        """
+        return self._get_str("TRACE_PATH", "") or None
+
+    @property
+    def trace_payloads(self) -> bool:
+        """
+        Get whether traces also record the prompt and answer texts, not only their hash and sizes.
+        """
+        if self.__trace_payloads is None:
+            self.__trace_payloads = self._get_bool("TRACE_PAYLOADS", False)
+        return self.__trace_payloads
+
+    @property
+    def ollama_retry_timeouts(self) -> bool:
+        """
+        Get whether an Ollama call attempt that timed out is retried; off by default, as the local server is still busy with it.
+        """
+        if self.__ollama_retry_timeouts is None:
+            self.__ollama_retry_timeouts = self._get_bool("OLLAMA_RETRY_TIMEOUTS", False)
+        return self.__ollama_retry_timeouts
+
     def __init__(self) -> None:
         load_dotenv()
         self.__openai_api_key: str = ""
         self.__model_name: str = ""
+        self.__tutor_model: str | None = None
+        self.__self_reference_model: str | None = None
+        self.__self_reference_cache_size: int | None = None
+        self.__self_reference_cache_ttl: float | None = None
+        self.__self_reference_history_window: int | None = None
+        self.__speculation_role_overlap: float | None = None
+        self.__area_classifier_min_score: float | None = None
+        self.__area_classifier_min_margin: float | None = None
+        self.__http_max_connections: int | None = None
+        self.__http_max_keepalive_connections: int | None = None
+        self.__http_keepalive_expiry: float | None = None
+        self.__http_timeout: float | None = None
+        self.__http2_enabled: bool | None = None
+        self.__prompt_cache_namespace: str | None = None
+        self.__single_flight_enabled: bool | None = None
+        self.__max_concurrent_calls: int | None = None
+        self.__interactive_reserved_calls: int | None = None
+        self.__rate_limit_rpm: float | None = None
+        self.__rate_limit_tpm: float | None = None
+        self.__ollama_max_concurrent_calls: int | None = None
+        self.__call_timeout: float | None = None
+        self.__request_deadline: float | None = None
+        self.__max_attempts: int | None = None
+        self.__retry_backoff_base: float | None = None
+        self.__retry_backoff_max: float | None = None
+        self.__hedge_requests: bool | None = None
+        self.__hedge_quantile: float | None = None
+        self.__hedge_min_samples: int | None = None
+        self.__router_backends: tuple[str, ...] | None = None
+        self.__ollama_model: str = ""
+        self.__router_ewma_alpha: float | None = None
+        self.__router_latency_slack: float | None = None
+        self.__router_failure_threshold: int | None = None
+        self.__router_cooldown: float | None = None
+        self.__session_history_window: int | None = None
+        self.__session_max_chars: int | None = None
+        self.__session_pool_size: int | None = None
+        self.__session_idle_timeout: float | None = None
+        self.__trace_payloads: bool | None = None
+        self.__ollama_retry_timeouts: bool | None = None
@@ -1,11 +1,55 @@
+import hashlib
+import itertools
+import json
 import openai
+import os
+import sys
+import time
 from abc import ABC, abstractmethod
+from ai_cache import ResponseCache
 from ai_config import AIConfig
-from typing import Any, Generic, TypeVar
+from ai_clients import create_cancellable, get_async_client, get_client, is_transient_error
+from ai_instrumentation import CallRecord, instrumentation
+from ai_providers import OUTPUT_TEXT_DELTA, RESPONSE_COMPLETED, Turn, as_turns
+from ai_resilience import CallPolicy, Cancellation, current_cancellation, shared_policy
+from ai_router import LatencyRouter, shared_router
+from ai_session_store import SessionRecord, SessionStore, shared_session_store
+from ai_scheduler import CallScheduler, Ticket, shared_scheduler
+from ai_single_flight import single_flight
+from ai_trace import TraceCall, shared_recorder
+from typing import Any, Generic, Iterator, TypeVar
 from openai.types.responses import Response
 
 TAiResponse = TypeVar('TAiResponse', default=Any)
 
+# Rough size of a token, used to estimate the tokens of a call before it is sent.
+_CHARACTERS_PER_TOKEN: int = 4
+
+# Numbers conversations without a session ID in traces.
+_trace_conversations: Iterator[int] = itertools.count(1)
+
+class ChatTurn:
+	"""One turn of a conversation, stored as two slots instead of a role/content dict.
+
+	Roles are interned, so every turn of every session shares the same few role strings.
+	"""
+	__slots__ = ("role", "content")
+
+	def __init__(self, role: str, content: str) -> None:
+		"""Create a turn.
+
+		Parameters:
+			role: "user", "assistant", "developer" or "system".
+			content: Text of the turn.
+		"""
+		self.role: str = sys.intern(role)
+		self.content: str = content
+
+	def as_turn(self) -> Turn:
+		"""Return the role/content dict the providers send."""
+		return {"role": self.role, "content": self.content}
+
+
 class HistoryManager:
 	"""
 	Manage chat history and system behavior.
@@ -29,18 +73,171 @@ class HistoryManager:
 		"""
 		self.__last_assistant_response_id = response_id
 
-	def __init__(self, system_behavior: str) -> None:
-		"""Create a HistoryManager with the given system behavior.
+	@property
+	def transcript(self) -> tuple[Turn, ...]:
+		"""Turns of the conversation kept locally, so it can move between backends (empty unless recorded).
+
+		For a stored session only the last SESSION_HISTORY_WINDOW turns are
+		kept in memory; `turns` reads the whole history from the store. The
+		oldest turns are also dropped once the transcript holds more than
+		`max_chars` characters.
+		"""
+		return tuple(turn.as_turn() for turn in self.__transcript)
+
+	@property
+	def transcript_chars(self) -> int:
+		"""Characters of transcript kept in memory."""
+		return self.__transcript_chars
+
+	@property
+	def transcript_digest(self) -> str:
+		"""Digest of the recorded history, extended with every recorded exchange (empty before the first)."""
+		return self.__transcript_digest
+
+	@property
+	def has_history(self) -> bool:
+		"""Whether the next call continues earlier turns, by response ID or from the recorded transcript."""
+		return self.__last_assistant_response_id is not None or bool(self.__transcript_digest)
+
+	@property
+	def session_id(self) -> str | None:
+		"""Identifier of the stored session, or None when the conversation is kept in memory only."""
+		return self.__session_id
+
+	@property
+	def persistent(self) -> bool:
+		"""Whether the conversation is saved to a SessionStore."""
+		return self.__session_store is not None
+
+	@property
+	def area_of_knowledge(self) -> str | None:
+		"""Area of knowledge inferred for the last question, or None."""
+		return self.__area_of_knowledge
+
+	@property
+	def tutor_role(self) -> str | None:
+		"""Tutor role clarified for the last question, or None to use the system behavior alone."""
+		return self.__tutor_role
+
+	def __init__(self, system_behavior: str, session_store: SessionStore | None = None, session_id: str | None = None,
+				 history_window: int = 0, max_chars: int = 0) -> None:
+		"""Create a HistoryManager with the given system behavior, resuming a stored session if one is given.
+
+		Resuming reads the session header and its last `history_window`
+		turns only, whatever the length of the session.
 
 		Parameters:
 			system_behavior: System instruction string.
+			session_store: Store the conversation is saved to, or None to keep it in memory only.
+			session_id: Identifier of the stored session; required with a session store.
+			history_window: Number of most recent turns of a stored session kept in memory.
+			max_chars: Most characters of transcript kept in memory, or 0 for no cap; the latest turn is always kept.
 		"""
-		self.__system_behavior: str = system_behavior
+		if session_store is not None and not session_id:
+			raise ValueError("A session ID is required to store the conversation")
+		# Every session of a tutor shares one copy of its instructions.
+		self.__system_behavior: str = sys.intern(system_behavior)
 		self.__last_assistant_response_id: str | None = None
+		self.__transcript: tuple[ChatTurn, ...] = ()
+		self.__transcript_chars: int = 0
+		self.__max_chars: int = max(max_chars, 0)
+		self.__transcript_digest: str = ""
+		self.__session_store: SessionStore | None = session_store
+		self.__session_id: str | None = session_id if session_store is not None else None
+		self.__history_window: int = max(history_window, 0)
+		self.__turn_count: int = 0
+		self.__area_of_knowledge: str | None = None
+		self.__tutor_role: str | None = None
+		if session_store is not None:
+			record: SessionRecord | None = session_store.load(session_id)
+			if record is not None:
+				self.__restore(record, session_store.recent_turns(session_id, self.__history_window))
+
+	def record_exchange(self, request_input: str | list[dict[str, str]], answer: str) -> None:
+		"""Append a request and its answer to the transcript, and save them with the session state.
+
+		Parameters:
+			request_input: Input of the call, text or role/content items.
+			answer: Output text of the answer.
+		"""
+		turns: list[Turn] = [*as_turns(request_input), {"role": "assistant", "content": answer}]
+		self.__transcript_digest = hashlib.sha256(
+			f"{self.__transcript_digest}\0{json.dumps(turns, sort_keys=True)}".encode("utf-8")
+		).hexdigest()
+		self.__turn_count += len(turns)
+		self.__set_transcript(self.__transcript + tuple(ChatTurn(turn["role"], turn["content"]) for turn in turns))
+		if self.__session_store is not None:
+			self.__session_store.save(self.__record(), [(turn["role"], turn["content"]) for turn in turns])
+
+	def set_profile(self, area_of_knowledge: str | None, tutor_role: str | None) -> None:
+		"""Remember the inferred area of knowledge and the clarified tutor role, and save them.
+
+		Parameters:
+			area_of_knowledge: Inferred area of knowledge, or None.
+			tutor_role: Clarified tutor role, or None.
+		"""
+		if (area_of_knowledge, tutor_role) == (self.__area_of_knowledge, self.__tutor_role):
+			return
+		# Sessions on the same topic share one copy of the area and role.
+		self.__area_of_knowledge = sys.intern(area_of_knowledge) if area_of_knowledge else area_of_knowledge
+		self.__tutor_role = sys.intern(tutor_role) if tutor_role else tutor_role
+		if self.__session_store is not None:
+			self.__session_store.save(self.__record())
+
+	def turns(self) -> Iterator[Turn]:
+		"""Iterate over the whole recorded history, reading a stored session from the store as it is consumed.
+
+		Yields:
+			Turn: Role and content of a turn, the oldest first.
+		"""
+		if self.__session_store is None:
+			for turn in self.__transcript:
+				yield turn.as_turn()
+			return
+		for role, content in self.__session_store.turns(self.__session_id):
+			yield {"role": role, "content": content}
+
+	def __set_transcript(self, transcript: tuple[ChatTurn, ...]) -> None:
+		"""Keep a transcript in memory, dropping its oldest turns beyond the window of a stored session and the character cap."""
+		if self.__session_store is not None and len(transcript) > self.__history_window:
+			transcript = transcript[len(transcript) - self.__history_window:]
+		chars: int = sum(len(turn.content) for turn in transcript)
+		if self.__max_chars:
+			start: int = 0
+			while chars > self.__max_chars and start < len(transcript) - 1:
+				chars -= len(transcript[start].content)
+				start += 1
+			# Never start the history with the answer to a question that was dropped.
+			while start and transcript[start].role == "assistant" and start < len(transcript) - 1:
+				chars -= len(transcript[start].content)
+				start += 1
+			transcript = transcript[start:]
+		self.__transcript = transcript
+		self.__transcript_chars = chars
+
+	def __record(self) -> SessionRecord:
+		"""Return the header of the stored session."""
+		return SessionRecord(self.__session_id, self.__turn_count, area_of_knowledge=self.__area_of_knowledge,
+							 tutor_role=self.__tutor_role, response_id=self.__last_assistant_response_id)
+
+	def __restore(self, record: SessionRecord, recent_turns: list[tuple[str, str]]) -> None:
+		"""Continue a stored session from its header and most recent turns."""
+		self.__last_assistant_response_id = record.response_id
+		self.__area_of_knowledge = sys.intern(record.area_of_knowledge) if record.area_of_knowledge else None
+		self.__tutor_role = sys.intern(record.tutor_role) if record.tutor_role else None
+		self.__turn_count = record.turn_count
+		self.__set_transcript(tuple(ChatTurn(role, content) for role, content in recent_turns))
+		if record.turn_count:
+			self.__transcript_digest = hashlib.sha256(f"{record.session_id}\0{record.turn_count}".encode("utf-8")).hexdigest()
 
 
 class AICore(ABC, Generic[TAiResponse]):
 	"""Base class for AI calls and history handling."""
+	# Stage reported to instrumentation hooks for calls made outside any stage block.
+	_default_stage: str = "ask"
+	# Whether a synchronous attempt gives up by itself after its timeout; otherwise it runs on a thread of its own and is cancelled when it times out.
+	_enforces_timeout: bool = True
+
 	@property
 	def config(self) -> AIConfig:
 		"""Get the current AIBrochureConfig."""
@@ -60,7 +257,7 @@ class AICore(ABC, Generic[TAiResponse]):
 
 	@property
 	def _ai_api(self) -> openai.OpenAI:
-		"""Lazily initialize and return the OpenAI client.
+		"""Lazily look up and return the shared, pooled OpenAI client.
 
 		Raises:
 			ValueError: If configuration is not set.
@@ -68,52 +265,519 @@ class AICore(ABC, Generic[TAiResponse]):
 		if self.__ai_api is None:
 			if self.config is None:
 				raise ValueError("Configuration must be set before accessing AI API")
-			self.__ai_api = openai.OpenAI(api_key=self.config.openai_api_key)
+			self.__ai_api = get_client(self.config)
 		return self.__ai_api
 
+	@property
+	def _async_ai_api(self) -> openai.AsyncOpenAI:
+		"""Return the shared, pooled asynchronous OpenAI client for the running event loop.
+
+		Raises:
+			ValueError: If configuration is not set.
+		"""
+		if self.config is None:
+			raise ValueError("Configuration must be set before accessing AI API")
+		return get_async_client(self.config)
+
+	@property
+	def _scheduler(self) -> CallScheduler:
+		"""Return the shared scheduler that admits calls to the OpenAI API."""
+		if self.__scheduler is None:
+			self.__scheduler = shared_scheduler("openai", self.config.max_concurrent_calls, self.config.rate_limit_rpm,
+												self.config.rate_limit_tpm, self.config.interactive_reserved_calls)
+		return self.__scheduler
+
+	@property
+	def _policy(self) -> CallPolicy:
+		"""Return the shared policy for timeouts, retries and hedging of OpenAI calls."""
+		return shared_policy("openai", is_transient_error, self.config.call_timeout, self.config.max_attempts,
+							 self.config.retry_backoff_base, self.config.retry_backoff_max,
+							 self.config.hedge_quantile if self.config.hedge_requests else None,
+							 self.config.hedge_min_samples)
+
+	@property
+	def _router(self) -> LatencyRouter | None:
+		"""Return the shared router between the ROUTER_BACKENDS, or None when calls go to OpenAI only."""
+		if not self.config.router_backends:
+			return None
+		return shared_router(self.config)
+
 	@property
 	def history_manager(self) -> HistoryManager:
 		"""Return the HistoryManager instance."""
 		return self.__history_manager
 
-	def __init__(self, config: AIConfig, system_behavior: str) -> None:
+	@property
+	def _model(self) -> str:
+		"""Model this instance sends its calls to."""
+		return self.config.model_name
+
+	@property
+	def _reasoning_effort(self) -> str | None:
+		"""Reasoning effort sent with every call, or None to use the model's default."""
+		return None
+
+	@property
+	def _prompt_cache_key(self) -> str | None:
+		"""Key that routes calls sharing these instructions to the same prompt cache, or None when disabled.
+
+		The key is derived from the model and the system behavior, which form
+		the static prefix of every call, so all instances with the same
+		instructions share one cache entry on the provider side.
+		"""
+		if self.__prompt_cache_key is None and self.config.prompt_cache_namespace:
+			digest: str = hashlib.sha256(
+				f"{self._model}\0{self.history_manager.system_behavior}".encode("utf-8")
+			).hexdigest()
+			self.__prompt_cache_key = f"{self.config.prompt_cache_namespace}-{digest[:16]}"
+		return self.__prompt_cache_key
+
+	def __init__(self, config: AIConfig, system_behavior: str, session_id: str | None = None) -> None:
 		"""Initialize with config and system behavior.
 
 		Parameters:
 			config: AIBrochureConfig for this instance.
 			system_behavior: System behavior string (instructions).
+			session_id: Stored session to resume or start when SESSION_STORE is set; None keeps the conversation in memory.
 		"""
 		# Initialize all instance-level attributes here
 		self.__config: AIConfig = config
-		self.__history_manager: HistoryManager = HistoryManager(system_behavior)
+		session_store: SessionStore | None = None
+		if session_id is not None and config.session_store is not None:
+			session_store = shared_session_store(config.session_store, config.session_store_path)
+		self.__history_manager: HistoryManager = HistoryManager(system_behavior, session_store, session_id,
+																  config.session_history_window, config.session_max_chars)
 		self.__ai_api: openai.OpenAI | None = None
+		self.__prompt_cache_key: str | None = None
+		self.__scheduler: CallScheduler | None = None
+		self.__trace_conversation: str | None = None
 
 		if __debug__:
 			# Sanity check: confirm attributes are initialized
 			assert hasattr(self, "_AICore__config")
 			assert hasattr(self, "_AICore__history_manager")
 			assert hasattr(self, "_AICore__ai_api")
+			assert hasattr(self, "_AICore__prompt_cache_key")
+			assert hasattr(self, "_AICore__scheduler")
 
-	def ask(self, request: str) -> TAiResponse:
+	def ask(self, request: str, call_overrides: dict[str, Any] | None = None) -> TAiResponse:
 		"""Send a request to the model and return the processed response.
 
 		Parameters:
 			request: Input text to send to the model.
+			call_overrides: Optional entries merged into the call configuration.
+
+		Returns:
+			Processed AI response.
+		"""
+		call_configuration: dict = self._form_call_configuration(request)
+		if call_overrides:
+			call_configuration.update(call_overrides)
+		trace: TraceCall | None = self._start_trace(request)
+		try:
+			response: Response = self._send_shared(call_configuration)
+		except Exception as error:
+			if trace is not None:
+				trace.finish(error=error)
+			raise
+		if trace is not None:
+			self._finish_trace(trace, response)
+		self._commit_response(response, call_configuration)
+		return self._process_response(response)
+
+	async def ask_async(self, request: str, call_overrides: dict[str, Any] | None = None) -> TAiResponse:
+		"""Asynchronously send a request to the model and return the processed response.
+
+		Parameters:
+			request: Input text to send to the model.
+			call_overrides: Optional entries merged into the call configuration.
 
 		Returns:
 			Processed AI response.
 		"""
 		call_configuration: dict = self._form_call_configuration(request)
-		response: Response = self._ai_api.responses.create(
-			**call_configuration
+		if call_overrides:
+			call_configuration.update(call_overrides)
+		trace: TraceCall | None = self._start_trace(request)
+		try:
+			response: Response = await self._send_shared_async(call_configuration)
+		except Exception as error:
+			if trace is not None:
+				trace.finish(error=error)
+			raise
+		if trace is not None:
+			self._finish_trace(trace, response)
+		self._commit_response(response, call_configuration)
+		return self._process_response(response)
+
+	def ask_stream(self, request: str) -> Iterator[str]:
+		"""Send a request to the model and yield output text as it is generated.
+
+		The last assistant response ID is updated once the stream completes; a
+		stream the caller closes early leaves the history unchanged and is traced
+		as cancelled. An identical stream already in flight is replayed instead
+		of sending another call.
+
+		Parameters:
+			request: Input text to send to the model.
+
+		Yields:
+			str: Chunks of output text.
+		"""
+		call_configuration: dict = self._form_call_configuration(request)
+		call_configuration["stream"] = True
+		trace: TraceCall | None = self._start_trace(request)
+		started: float = time.perf_counter()
+		try:
+			events: Iterator[Any] = self._send_stream(call_configuration)
+			if self.config.single_flight_enabled:
+				shared: bool
+				events, shared = single_flight.stream(self._flight_key(call_configuration),
+													  lambda: self._send_stream(call_configuration))
+				if shared:
+					self._record_cache_hit(started)
+			for event in events:
+				if event.type == OUTPUT_TEXT_DELTA:
+					yield event.delta
+				elif event.type == RESPONSE_COMPLETED:
+					if trace is not None:
+						self._finish_trace(trace, event.response)
+						trace = None
+					self._commit_response(event.response, call_configuration)
+		except Exception as error:
+			if trace is not None:
+				trace.finish(error=error)
+			raise
+		except GeneratorExit:
+			if trace is not None:
+				trace.finish(error="cancelled")
+			raise
+
+	def _send_stream(self, call_configuration: dict[str, Any]) -> Iterator[Any]:
+		"""Call the Responses API in streaming mode and yield its events.
+
+		Parameters:
+			call_configuration: Complete configuration for the API call, with "stream" set.
+
+		Yields:
+			Events of the stream; the call is recorded when it completes.
+		"""
+		router: LatencyRouter | None = self._router
+		if router is not None:
+			yield from router.stream(call_configuration, self.history_manager.transcript, self._default_stage)
+			return
+		ticket: Ticket
+		with self._scheduler.slot(self._estimate_tokens(call_configuration)) as ticket:
+			started: float = time.perf_counter()
+			timeout: float | None = self._policy.attempt_timeout()
+			options: dict[str, Any] = {} if timeout is None else {"timeout": timeout}
+			for event in self._ai_api.responses.create(**call_configuration, **options):
+				if event.type == "response.completed":
+					ticket.tokens = self._used_tokens(event.response, ticket.tokens)
+					self._record_call(call_configuration, started, event.response, ticket.queue_wait)
+				yield event
+
+	def _send_shared(self, call_configuration: dict[str, Any]) -> Response:
+		"""Send a call, or wait for an identical call already in flight and share its response.
+
+		Parameters:
+			call_configuration: Complete configuration for the API call.
+
+		Returns:
+			Response: Raw Response object from the API.
+		"""
+		if not self.config.single_flight_enabled:
+			return self._send(call_configuration)
+		started: float = time.perf_counter()
+		response: Response
+		shared: bool
+		response, shared = single_flight.do(self._flight_key(call_configuration), lambda: self._send(call_configuration))
+		if shared:
+			self._record_cache_hit(started)
+		return response
+
+	async def _send_shared_async(self, call_configuration: dict[str, Any]) -> Response:
+		"""Asynchronously send a call, or wait for an identical call already in flight and share its response.
+
+		Parameters:
+			call_configuration: Complete configuration for the API call.
+
+		Returns:
+			Response: Raw Response object from the API.
+		"""
+		if not self.config.single_flight_enabled:
+			return await self._send_async(call_configuration)
+		started: float = time.perf_counter()
+		response: Response
+		shared: bool
+		response, shared = await single_flight.do_async(self._flight_key(call_configuration),
+														lambda: self._send_async(call_configuration))
+		if shared:
+			self._record_cache_hit(started)
+		return response
+
+	def _flight_key(self, call_configuration: dict[str, Any]) -> str:
+		"""Return the key under which identical calls share one in-flight call.
+
+		The key covers the whole configuration - model, instructions, the
+		role in the input and the previous response the conversation continues
+		from - with the input text normalized, so only calls that would get
+		the same answer are coalesced. Conversations with different histories,
+		and instances of different classes, never share a call.
+
+		Parameters:
+			call_configuration: Complete configuration for the API call.
+
+		Returns:
+			str: Digest of the normalized configuration.
+		"""
+		normalized: dict[str, Any] = dict(call_configuration)
+		request_input: Any = normalized.get("input")
+		if isinstance(request_input, str):
+			normalized["input"] = ResponseCache.normalize(request_input)
+		elif isinstance(request_input, list):
+			normalized["input"] = [{**item, "content": ResponseCache.normalize(str(item.get("content", "")))}
+								   for item in request_input]
+		if self.history_manager.transcript_digest:
+			normalized["transcript"] = self.history_manager.transcript_digest
+		payload: str = json.dumps(normalized, sort_keys=True, default=str)
+		return hashlib.sha256(f"{type(self).__qualname__}\0{payload}".encode("utf-8")).hexdigest()
+
+	def _send(self, call_configuration: dict[str, Any]) -> Response:
+		"""Call the model without touching the conversation state.
+
+		Attempts are timed out, retried and hedged by the CallPolicy within
+		the current deadline. Every attempt sends the same configuration,
+		including previous_response_id, and only the returned response is
+		committed by the caller, so a losing hedged attempt never becomes part
+		of the conversation.
+
+		With ROUTER_BACKENDS set, the call is sent by the LatencyRouter along
+		with the transcript, and a ProviderReply is returned instead.
+
+		Parameters:
+			call_configuration: Complete configuration for the API call.
+
+		Returns:
+			Response: Raw Response object from the API.
+		"""
+		router: LatencyRouter | None = self._router
+		if router is not None:
+			return router.send(call_configuration, self.history_manager.transcript, self._default_stage)
+		return self._policy.run(self._latency_key(call_configuration),
+								lambda timeout: self._send_once(call_configuration, timeout), self._enforces_timeout)
+
+	async def _send_async(self, call_configuration: dict[str, Any]) -> Response:
+		"""Asynchronously call the model without touching the conversation state.
+
+		Parameters:
+			call_configuration: Complete configuration for the API call.
+
+		Returns:
+			Response: Raw Response object from the API.
+		"""
+		router: LatencyRouter | None = self._router
+		if router is not None:
+			return await router.send_async(call_configuration, self.history_manager.transcript, self._default_stage)
+		return await self._policy.run_async(self._latency_key(call_configuration),
+											lambda timeout: self._send_once_async(call_configuration, timeout))
+
+	def _send_once(self, call_configuration: dict[str, Any], timeout: float | None = None) -> Response:
+		"""Make one attempt of a call to the Responses API.
+
+		Parameters:
+			call_configuration: Complete configuration for the API call.
+			timeout: Seconds allowed for the attempt, or None.
+
+		Returns:
+			Response: Raw Response object from the API.
+		"""
+		ticket: Ticket
+		with self._scheduler.slot(self._estimate_tokens(call_configuration)) as ticket:
+			started: float = time.perf_counter()
+			timeout = self._admitted_timeout(timeout)
+			options: dict[str, Any] = {} if timeout is None else {"timeout": timeout}
+			cancellation: Cancellation | None = current_cancellation()
+			response: Response = (self._ai_api.responses.create(**call_configuration, **options) if cancellation is None
+								  else create_cancellable(self._ai_api, call_configuration, cancellation, options))
+			ticket.tokens = self._used_tokens(response, ticket.tokens)
+		self._record_call(call_configuration, started, response, ticket.queue_wait)
+		return response
+
+	async def _send_once_async(self, call_configuration: dict[str, Any], timeout: float | None = None) -> Response:
+		"""Asynchronously make one attempt of a call to the Responses API.
+
+		Parameters:
+			call_configuration: Complete configuration for the API call.
+			timeout: Seconds allowed for the attempt, or None.
+
+		Returns:
+			Response: Raw Response object from the API.
+		"""
+		ticket: Ticket
+		async with self._scheduler.slot_async(self._estimate_tokens(call_configuration)) as ticket:
+			started: float = time.perf_counter()
+			timeout = self._admitted_timeout(timeout)
+			options: dict[str, Any] = {} if timeout is None else {"timeout": timeout}
+			response: Response = await self._async_ai_api.responses.create(**call_configuration, **options)
+			ticket.tokens = self._used_tokens(response, ticket.tokens)
+		self._record_call(call_configuration, started, response, ticket.queue_wait)
+		return response
+
+	def _admitted_timeout(self, timeout: float | None) -> float | None:
+		"""Cut an attempt's timeout to the time left before the deadline once the scheduler has admitted it.
+
+		Parameters:
+			timeout: Timeout the attempt was started with, or None.
+
+		Returns:
+			float | None: Seconds left for the call itself, or None.
+
+		Raises:
+			DeadlineExceeded: If the deadline passed while the call was queued.
+		"""
+		left: float | None = self._policy.attempt_timeout()
+		if timeout is None or left is None:
+			return left if timeout is None else timeout
+		return min(timeout, left)
+
+	def _latency_key(self, call_configuration: dict[str, Any]) -> str:
+		"""Return the kind of a call for the hedging threshold: its stage and model.
+
+		Parameters:
+			call_configuration: Complete configuration for the API call.
+
+		Returns:
+			str: Latency key.
+		"""
+		return f"{instrumentation.current_stage(self._default_stage)}:{call_configuration.get('model', '')}"
+
+	def _is_retryable(self, error: BaseException) -> bool:
+		"""Whether a failed call is transient, so its stage may be skipped instead of failing the request.
+
+		Parameters:
+			error: Error raised by _send or _send_async.
+
+		Returns:
+			bool: True for timeouts and errors the policy retries.
+		"""
+		return self._policy.is_retryable(error)
+
+	def _estimate_tokens(self, call_configuration: dict[str, Any]) -> int:
+		"""Estimate the tokens a call uses, for the tokens-per-minute limit.
+
+		Earlier turns referenced by previous_response_id are not counted; the
+		estimate is corrected with the reported usage once the call returns.
+
+		Parameters:
+			call_configuration: Complete configuration for the API call.
+
+		Returns:
+			int: Estimated prompt tokens plus the output limit, if one is set.
+		"""
+		characters: int = len(str(call_configuration.get("instructions", ""))) + len(str(call_configuration.get("input", "")))
+		return characters // _CHARACTERS_PER_TOKEN + int(call_configuration.get("max_output_tokens") or 0)
+
+	def _used_tokens(self, response: Response, estimated: int) -> int:
+		"""Return the tokens a call used as reported by the API, or the estimate when it reports none.
+
+		Parameters:
+			response: Response returned by the call.
+			estimated: Tokens estimated before the call.
+
+		Returns:
+			int: Tokens charged against the tokens-per-minute limit.
+		"""
+		total: Any = getattr(getattr(response, "usage", None), "total_tokens", None)
+		return total if isinstance(total, int) else estimated
+
+	def _record_call(self, call_configuration: dict[str, Any], started: float, response: Response,
+					 queue_wait: float = 0.0) -> None:
+		"""Report a finished model call to the instrumentation hooks, if any are registered.
+
+		Parameters:
+			call_configuration: Configuration the call was made with.
+			started: perf_counter() value taken before the call.
+			response: Response returned by the call.
+			queue_wait: Seconds the call waited for the scheduler before being sent.
+		"""
+		if not instrumentation.enabled:
+			return
+		usage: Any = getattr(response, "usage", None)
+		details: Any = getattr(usage, "input_tokens_details", None)
+		instrumentation.emit(CallRecord(
+			stage=instrumentation.current_stage(self._default_stage),
+			model=str(call_configuration.get("model", "")),
+			wall_time=time.perf_counter() - started,
+			queue_wait=queue_wait,
+			prompt_tokens=getattr(usage, "input_tokens", None),
+			completion_tokens=getattr(usage, "output_tokens", None),
+			cached_tokens=getattr(details, "cached_tokens", None)
+		))
+
+	def _start_trace(self, request: str) -> TraceCall | None:
+		"""Start tracing an ask call, or return None when TRACE_PATH is not set.
+
+		Parameters:
+			request: Input text of the call.
+
+		Returns:
+			TraceCall | None: Call to finish once it has been answered or has failed.
+		"""
+		if not self.config.trace_path:
+			return None
+		if self.__trace_conversation is None:
+			self.__trace_conversation = self.history_manager.session_id or f"{os.getpid()}-{next(_trace_conversations)}"
+		return shared_recorder(self.config.trace_path, self.config.trace_payloads).start(
+			instrumentation.current_stage(self._default_stage), self.__trace_conversation, request
 		)
+
+	def _finish_trace(self, trace: TraceCall, response: Response) -> None:
+		"""Record a traced ask call with the token usage and answer of its response.
+
+		Parameters:
+			trace: Call started by _start_trace.
+			response: Response of the call, or a ProviderReply when it was routed.
+		"""
+		usage: Any = getattr(response, "usage", None)
+		trace.finish(getattr(usage, "input_tokens", None), getattr(usage, "output_tokens", None),
+					 getattr(response, "output_text", None))
+
+	def _record_cache_hit(self, started: float) -> None:
+		"""Report an answer served from a cache instead of a model call.
+
+		Parameters:
+			started: perf_counter() value taken before the cache lookup.
+		"""
+		if instrumentation.enabled:
+			instrumentation.emit(CallRecord(stage=instrumentation.current_stage(self._default_stage),
+											model=self._model, wall_time=time.perf_counter() - started,
+											cache_hit=True))
+
+	def _commit_response(self, response: Response, call_configuration: dict[str, Any]) -> None:
+		"""Make a response part of the conversation, so the next call continues from it.
+
+		When calls are routed, the exchange is also added to the transcript,
+		which any backend can continue from; the response id is None after an
+		answer from a backend that keeps no conversation state. A stored
+		session saves the exchange and the response id.
+
+		Parameters:
+			response: Response to continue the conversation from.
+			call_configuration: Configuration of the call the response answers.
+		"""
 		self.history_manager.last_assistant_response_id = response.id
-		return self._process_response(response)
+		if self._router is not None or self.history_manager.persistent:
+			self.history_manager.record_exchange(call_configuration["input"], response.output_text)
 
 	@abstractmethod
 	def _form_call_configuration(self, request: str) -> dict[str, Any]:
 		"""Build the call configuration dict for the API call.
 
+		The instructions never change during a conversation, so the provider
+		can reuse the processed prefix (instructions and earlier turns) of
+		every call; anything that varies per question belongs in the input.
+
 		Parameters:
 			request: The input text to include in the call configuration.
 
@@ -121,12 +785,16 @@ class AICore(ABC, Generic[TAiResponse]):
 			dict: Configuration for the API call.
 		"""
 		call_configuration: dict = {
-			"model": self.config.model_name,
+			"model": self._model,
 			"instructions": self.history_manager.system_behavior,
 			"input": request
 		}
 		if self.history_manager.last_assistant_response_id:
 			call_configuration["previous_response_id"] = self.history_manager.last_assistant_response_id
+		if self._prompt_cache_key:
+			call_configuration["prompt_cache_key"] = self._prompt_cache_key
+		if self._reasoning_effort:
+			call_configuration["reasoning"] = {"effort": self._reasoning_effort}
 		return call_configuration
 
 
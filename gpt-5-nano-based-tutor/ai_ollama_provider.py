@@ -0,0 +1,287 @@
+"""OllamaProvider: Provider that answers calls with a model on an Ollama server, and the shared Ollama clients."""
+import asyncio
+import threading
+import time
+import weakref
+import httpx
+from ai_config import AIConfig
+from ai_providers import OUTPUT_TEXT_DELTA, RESPONSE_COMPLETED, Provider, ProviderReply, ProviderUsage, StreamEvent, Turn, as_turns
+from ai_resilience import CallPolicy, Cancellation, current_cancellation, shared_policy
+from ai_scheduler import CallScheduler, Ticket, shared_scheduler
+from ollama import AsyncClient, ChatResponse, Client, Message, ResponseError
+from typing import Any, Iterator, Sequence
+
+_ClientKey = tuple[str | None, int, int, float, float]
+
+_clients: dict[_ClientKey, Client] = {}
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[_ClientKey, AsyncClient]] = weakref.WeakKeyDictionary()
+_clients_lock: threading.Lock = threading.Lock()
+
+# Ollama statuses worth another attempt: request timeout, overload and server errors.
+_RETRYABLE_STATUSES: frozenset[int] = frozenset((408, 429, 500, 502, 503, 504))
+
+def is_transient_error(error: BaseException) -> bool:
+	"""Whether an Ollama error is worth another attempt: lost connections, overload and server errors."""
+	if isinstance(error, ResponseError):
+		return error.status_code in _RETRYABLE_STATUSES
+	return isinstance(error, (httpx.TransportError, ConnectionError))
+
+def _chat_cancellable(client: Client, arguments: dict[str, Any], cancellation: Cancellation) -> tuple[str, ChatResponse]:
+	"""Make a chat call as a stream and return its text and final chunk, stopping once the attempt is abandoned.
+
+	Leaving the stream closes the request, which makes the server stop
+	generating and frees the attempt's scheduler slot; a plain call would keep
+	both until the whole answer was generated.
+
+	Parameters:
+		client: Ollama client.
+		arguments: Keyword arguments for Client.chat.
+		cancellation: Cancellation of the running attempt.
+
+	Returns:
+		tuple[str, ChatResponse]: Answer text and the final chunk with the token counts.
+
+	Raises:
+		TimeoutError: If the attempt is abandoned before the answer is complete.
+	"""
+	chunks: list[str] = []
+	last: ChatResponse | None = None
+	stream: Iterator[ChatResponse] = client.chat(**arguments, stream=True)
+	try:
+		for last in stream:
+			if cancellation.cancelled:
+				raise TimeoutError("Model call abandoned")
+			chunks.append(last.message.content or "")
+	finally:
+		close: Any = getattr(stream, "close", None)
+		if close is not None:
+			close()
+	if last is None:
+		raise ResponseError("The server sent no response", 502)
+	return "".join(chunks), last
+
+def _client_key(config: AIConfig) -> _ClientKey:
+	"""Return the settings that identify a shared Ollama client.
+
+	Parameters:
+		config: Configuration with the Ollama host and HTTP pool settings.
+
+	Returns:
+		tuple: Key of the client in the registry.
+	"""
+	return (config.ollama_host,
+			config.http_max_connections,
+			config.http_max_keepalive_connections,
+			config.http_keepalive_expiry,
+			config.http_timeout)
+
+def _client_options(config: AIConfig) -> dict[str, Any]:
+	"""Return the httpx options passed through the Ollama client constructor.
+
+	Parameters:
+		config: Configuration with the HTTP pool settings.
+
+	Returns:
+		dict: Keyword arguments for Client and AsyncClient.
+	"""
+	return {"timeout": config.http_timeout,
+			"limits": httpx.Limits(max_connections=config.http_max_connections,
+								   max_keepalive_connections=config.http_max_keepalive_connections,
+								   keepalive_expiry=config.http_keepalive_expiry)}
+
+def get_ollama_client(config: AIConfig) -> Client:
+	"""Return the Ollama client shared by every caller with the same host and pool settings.
+
+	Parameters:
+		config: Configuration with the Ollama host and HTTP pool settings.
+
+	Returns:
+		Client: Shared Ollama client.
+	"""
+	key: _ClientKey = _client_key(config)
+	with _clients_lock:
+		if key not in _clients:
+			_clients[key] = Client(host=config.ollama_host, **_client_options(config))
+		return _clients[key]
+
+def get_async_ollama_client(config: AIConfig) -> AsyncClient:
+	"""Return the asynchronous Ollama client shared on the running event loop.
+
+	Parameters:
+		config: Configuration with the Ollama host and HTTP pool settings.
+
+	Returns:
+		AsyncClient: Client shared by every caller with the same settings on the same loop.
+
+	Raises:
+		RuntimeError: If called outside a running event loop.
+	"""
+	loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+	key: _ClientKey = _client_key(config)
+	with _clients_lock:
+		loop_clients: dict[_ClientKey, AsyncClient] = _async_clients.setdefault(loop, {})
+		if key not in loop_clients:
+			loop_clients[key] = AsyncClient(host=config.ollama_host, **_client_options(config))
+		return loop_clients[key]
+
+
+class OllamaProvider(Provider):
+	"""Provider for a model on an Ollama server.
+
+	Ollama keeps no conversation state, so every call sends the instructions,
+	the history and the input as chat messages; previous_response_id,
+	prompt_cache_key and reasoning settings are dropped, and developer
+	messages become system messages. Its replies have no id, so the next call
+	of the conversation sends the history on any backend.
+
+	Parameters:
+		config: Configuration with the Ollama host, limits and retry settings.
+		model: Ollama model answering every call, or None to use the model named in the call configuration.
+	"""
+	# Client.chat takes no per-call timeout, so synchronous attempts run on their own thread and stream,
+	# which lets an abandoned attempt close its request at the next chunk.
+	_enforces_timeout: bool = False
+
+	@property
+	def name(self) -> str:
+		"""Backend name."""
+		return "ollama"
+
+	@property
+	def scheduler(self) -> CallScheduler:
+		"""Shared scheduler of the Ollama server, limited by OLLAMA_MAX_CONCURRENT_CALLS only."""
+		return shared_scheduler(f"ollama:{self.config.ollama_host or 'default'}", self.config.ollama_max_concurrent_calls,
+								interactive_reserve=self.config.interactive_reserved_calls)
+
+	@property
+	def policy(self) -> CallPolicy:
+		"""Shared policy of calls to the Ollama server."""
+		return shared_policy(f"ollama:{self.config.ollama_host or 'default'}", is_transient_error,
+							 self.config.call_timeout, self.config.max_attempts, self.config.retry_backoff_base,
+							 self.config.retry_backoff_max, self.config.hedge_quantile if self.config.hedge_requests else None,
+							 self.config.hedge_min_samples, self.config.ollama_retry_timeouts)
+
+	def __init__(self, config: AIConfig, model: str | None = None) -> None:
+		"""Create a provider for the configured Ollama server.
+
+		Parameters:
+			config: Configuration with the Ollama host, limits and retry settings.
+			model: Ollama model answering every call, or None to use the model named in the call configuration.
+		"""
+		super().__init__(config)
+		self.__model: str | None = model
+
+	def model(self, call_configuration: dict[str, Any]) -> str:
+		"""Return the Ollama model that answers a call.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+
+		Returns:
+			str: Model name on the Ollama server.
+		"""
+		return self.__model or super().model(call_configuration)
+
+	def send_once(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+				  timeout: float | None = None, default_stage: str = "ask") -> ProviderReply:
+		"""Make one attempt of a call to Ollama.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			timeout: Enforced by the CallPolicy, as the Ollama client takes no per-call timeout.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+		arguments: dict[str, Any] = self.chat_arguments(call_configuration, history)
+		cancellation: Cancellation | None = current_cancellation()
+		ticket: Ticket
+		with self.scheduler.slot() as ticket:
+			started: float = time.perf_counter()
+			text: str
+			response: ChatResponse
+			if cancellation is None:
+				response = get_ollama_client(self.config).chat(**arguments)
+				text = response.message.content or ""
+			else:
+				text, response = _chat_cancellable(get_ollama_client(self.config), arguments, cancellation)
+		return self.__finish(text, response, self.model(call_configuration), started, ticket, default_stage)
+
+	async def send_once_async(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+							  timeout: float | None = None, default_stage: str = "ask") -> ProviderReply:
+		"""Asynchronously make one attempt of a call to Ollama.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			timeout: Enforced by the CallPolicy, as the Ollama client takes no per-call timeout.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+		ticket: Ticket
+		async with self.scheduler.slot_async() as ticket:
+			started: float = time.perf_counter()
+			response: ChatResponse = await get_async_ollama_client(self.config).chat(
+				**self.chat_arguments(call_configuration, history)
+			)
+		return self.__finish(response.message.content or "", response, self.model(call_configuration), started, ticket,
+							 default_stage)
+
+	def stream(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+			   default_stage: str = "ask") -> Iterator[StreamEvent]:
+		"""Answer a call to Ollama in streaming mode.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Yields:
+			StreamEvent: Output text deltas, then one completion event carrying the whole reply.
+		"""
+		ticket: Ticket
+		with self.scheduler.slot() as ticket:
+			started: float = time.perf_counter()
+			chunks: list[str] = []
+			last: ChatResponse | None = None
+			for last in get_ollama_client(self.config).chat(**self.chat_arguments(call_configuration, history), stream=True):
+				if last.message.content:
+					chunks.append(last.message.content)
+					yield StreamEvent(OUTPUT_TEXT_DELTA, delta=last.message.content)
+		reply: ProviderReply = self.__finish("".join(chunks), last, self.model(call_configuration), started, ticket,
+											 default_stage)
+		yield StreamEvent(RESPONSE_COMPLETED, response=reply)
+
+	def chat_arguments(self, call_configuration: dict[str, Any], history: Sequence[Turn] = ()) -> dict[str, Any]:
+		"""Translate a call configuration and its history into Ollama chat arguments.
+
+		Parameters:
+			call_configuration: Responses API configuration.
+			history: Earlier turns of the conversation.
+
+		Returns:
+			dict: Keyword arguments for Client.chat.
+		"""
+		messages: list[Message] = [Message(role="system", content=call_configuration["instructions"])]
+		messages.extend(Message(role="system" if turn["role"] == "developer" else turn["role"], content=turn["content"])
+						for turn in [*history, *as_turns(call_configuration["input"])])
+		arguments: dict[str, Any] = {"model": self.model(call_configuration), "messages": messages}
+		text_format: dict[str, Any] = call_configuration.get("text", {}).get("format", {})
+		if text_format.get("type") == "json_schema":
+			arguments["format"] = text_format["schema"]
+		return arguments
+
+	def __finish(self, text: str, response: ChatResponse | None, model: str, started: float, ticket: Ticket,
+				 default_stage: str) -> ProviderReply:
+		"""Build the reply of a finished call and report it to the instrumentation hooks."""
+		eval_duration: int | None = getattr(response, "eval_duration", None)
+		reply: ProviderReply = ProviderReply(output_text=text, id=None,
+											 usage=ProviderUsage(getattr(response, "prompt_eval_count", None),
+																 getattr(response, "eval_count", None)),
+											 provider=self.name, model=model)
+		self._record_call(default_stage, reply, started, ticket.queue_wait, eval_duration / 1e9 if eval_duration else None)
+		return reply
@@ -0,0 +1,84 @@
+"""OllamaSelfReference: AISelfReference that runs the helper calls on a local Ollama model."""
+from ai_config import AIConfig
+from ai_ollama_provider import OllamaProvider
+from ai_providers import ProviderReply
+from ai_resilience import CallPolicy
+from ai_router import LatencyRouter
+from ai_scheduler import CallScheduler
+from ai_self_reference import AISelfReference
+from typing import Any
+
+
+class OllamaSelfReference(AISelfReference):
+	"""AISelfReference whose helper calls go to a local Ollama model.
+
+	Selected with SELF_REFERENCE_BACKEND=ollama; SELF_REFERENCE_MODEL names the
+	Ollama model. The prompts, caching and recent-turn window are the same as
+	for AISelfReference; only the call itself is made by an OllamaProvider,
+	which translates the Responses API configuration to an Ollama chat
+	request. The helper calls stay on Ollama even when ROUTER_BACKENDS is set;
+	the tutor itself uses the OpenAI model or the router.
+
+	Parameters:
+		config: Configuration for model selection and the Ollama host.
+	"""
+	# Client.chat takes no per-call timeout, so synchronous attempts run on their own thread and stop once abandoned.
+	_enforces_timeout: bool = False
+
+	@property
+	def _reasoning_effort(self) -> str | None:
+		"""Small local helper models do not reason, so no thinking setting is sent."""
+		return None
+
+	@property
+	def _prompt_cache_key(self) -> str | None:
+		"""Ollama reuses its KV cache by prefix without a key."""
+		return None
+
+	@property
+	def _scheduler(self) -> CallScheduler:
+		"""Return the shared scheduler of the Ollama server, limited by OLLAMA_MAX_CONCURRENT_CALLS only."""
+		return self.__provider.scheduler
+
+	@property
+	def _policy(self) -> CallPolicy:
+		"""Return the shared policy for timeouts, retries and hedging of calls to the Ollama server."""
+		return self.__provider.policy
+
+	@property
+	def _router(self) -> LatencyRouter | None:
+		"""Helper calls are pinned to Ollama, so they are never routed."""
+		return None
+
+	def __init__(self, config: AIConfig) -> None:
+		"""Initialize the helper with a provider for the configured Ollama server.
+
+		Parameters:
+			config: Configuration for model selection and the Ollama host.
+		"""
+		super().__init__(config)
+		self.__provider: OllamaProvider = OllamaProvider(config)
+
+	def _send_once(self, call_configuration: dict[str, Any], timeout: float | None = None) -> ProviderReply:
+		"""Make one attempt of a helper call to Ollama.
+
+		Parameters:
+			call_configuration: Responses API configuration built by _form_call_configuration.
+			timeout: Enforced by the CallPolicy, as the Ollama client takes no per-call timeout.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+		return self.__provider.send_once(call_configuration, (), timeout, self._default_stage)
+
+	async def _send_once_async(self, call_configuration: dict[str, Any], timeout: float | None = None) -> ProviderReply:
+		"""Asynchronously make one attempt of a helper call to Ollama.
+
+		Parameters:
+			call_configuration: Responses API configuration built by _form_call_configuration.
+			timeout: Enforced by the CallPolicy, as the Ollama client takes no per-call timeout.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+		return await self.__provider.send_once_async(call_configuration, (), timeout, self._default_stage)
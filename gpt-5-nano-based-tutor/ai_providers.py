@@ -0,0 +1,406 @@
+"""Provider: backend-neutral interface of the model backends, and its OpenAI implementation."""
+import time
+from abc import ABC, abstractmethod
+from ai_clients import create_cancellable, get_async_client, get_client, is_transient_error
+from ai_config import AIConfig
+from ai_instrumentation import CallRecord, instrumentation
+from ai_resilience import CallPolicy, Cancellation, current_cancellation, shared_policy
+from ai_scheduler import CallScheduler, Ticket, shared_scheduler
+from typing import Any, Iterator, NamedTuple, Sequence
+
+# Rough size of a token, used to estimate the tokens of a call before it is sent.
+_CHARACTERS_PER_TOKEN: int = 4
+
+OUTPUT_TEXT_DELTA: str = "response.output_text.delta"
+RESPONSE_COMPLETED: str = "response.completed"
+
+Turn = dict[str, str]
+
+class ProviderUsage(NamedTuple):
+	"""Tokens used by one call, as reported by the backend."""
+	input_tokens: int | None = None
+	output_tokens: int | None = None
+	cached_tokens: int | None = None
+
+	@property
+	def total_tokens(self) -> int | None:
+		"""Prompt plus completion tokens, or None when the backend reported none."""
+		if self.input_tokens is None and self.output_tokens is None:
+			return None
+		return (self.input_tokens or 0) + (self.output_tokens or 0)
+
+
+class ProviderReply(NamedTuple):
+	"""Answer of one call, in the same shape for every backend.
+
+	The attribute names follow the Responses API, so AICore handles a reply
+	like a Response. `id` is None for backends that keep no conversation
+	state, so the next call sends the portable history instead.
+	"""
+	output_text: str
+	id: str | None
+	usage: ProviderUsage
+	provider: str
+	model: str
+
+
+class StreamEvent(NamedTuple):
+	"""Event of a streamed call, shaped like a Responses API stream event."""
+	type: str
+	delta: str = ""
+	response: ProviderReply | None = None
+
+
+def as_turns(request_input: str | list[dict[str, str]]) -> list[Turn]:
+	"""Return the input of a call configuration as conversation turns.
+
+	Parameters:
+		request_input: Input text, or a list of role/content items.
+
+	Returns:
+		list[Turn]: Role/content dicts.
+	"""
+	if isinstance(request_input, str):
+		return [{"role": "user", "content": request_input}]
+	return [{"role": item["role"], "content": item["content"]} for item in request_input]
+
+
+class Provider(ABC):
+	"""Backend that answers the call configurations built by AICore.
+
+	A call configuration holds the model, instructions, input and optional
+	structured-output and reasoning settings of a Responses API call; every
+	provider answers it with a ProviderReply. The earlier turns of the
+	conversation are passed separately as portable history, which a provider
+	sends whenever it cannot continue the conversation from
+	previous_response_id, so a conversation can move to another backend
+	between any two calls.
+
+	Calls are admitted by the backend's shared CallScheduler and timed out,
+	retried and hedged by its shared CallPolicy, the same ones AICore uses,
+	so the limits hold across routed and direct calls.
+
+	Parameters:
+		config: Configuration with the backend settings.
+	"""
+	# Whether a synchronous attempt gives up by itself after its timeout; otherwise it runs on a thread of its own and is cancelled when it times out.
+	_enforces_timeout: bool = True
+
+	@property
+	@abstractmethod
+	def name(self) -> str:
+		"""Backend name, e.g. "openai" or "ollama"."""
+
+	@property
+	@abstractmethod
+	def scheduler(self) -> CallScheduler:
+		"""Shared scheduler that admits calls to the backend."""
+
+	@property
+	@abstractmethod
+	def policy(self) -> CallPolicy:
+		"""Shared policy for timeouts, retries and hedging of calls to the backend."""
+
+	@property
+	def config(self) -> AIConfig:
+		"""Configuration of the backend."""
+		return self.__config
+
+	@property
+	def load(self) -> float:
+		"""Calls in flight and queued per concurrency slot; 0 when the backend has no concurrency limit."""
+		capacity: int = self.scheduler.max_concurrency
+		if capacity <= 0:
+			return 0.0
+		return (self.scheduler.active + sum(self.scheduler.queue_depth.values())) / capacity
+
+	def __init__(self, config: AIConfig) -> None:
+		"""Create a provider for the configured backend.
+
+		Parameters:
+			config: Configuration with the backend settings.
+		"""
+		self.__config: AIConfig = config
+
+	def model(self, call_configuration: dict[str, Any]) -> str:
+		"""Return the model that answers a call.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+
+		Returns:
+			str: Model name on this backend.
+		"""
+		return str(call_configuration.get("model", ""))
+
+	def send(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+			 default_stage: str = "ask") -> ProviderReply:
+		"""Answer a call within the current deadline, retrying and hedging it as the policy allows.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+		return self.policy.run(self.__latency_key(call_configuration, default_stage),
+							   lambda timeout: self.send_once(call_configuration, history, timeout, default_stage),
+							   self._enforces_timeout)
+
+	async def send_async(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+						 default_stage: str = "ask") -> ProviderReply:
+		"""Asynchronously answer a call within the current deadline, retrying and hedging it as the policy allows.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+		return await self.policy.run_async(self.__latency_key(call_configuration, default_stage),
+										   lambda timeout: self.send_once_async(call_configuration, history, timeout,
+																				default_stage))
+
+	def is_retryable(self, error: BaseException) -> bool:
+		"""Whether a failed call is transient, so another backend may answer it instead.
+
+		Parameters:
+			error: Error raised by send or send_async.
+
+		Returns:
+			bool: True for timeouts and errors the policy retries.
+		"""
+		return self.policy.is_retryable(error)
+
+	@abstractmethod
+	def send_once(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+				  timeout: float | None = None, default_stage: str = "ask") -> ProviderReply:
+		"""Make one attempt of a call.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			timeout: Seconds allowed for the attempt, or None.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+
+	@abstractmethod
+	async def send_once_async(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+							  timeout: float | None = None, default_stage: str = "ask") -> ProviderReply:
+		"""Asynchronously make one attempt of a call.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			timeout: Seconds allowed for the attempt, or None.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+
+	@abstractmethod
+	def stream(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+			   default_stage: str = "ask") -> Iterator[StreamEvent]:
+		"""Answer a call in streaming mode.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Yields:
+			StreamEvent: Output text deltas, then one completion event carrying the whole reply.
+		"""
+
+	def _admitted_timeout(self, timeout: float | None) -> float | None:
+		"""Cut an attempt's timeout to the time left before the deadline once the scheduler has admitted it.
+
+		Parameters:
+			timeout: Timeout the attempt was started with, or None.
+
+		Returns:
+			float | None: Seconds left for the call itself, or None.
+
+		Raises:
+			DeadlineExceeded: If the deadline passed while the call was queued.
+		"""
+		left: float | None = self.policy.attempt_timeout()
+		if timeout is None or left is None:
+			return left if timeout is None else timeout
+		return min(timeout, left)
+
+	def _estimate_tokens(self, call_configuration: dict[str, Any], history: Sequence[Turn]) -> int:
+		"""Estimate the tokens a call uses, for the tokens-per-minute limit.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns sent along with the call.
+
+		Returns:
+			int: Estimated prompt tokens plus the output limit, if one is set.
+		"""
+		characters: int = (len(str(call_configuration.get("instructions", ""))) + len(str(call_configuration.get("input", "")))
+						   + sum(len(turn["content"]) for turn in history))
+		return characters // _CHARACTERS_PER_TOKEN + int(call_configuration.get("max_output_tokens") or 0)
+
+	def _record_call(self, default_stage: str, reply: ProviderReply, started: float, queue_wait: float,
+					 eval_duration: float | None = None) -> None:
+		"""Report a finished call to the instrumentation hooks, if any are registered.
+
+		Parameters:
+			default_stage: Stage reported for calls made outside any stage block.
+			reply: Answer of the call.
+			started: perf_counter() value taken before the call.
+			queue_wait: Seconds the call waited for the scheduler before being sent.
+			eval_duration: Seconds the backend spent generating, when it reports them.
+		"""
+		if not instrumentation.enabled:
+			return
+		instrumentation.emit(CallRecord(
+			stage=instrumentation.current_stage(default_stage),
+			model=reply.model,
+			wall_time=time.perf_counter() - started,
+			queue_wait=queue_wait,
+			prompt_tokens=reply.usage.input_tokens,
+			completion_tokens=reply.usage.output_tokens,
+			cached_tokens=reply.usage.cached_tokens,
+			eval_duration=eval_duration
+		))
+
+	def __latency_key(self, call_configuration: dict[str, Any], default_stage: str) -> str:
+		"""Return the kind of a call for the hedging threshold: its stage and model."""
+		return f"{instrumentation.current_stage(default_stage)}:{self.model(call_configuration)}"
+
+
+class OpenAIProvider(Provider):
+	"""Provider for the OpenAI Responses API.
+
+	A call that has a previous_response_id continues the conversation stored
+	by OpenAI, which holds every earlier turn; any other call with history
+	sends the history as input, e.g. after turns answered by another backend.
+
+	Parameters:
+		config: Configuration with the API key, limits and retry settings.
+	"""
+
+	@property
+	def name(self) -> str:
+		"""Backend name."""
+		return "openai"
+
+	@property
+	def scheduler(self) -> CallScheduler:
+		"""Shared scheduler of the OpenAI API, the one AICore uses."""
+		return shared_scheduler("openai", self.config.max_concurrent_calls, self.config.rate_limit_rpm,
+								self.config.rate_limit_tpm, self.config.interactive_reserved_calls)
+
+	@property
+	def policy(self) -> CallPolicy:
+		"""Shared policy of OpenAI calls, the one AICore uses."""
+		return shared_policy("openai", is_transient_error, self.config.call_timeout, self.config.max_attempts,
+							 self.config.retry_backoff_base, self.config.retry_backoff_max,
+							 self.config.hedge_quantile if self.config.hedge_requests else None,
+							 self.config.hedge_min_samples)
+
+	def send_once(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+				  timeout: float | None = None, default_stage: str = "ask") -> ProviderReply:
+		"""Make one attempt of a call to the Responses API.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			timeout: Seconds allowed for the attempt, or None.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+		request: dict[str, Any] = self.__request(call_configuration, history)
+		ticket: Ticket
+		with self.scheduler.slot(self._estimate_tokens(call_configuration, history)) as ticket:
+			started: float = time.perf_counter()
+			timeout = self._admitted_timeout(timeout)
+			options: dict[str, Any] = {} if timeout is None else {"timeout": timeout}
+			cancellation: Cancellation | None = current_cancellation()
+			response: Any = (get_client(self.config).responses.create(**request, **options) if cancellation is None
+							 else create_cancellable(get_client(self.config), request, cancellation, options))
+			reply: ProviderReply = self.__reply(response, self.model(call_configuration))
+			ticket.tokens = reply.usage.total_tokens or ticket.tokens
+		self._record_call(default_stage, reply, started, ticket.queue_wait)
+		return reply
+
+	async def send_once_async(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+							  timeout: float | None = None, default_stage: str = "ask") -> ProviderReply:
+		"""Asynchronously make one attempt of a call to the Responses API.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			timeout: Seconds allowed for the attempt, or None.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+		request: dict[str, Any] = self.__request(call_configuration, history)
+		ticket: Ticket
+		async with self.scheduler.slot_async(self._estimate_tokens(call_configuration, history)) as ticket:
+			started: float = time.perf_counter()
+			timeout = self._admitted_timeout(timeout)
+			options: dict[str, Any] = {} if timeout is None else {"timeout": timeout}
+			reply: ProviderReply = self.__reply(await get_async_client(self.config).responses.create(**request, **options),
+												self.model(call_configuration))
+			ticket.tokens = reply.usage.total_tokens or ticket.tokens
+		self._record_call(default_stage, reply, started, ticket.queue_wait)
+		return reply
+
+	def stream(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+			   default_stage: str = "ask") -> Iterator[StreamEvent]:
+		"""Answer a call to the Responses API in streaming mode.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Yields:
+			StreamEvent: Output text deltas, then one completion event carrying the whole reply.
+		"""
+		request: dict[str, Any] = {**self.__request(call_configuration, history), "stream": True}
+		ticket: Ticket
+		with self.scheduler.slot(self._estimate_tokens(call_configuration, history)) as ticket:
+			started: float = time.perf_counter()
+			timeout: float | None = self.policy.attempt_timeout()
+			options: dict[str, Any] = {} if timeout is None else {"timeout": timeout}
+			for event in get_client(self.config).responses.create(**request, **options):
+				if event.type == OUTPUT_TEXT_DELTA:
+					yield StreamEvent(OUTPUT_TEXT_DELTA, delta=event.delta)
+				elif event.type == RESPONSE_COMPLETED:
+					reply: ProviderReply = self.__reply(event.response, self.model(call_configuration))
+					ticket.tokens = reply.usage.total_tokens or ticket.tokens
+					self._record_call(default_stage, reply, started, ticket.queue_wait)
+					yield StreamEvent(RESPONSE_COMPLETED, response=reply)
+
+	@staticmethod
+	def __request(call_configuration: dict[str, Any], history: Sequence[Turn]) -> dict[str, Any]:
+		"""Prepend the history to the input unless the call continues a conversation stored by OpenAI."""
+		if not history or call_configuration.get("previous_response_id"):
+			return call_configuration
+		return {**call_configuration, "input": [*history, *as_turns(call_configuration["input"])]}
+
+	def __reply(self, response: Any, model: str) -> ProviderReply:
+		"""Convert a Response into a ProviderReply."""
+		usage: Any = getattr(response, "usage", None)
+		details: Any = getattr(usage, "input_tokens_details", None)
+		return ProviderReply(output_text=response.output_text, id=response.id,
+							 usage=ProviderUsage(getattr(usage, "input_tokens", None), getattr(usage, "output_tokens", None),
+												 getattr(details, "cached_tokens", None)),
+							 provider=self.name, model=model)
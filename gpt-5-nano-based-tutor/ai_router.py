@@ -0,0 +1,282 @@
+"""LatencyRouter: send each model call to the backend with the best recent latency, load and health."""
+import threading
+import time
+from ai_config import AIConfig
+from ai_providers import OpenAIProvider, Provider, ProviderReply, StreamEvent, Turn
+from typing import Any, Iterator, Sequence
+
+class _Backend:
+	"""Routing state of one provider."""
+	__slots__ = ("provider", "latency", "failures", "down_until", "calls", "errors", "failovers")
+
+	def __init__(self, provider: Provider) -> None:
+		self.provider: Provider = provider
+		self.latency: float | None = None
+		self.failures: int = 0
+		self.down_until: float = 0.0
+		self.calls: int = 0
+		self.errors: int = 0
+		self.failovers: int = 0
+
+
+class LatencyRouter:
+	"""Route model calls between providers by observed latency, load and health.
+
+	Each backend keeps an exponentially weighted moving average (EWMA) of its
+	call latency, queueing included, and its load is read from its scheduler.
+	A call goes to the first backend, in order of preference, that has a free
+	concurrency slot and whose average latency is within LATENCY_SLACK times
+	that of the fastest such backend; a backend with no latency sample yet is
+	always tried. When every backend is saturated, the one with the lowest
+	expected latency, its average scaled by its load, is chosen. So with
+	"ollama,openai" local capacity is used first and calls burst to OpenAI
+	only when the local server is full or much slower.
+
+	A call that fails transiently on one backend, after that backend's own
+	retries, is sent to the next one. A backend that fails FAILURE_THRESHOLD
+	calls in a row is skipped for COOLDOWN seconds, then tried again; one
+	success restores it. Backends are only tried while down when all are.
+
+	Parameters:
+		providers: Providers in order of preference.
+		ewma_alpha: Weight of the newest latency in the moving average.
+		latency_slack: How many times slower than the fastest backend a preferred backend may be.
+		failure_threshold: Consecutive failed calls after which a backend is taken out of rotation.
+		cooldown: Seconds a failing backend stays out of rotation.
+	"""
+
+	@property
+	def providers(self) -> tuple[Provider, ...]:
+		"""Providers in order of preference."""
+		return tuple(backend.provider for backend in self.__backends)
+
+	def __init__(self, providers: Sequence[Provider], ewma_alpha: float = 0.3, latency_slack: float = 3.0,
+				 failure_threshold: int = 3, cooldown: float = 30.0) -> None:
+		"""Create a router with no observations yet.
+
+		Parameters:
+			providers: Providers in order of preference.
+			ewma_alpha: Weight of the newest latency in the moving average.
+			latency_slack: How many times slower than the fastest backend a preferred backend may be.
+			failure_threshold: Consecutive failed calls after which a backend is taken out of rotation.
+			cooldown: Seconds a failing backend stays out of rotation.
+
+		Raises:
+			ValueError: If no provider is given.
+		"""
+		if not providers:
+			raise ValueError("LatencyRouter needs at least one provider")
+		self.__backends: tuple[_Backend, ...] = tuple(_Backend(provider) for provider in providers)
+		self.__ewma_alpha: float = ewma_alpha
+		self.__latency_slack: float = latency_slack
+		self.__failure_threshold: int = max(failure_threshold, 1)
+		self.__cooldown: float = cooldown
+		self.__lock: threading.Lock = threading.Lock()
+
+	def order(self) -> list[Provider]:
+		"""Return the providers in the order the next call would try them.
+
+		Returns:
+			list[Provider]: Every provider, the chosen one first.
+		"""
+		return [backend.provider for backend in self.__ordered()]
+
+	def send(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+			 default_stage: str = "ask") -> ProviderReply:
+		"""Answer a call on the best backend, failing over to the next ones on transient errors.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+		last_error: Exception | None = None
+		for backend in self.__ordered():
+			started: float = time.monotonic()
+			try:
+				reply: ProviderReply = backend.provider.send(call_configuration, history, default_stage)
+			except Exception as error:
+				if not self.__failed(backend, error):
+					raise
+				last_error = error
+				continue
+			self.__succeeded(backend, time.monotonic() - started)
+			return reply
+		assert last_error is not None
+		raise last_error
+
+	async def send_async(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+						 default_stage: str = "ask") -> ProviderReply:
+		"""Asynchronously answer a call on the best backend, failing over to the next ones on transient errors.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Returns:
+			ProviderReply: Answer of the call.
+		"""
+		last_error: Exception | None = None
+		for backend in self.__ordered():
+			started: float = time.monotonic()
+			try:
+				reply: ProviderReply = await backend.provider.send_async(call_configuration, history, default_stage)
+			except Exception as error:
+				if not self.__failed(backend, error):
+					raise
+				last_error = error
+				continue
+			self.__succeeded(backend, time.monotonic() - started)
+			return reply
+		assert last_error is not None
+		raise last_error
+
+	def stream(self, call_configuration: dict[str, Any], history: Sequence[Turn] = (),
+			   default_stage: str = "ask") -> Iterator[StreamEvent]:
+		"""Answer a call in streaming mode on the best backend.
+
+		A stream fails over only until its first event; after that the
+		consumer has seen part of the answer and the error is raised.
+
+		Parameters:
+			call_configuration: Complete configuration for the call.
+			history: Earlier turns of the conversation.
+			default_stage: Stage reported for calls made outside any stage block.
+
+		Yields:
+			StreamEvent: Output text deltas, then one completion event carrying the whole reply.
+		"""
+		last_error: Exception | None = None
+		for backend in self.__ordered():
+			started: float = time.monotonic()
+			streaming: bool = False
+			try:
+				for event in backend.provider.stream(call_configuration, history, default_stage):
+					streaming = True
+					yield event
+			except Exception as error:
+				if not self.__failed(backend, error) or streaming:
+					raise
+				last_error = error
+				continue
+			self.__succeeded(backend, time.monotonic() - started)
+			return
+		assert last_error is not None
+		raise last_error
+
+	def stats(self) -> dict[str, dict[str, Any]]:
+		"""Return the routing state of every backend.
+
+		Returns:
+			dict: Backend name -> JSON-serializable latency average, load, health and counters.
+		"""
+		now: float = time.monotonic()
+		with self.__lock:
+			return {backend.provider.name: {
+				"latency_ewma": backend.latency,
+				"load": backend.provider.load,
+				"healthy": backend.down_until <= now,
+				"consecutive_failures": backend.failures,
+				"calls": backend.calls,
+				"errors": backend.errors,
+				"failovers": backend.failovers
+			} for backend in self.__backends}
+
+	def __ordered(self) -> list[_Backend]:
+		"""Order the backends: preferred available ones, then the rest by expected latency, then the ones down."""
+		now: float = time.monotonic()
+		with self.__lock:
+			loads: dict[int, float] = {id(backend): backend.provider.load for backend in self.__backends}
+			healthy: list[_Backend] = [backend for backend in self.__backends if backend.down_until <= now]
+			down: list[_Backend] = sorted((backend for backend in self.__backends if backend.down_until > now),
+										  key=lambda backend: backend.down_until)
+			available: list[_Backend] = [backend for backend in healthy if loads[id(backend)] < 1.0]
+			fastest: float | None = min((backend.latency for backend in available if backend.latency is not None),
+										default=None)
+			preferred: list[_Backend] = [backend for backend in available
+										 if backend.latency is None or fastest is None
+										 or backend.latency <= fastest * self.__latency_slack]
+			rest: list[_Backend] = sorted((backend for backend in healthy if backend not in preferred),
+										  key=lambda backend: (backend.latency or 0.0) * (1.0 + loads[id(backend)]))
+		return preferred + rest + down
+
+	def __succeeded(self, backend: _Backend, seconds: float) -> None:
+		"""Fold a call's latency into the backend's average and mark the backend healthy."""
+		with self.__lock:
+			backend.calls += 1
+			backend.failures = 0
+			backend.down_until = 0.0
+			if backend.latency is None:
+				backend.latency = seconds
+			else:
+				backend.latency += self.__ewma_alpha * (seconds - backend.latency)
+
+	def __failed(self, backend: _Backend, error: Exception) -> bool:
+		"""Count a failed call and return whether another backend may answer it."""
+		if not backend.provider.is_retryable(error):
+			return False
+		with self.__lock:
+			backend.calls += 1
+			backend.errors += 1
+			backend.failovers += 1
+			backend.failures += 1
+			if backend.failures >= self.__failure_threshold:
+				backend.down_until = time.monotonic() + self.__cooldown
+		return True
+
+
+_routers: dict[tuple[Any, ...], LatencyRouter] = {}
+_routers_lock: threading.Lock = threading.Lock()
+
+def _create_provider(backend: str, config: AIConfig) -> Provider:
+	"""Create the provider of a backend named in ROUTER_BACKENDS.
+
+	Parameters:
+		backend: "openai" or "ollama".
+		config: Configuration with the backend settings.
+
+	Returns:
+		Provider: Provider of the backend.
+	"""
+	if backend == "ollama":
+		# Imported here so the ollama package is only needed when the local backend is selected.
+		from ai_ollama_provider import OllamaProvider
+		return OllamaProvider(config, config.ollama_model)
+	return OpenAIProvider(config)
+
+def shared_router(config: AIConfig) -> LatencyRouter:
+	"""Return the process-wide router between the backends listed in ROUTER_BACKENDS.
+
+	Parameters:
+		config: Configuration with the routed backends and router settings.
+
+	Returns:
+		LatencyRouter: Router shared by every caller using the same settings.
+	"""
+	key: tuple[Any, ...] = (config.router_backends,
+							config.ollama_host,
+							config.ollama_model if "ollama" in config.router_backends else None,
+							config.router_ewma_alpha,
+							config.router_latency_slack,
+							config.router_failure_threshold,
+							config.router_cooldown)
+	with _routers_lock:
+		if key not in _routers:
+			_routers[key] = LatencyRouter([_create_provider(backend, config) for backend in config.router_backends],
+										  config.router_ewma_alpha, config.router_latency_slack,
+										  config.router_failure_threshold, config.router_cooldown)
+		return _routers[key]
+
+def router_stats() -> dict[str, dict[str, dict[str, Any]]]:
+	"""Return the statistics of every shared router, keyed by its backend list.
+
+	Returns:
+		dict: "ollama,openai" -> LatencyRouter.stats().
+	"""
+	with _routers_lock:
+		routers: list[tuple[str, LatencyRouter]] = [(",".join(key[0]), router) for key, router in _routers.items()]
+	return {backends: router.stats() for backends, router in routers}
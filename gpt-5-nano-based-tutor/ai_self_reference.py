@@ -1,15 +1,91 @@
 """AISelfReference: helper AICore subclass that infers knowledge areas and refines tutor role."""
+import hashlib
+import json
+import time
 from ai_core import AICore
 from ai_config import AIConfig
+from ai_area_classifier import AreaClassifier, log_area, shared_classifier
+from ai_cache import ResponseCache, shared_cache
+from ai_instrumentation import staged
+from collections import deque
 from openai.types.responses import Response
-from typing import Any
+from typing import Any, NamedTuple
+
+class TutorProfile(NamedTuple):
+	"""Area of knowledge and tutor role inferred for a question."""
+	area_of_knowledge: str
+	tutor_role: str
+
+	@staticmethod
+	def parse(text: str) -> "TutorProfile | None":
+		"""Parse a JSON profile produced by the model.
+
+		Parameters:
+			text: JSON object with non-empty "area_of_knowledge" and "tutor_role" strings.
+
+		Returns:
+			TutorProfile | None: Parsed profile, or None if the text is not a valid profile.
+		"""
+		try:
+			data: Any = json.loads(text)
+		except (TypeError, ValueError):
+			return None
+		if not isinstance(data, dict):
+			return None
+		area_of_knowledge: Any = data.get("area_of_knowledge")
+		tutor_role: Any = data.get("tutor_role")
+		if not isinstance(area_of_knowledge, str) or not isinstance(tutor_role, str):
+			return None
+		if not area_of_knowledge.strip() or not tutor_role.strip():
+			return None
+		return TutorProfile(area_of_knowledge.strip(), tutor_role.strip())
+
+	def to_json(self) -> str:
+		"""Serialize the profile in the format accepted by parse."""
+		return json.dumps({"area_of_knowledge": self.area_of_knowledge, "tutor_role": self.tutor_role})
+
+
+TUTOR_PROFILE_SCHEMA: dict[str, Any] = {
+	"type": "object",
+	"properties": {
+		"area_of_knowledge": {"type": "string"},
+		"tutor_role": {"type": "string"}
+	},
+	"required": ["area_of_knowledge", "tutor_role"],
+	"additionalProperties": False
+}
 
 class AISelfReference(AICore[str]):
 	"""Component that produces concise self-referential outputs for AITutor.
 
+	Helper calls do not chain previous responses. Each call sends the system
+	behavior, the last SELF_REFERENCE_HISTORY_WINDOW turns and the current
+	prompt, so its size does not grow with the number of questions asked.
+
 	Parameters:
 		config: AIBrochureConfig used to configure the underlying AICore.
 	"""
+	_default_stage: str = "self_reference"
+
+	@property
+	def _cache(self) -> ResponseCache | None:
+		"""Cache of inferred areas and roles, or None when caching is disabled."""
+		return self.__cache
+
+	@property
+	def _area_classifier(self) -> AreaClassifier | None:
+		"""Local classifier tried before asking the model for the area, or None when no taxonomy is configured."""
+		return self.__area_classifier
+
+	@property
+	def _model(self) -> str:
+		"""Model used for the helper calls (SELF_REFERENCE_MODEL)."""
+		return self.config.self_reference_model
+
+	@property
+	def _reasoning_effort(self) -> str | None:
+		"""Reasoning effort of the helper calls (SELF_REFERENCE_REASONING_EFFORT)."""
+		return self.config.self_reference_reasoning_effort
 
 	def __init__(self, config: AIConfig) -> None:
 		"""Initialize with a compact system behavior for self-reference.
@@ -22,22 +98,93 @@ class AISelfReference(AICore[str]):
 								"Be as concrete as possible in your answers."
 								"Always answer concisely.")
 		super().__init__(config, system_behavior)
+		self.__cache: ResponseCache | None = None
+		if config.self_reference_cache_size > 0:
+			self.__cache = shared_cache(config.self_reference_cache_size,
+										config.self_reference_cache_ttl,
+										config.self_reference_cache_path)
+		self.__recent_turns: deque[tuple[str, str]] = deque(maxlen=max(config.self_reference_history_window, 0))
+		self.__area_classifier: AreaClassifier | None = None
+		if config.area_taxonomy_path:
+			self.__area_classifier = shared_classifier(config.area_taxonomy_path,
+													   config.area_classifier_min_score,
+													   config.area_classifier_min_margin)
+
+	def ask(self, request: str, call_overrides: dict[str, Any] | None = None) -> str:
+		"""Send a helper request and remember it as a recent turn.
+
+		Parameters:
+			request: Input text to send to the model.
+			call_overrides: Optional entries merged into the call configuration.
+
+		Returns:
+			str: Output text.
+		"""
+		answer: str = super().ask(request, call_overrides)
+		self.__recent_turns.append((request, answer))
+		return answer
+
+	async def ask_async(self, request: str, call_overrides: dict[str, Any] | None = None) -> str:
+		"""Asynchronously send a helper request and remember it as a recent turn.
+
+		Parameters:
+			request: Input text to send to the model.
+			call_overrides: Optional entries merged into the call configuration.
 
+		Returns:
+			str: Output text.
+		"""
+		answer: str = await super().ask_async(request, call_overrides)
+		self.__recent_turns.append((request, answer))
+		return answer
+
+	@staged("infer_area_of_knowledge")
 	def infer_area_of_knowledge(self, user_question: str) -> str:
 		"""Infer the area of knowledge from a user question.
 
+		A confident answer of the local classifier is returned without a model call.
+
+		Parameters:
+			user_question: The user's question.
+
+		Returns:
+			str: Inferred area of knowledge (as plain text).
+		"""
+		classified: str | None = self.__classify_area(user_question)
+		if classified is not None:
+			return classified
+		cache_key: str = self.__cache_key("area", user_question)
+		cached: str | None = self.__get_cached(cache_key)
+		if cached is not None:
+			return cached
+		area_of_knowledge: str = self.ask(self._form_area_of_knowledge_prompt(user_question))
+		self.__set_cached(cache_key, area_of_knowledge)
+		self.__log_area(user_question, area_of_knowledge)
+		return area_of_knowledge
+
+	@staged("infer_area_of_knowledge")
+	async def infer_area_of_knowledge_async(self, user_question: str) -> str:
+		"""Asynchronously infer the area of knowledge from a user question.
+
 		Parameters:
 			user_question: The user's question.
 
 		Returns:
 			str: Inferred area of knowledge (as plain text).
 		"""
-		prompt: str = (f"User question: {user_question}\n"
-						"Based on the question, infer the area of knowledge.\n"
-						"Respond with the inferred area of knowledge and nothing else.")
-		area_of_knowledge: str = self.ask(prompt)
+		classified: str | None = self.__classify_area(user_question)
+		if classified is not None:
+			return classified
+		cache_key: str = self.__cache_key("area", user_question)
+		cached: str | None = self.__get_cached(cache_key)
+		if cached is not None:
+			return cached
+		area_of_knowledge: str = await self.ask_async(self._form_area_of_knowledge_prompt(user_question))
+		self.__set_cached(cache_key, area_of_knowledge)
+		self.__log_area(user_question, area_of_knowledge)
 		return area_of_knowledge
 
+	@staged("clarify_tutor_role")
 	def clarify_tutor_role(self, area_of_knowledge: str, previous_system_behavior: str) -> str:
 		"""Return a corrected tutor role tailored to the given area.
 
@@ -48,15 +195,189 @@ class AISelfReference(AICore[str]):
 		Returns:
 			str: Corrected tutor role text.
 		"""
-		prompt: str = (f"Area of knowledge: {area_of_knowledge}\n"
-						f"Previous tutor's role: {previous_system_behavior}\n"
-						"Based on the area of knowledge and previous behavior, correct the tutor's role to reflect that tutor is an expert in the provided area of knowledge.\n"
-						"Respond ONLY with the corrected tutor's role, nothing else.")
-		clarified_tutor_role: str = self.ask(prompt)
+		cache_key: str = self.__cache_key("role", area_of_knowledge, previous_system_behavior)
+		cached: str | None = self.__get_cached(cache_key)
+		if cached is not None:
+			return cached
+		clarified_tutor_role: str = self.ask(self._form_tutor_role_prompt(area_of_knowledge, previous_system_behavior))
+		self.__set_cached(cache_key, clarified_tutor_role)
 		return clarified_tutor_role
 
+	@staged("clarify_tutor_role")
+	async def clarify_tutor_role_async(self, area_of_knowledge: str, previous_system_behavior: str) -> str:
+		"""Asynchronously return a corrected tutor role tailored to the given area.
+
+		Parameters:
+			area_of_knowledge: Inferred area to tailor the role for.
+			previous_system_behavior: The prior tutor system instructions.
+
+		Returns:
+			str: Corrected tutor role text.
+		"""
+		cache_key: str = self.__cache_key("role", area_of_knowledge, previous_system_behavior)
+		cached: str | None = self.__get_cached(cache_key)
+		if cached is not None:
+			return cached
+		clarified_tutor_role: str = await self.ask_async(self._form_tutor_role_prompt(area_of_knowledge, previous_system_behavior))
+		self.__set_cached(cache_key, clarified_tutor_role)
+		return clarified_tutor_role
+
+	def __cache_key(self, *parts: str) -> str:
+		"""Build a cache key scoped to the helper model and instructions, so changing either never reuses old answers."""
+		instructions: str = hashlib.sha256(self.history_manager.system_behavior.encode("utf-8")).hexdigest()[:16]
+		return ResponseCache.make_key(self._model, instructions, *parts)
+
+	def __get_cached(self, cache_key: str) -> str | None:
+		"""Return a cached answer, or None on a miss or when caching is disabled."""
+		if self._cache is None:
+			return None
+		started: float = time.perf_counter()
+		cached: str | None = self._cache.get(cache_key)
+		if cached is not None:
+			self._record_cache_hit(started)
+		return cached
+
+	def __get_cached_profile(self, cache_key: str) -> TutorProfile | None:
+		"""Return a cached profile, or None on a miss or when caching is disabled."""
+		cached: str | None = self.__get_cached(cache_key)
+		return TutorProfile.parse(cached) if cached is not None else None
+
+	def __classify_area(self, user_question: str) -> str | None:
+		"""Return the area found by the local classifier, or None when it is missing or not confident."""
+		if self._area_classifier is None:
+			return None
+		started: float = time.perf_counter()
+		area_of_knowledge: str | None = self._area_classifier.classify(user_question)
+		if area_of_knowledge is not None:
+			self._record_cache_hit(started)
+		return area_of_knowledge
+
+	def __log_area(self, user_question: str, area_of_knowledge: str) -> None:
+		"""Append an area answered by the model to AREA_LOG_PATH, if configured."""
+		if self.config.area_log_path and area_of_knowledge:
+			log_area(self.config.area_log_path, user_question, area_of_knowledge)
+
+	def __set_cached(self, cache_key: str, value: str) -> None:
+		"""Store a non-empty answer in the cache when caching is enabled."""
+		if self._cache is not None and value:
+			self._cache.set(cache_key, value)
+
+	@staged("infer_profile")
+	def infer_profile(self, user_question: str, previous_system_behavior: str) -> TutorProfile:
+		"""Infer the area of knowledge and the corrected tutor role in one structured call.
+
+		When the local classifier knows the area, only the role is asked for;
+		it is cached per area, so repeated subjects need no call at all. Falls
+		back to infer_area_of_knowledge and clarify_tutor_role if the structured
+		answer cannot be parsed.
+
+		Parameters:
+			user_question: The user's question.
+			previous_system_behavior: The prior tutor system instructions.
+
+		Returns:
+			TutorProfile: Inferred area of knowledge and tutor role.
+		"""
+		classified: str | None = self.__classify_area(user_question)
+		if classified is not None:
+			return TutorProfile(classified, self.clarify_tutor_role(classified, previous_system_behavior))
+		cache_key: str = self.__cache_key("profile", user_question, previous_system_behavior)
+		profile: TutorProfile | None = self.__get_cached_profile(cache_key)
+		if profile is not None:
+			return profile
+		profile = TutorProfile.parse(self.ask(self._form_profile_prompt(user_question, previous_system_behavior),
+											  self._form_profile_call_overrides()))
+		if profile is None:
+			area_of_knowledge: str = self.infer_area_of_knowledge(user_question)
+			return TutorProfile(area_of_knowledge, self.clarify_tutor_role(area_of_knowledge, previous_system_behavior))
+		self.__set_cached(cache_key, profile.to_json())
+		self.__log_area(user_question, profile.area_of_knowledge)
+		return profile
+
+	@staged("infer_profile")
+	async def infer_profile_async(self, user_question: str, previous_system_behavior: str) -> TutorProfile:
+		"""Asynchronously infer the area of knowledge and the corrected tutor role in one structured call.
+
+		Parameters:
+			user_question: The user's question.
+			previous_system_behavior: The prior tutor system instructions.
+
+		Returns:
+			TutorProfile: Inferred area of knowledge and tutor role.
+		"""
+		classified: str | None = self.__classify_area(user_question)
+		if classified is not None:
+			return TutorProfile(classified, await self.clarify_tutor_role_async(classified, previous_system_behavior))
+		cache_key: str = self.__cache_key("profile", user_question, previous_system_behavior)
+		profile: TutorProfile | None = self.__get_cached_profile(cache_key)
+		if profile is not None:
+			return profile
+		profile = TutorProfile.parse(await self.ask_async(self._form_profile_prompt(user_question, previous_system_behavior),
+														  self._form_profile_call_overrides()))
+		if profile is None:
+			area_of_knowledge: str = await self.infer_area_of_knowledge_async(user_question)
+			return TutorProfile(area_of_knowledge, await self.clarify_tutor_role_async(area_of_knowledge, previous_system_behavior))
+		self.__set_cached(cache_key, profile.to_json())
+		self.__log_area(user_question, profile.area_of_knowledge)
+		return profile
+
+	def _form_profile_prompt(self, user_question: str, previous_system_behavior: str) -> str:
+		"""Build the prompt that asks for the area of knowledge and the tutor role at once.
+
+		Parameters:
+			user_question: The user's question.
+			previous_system_behavior: The prior tutor system instructions.
+
+		Returns:
+			str: Prompt text.
+		"""
+		return ("Based on the question, infer the area of knowledge. "
+				"Then correct the tutor's role to reflect that tutor is an expert in that area of knowledge.\n"
+				"Respond with the inferred area of knowledge and the corrected tutor's role.\n"
+				f"Previous tutor's role: {previous_system_behavior}\n"
+				f"User question: {user_question}")
+
+	def _form_profile_call_overrides(self) -> dict[str, Any]:
+		"""Return the structured-output settings for a profile call.
+
+		Returns:
+			dict: Call configuration entries requesting a JSON schema response.
+		"""
+		return {"text": {"format": {"type": "json_schema",
+									"name": "tutor_profile",
+									"schema": TUTOR_PROFILE_SCHEMA,
+									"strict": True}}}
+
+	def _form_area_of_knowledge_prompt(self, user_question: str) -> str:
+		"""Build the prompt that asks for the area of knowledge.
+
+		Parameters:
+			user_question: The user's question.
+
+		Returns:
+			str: Prompt text.
+		"""
+		return ("Based on the question, infer the area of knowledge.\n"
+				"Respond with the inferred area of knowledge and nothing else.\n"
+				f"User question: {user_question}")
+
+	def _form_tutor_role_prompt(self, area_of_knowledge: str, previous_system_behavior: str) -> str:
+		"""Build the prompt that asks for a corrected tutor role.
+
+		Parameters:
+			area_of_knowledge: Inferred area to tailor the role for.
+			previous_system_behavior: The prior tutor system instructions.
+
+		Returns:
+			str: Prompt text.
+		"""
+		return ("Based on the area of knowledge and previous behavior, correct the tutor's role to reflect that tutor is an expert in the provided area of knowledge.\n"
+				"Respond ONLY with the corrected tutor's role, nothing else.\n"
+				f"Previous tutor's role: {previous_system_behavior}\n"
+				f"Area of knowledge: {area_of_knowledge}")
+
 	def _form_call_configuration(self, request: str) -> dict[str, Any]:
-		"""Extend call configuration with a reasoning hint.
+		"""Extend call configuration with the recent-turn window.
 
 		Parameters:
 			request: Input text to send to the model.
@@ -65,9 +386,24 @@ class AISelfReference(AICore[str]):
 			dict: Call configuration for the API.
 		"""
 		basic_call_configuration: dict[str, Any] = super()._form_call_configuration(request)
-		basic_call_configuration["reasoning"] = {"effort": "medium"}
+		basic_call_configuration.pop("previous_response_id", None)
+		if self.__recent_turns:
+			window: list[dict[str, str]] = []
+			for previous_request, previous_answer in self.__recent_turns:
+				window.append({"role": "user", "content": previous_request})
+				window.append({"role": "assistant", "content": previous_answer})
+			window.append({"role": "user", "content": request})
+			basic_call_configuration["input"] = window
 		return basic_call_configuration
 
+	def _commit_response(self, response: Response, call_configuration: dict[str, Any]) -> None:
+		"""Helper calls carry their recent-turn window in the input instead of chaining responses, so nothing is kept.
+
+		Parameters:
+			response: Response of the last helper call.
+			call_configuration: Configuration of the call.
+		"""
+
 	def _process_response(self, response: Response) -> str:
 		"""Extract output text from the API Response.
 
@@ -0,0 +1,192 @@
+"""SingleFlight: share one in-flight model call between concurrent identical requests."""
+import asyncio
+import threading
+import weakref
+from typing import Any, Awaitable, Callable, Generic, Hashable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+class _Flight:
+	"""Result slot of one synchronous call shared by its waiters."""
+	__slots__ = ("done", "result", "error")
+
+	def __init__(self) -> None:
+		self.done: threading.Event = threading.Event()
+		self.result: Any = None
+		self.error: BaseException | None = None
+
+
+class _StreamFlight:
+	"""Buffer of one stream replayed to every consumer that joined it."""
+	__slots__ = ("items", "finished", "error", "condition", "followers")
+
+	def __init__(self) -> None:
+		self.items: list[Any] = []
+		self.finished: bool = False
+		self.error: BaseException | None = None
+		self.condition: threading.Condition = threading.Condition()
+		self.followers: int = 0
+
+
+class SingleFlight(Generic[T]):
+	"""Deduplicate concurrent calls with the same key.
+
+	The first caller of a key (the leader) runs the call; callers arriving
+	while it is in flight wait for it and receive the same result or
+	exception. Once the call finishes the key is forgotten, so later calls run
+	again; caching finished answers is left to the caches. A unique call
+	costs one dictionary insert and removal and runs in the caller's own
+	thread or task, so it is not delayed.
+	"""
+
+	@property
+	def coalesced(self) -> int:
+		"""Number of calls answered by sharing another caller's call."""
+		return self.__coalesced
+
+	def __init__(self) -> None:
+		"""Create an empty registry of in-flight calls."""
+		self.__lock: threading.Lock = threading.Lock()
+		self.__flights: dict[Hashable, _Flight] = {}
+		self.__streams: dict[Hashable, _StreamFlight] = {}
+		self.__tasks: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[Hashable, asyncio.Task]] = weakref.WeakKeyDictionary()
+		self.__coalesced: int = 0
+
+	def do(self, key: Hashable, function: Callable[[], T]) -> tuple[T, bool]:
+		"""Run a call, or wait for the identical call already in flight.
+
+		Parameters:
+			key: Identity of the call.
+			function: Call to run when no identical call is in flight.
+
+		Returns:
+			tuple[T, bool]: Result and whether it was shared from another caller.
+		"""
+		with self.__lock:
+			flight: _Flight | None = self.__flights.get(key)
+			leader: bool = flight is None
+			if flight is None:
+				flight = self.__flights[key] = _Flight()
+			else:
+				self.__coalesced += 1
+		if not leader:
+			flight.done.wait()
+			if flight.error is not None:
+				raise flight.error
+			return flight.result, True
+		try:
+			flight.result = function()
+		except BaseException as error:
+			flight.error = error
+			raise
+		finally:
+			with self.__lock:
+				del self.__flights[key]
+			flight.done.set()
+		return flight.result, False
+
+	async def do_async(self, key: Hashable, function: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+		"""Asynchronously run a call, or wait for the identical call already in flight on this event loop.
+
+		The call runs as its own task, so a cancelled caller does not cancel it
+		for the others.
+
+		Parameters:
+			key: Identity of the call.
+			function: Coroutine function to run when no identical call is in flight.
+
+		Returns:
+			tuple[T, bool]: Result and whether it was shared from another caller.
+		"""
+		loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+		with self.__lock:
+			tasks: dict[Hashable, asyncio.Task] = self.__tasks.setdefault(loop, {})
+			task: asyncio.Task | None = tasks.get(key)
+			shared: bool = task is not None
+			if task is None:
+				task = tasks[key] = loop.create_task(function())
+				task.add_done_callback(lambda finished: self.__forget_task(tasks, key, finished))
+			else:
+				self.__coalesced += 1
+		return await asyncio.shield(task), shared
+
+	def stream(self, key: Hashable, function: Callable[[], Iterator[T]]) -> tuple[Iterator[T], bool]:
+		"""Consume a stream, or replay the identical stream already in flight.
+
+		The leader's iterator drives the source; everyone else reads the
+		buffered items as they arrive, from the first one. If the leader stops
+		early while others are reading, it finishes the source for them.
+
+		Parameters:
+			key: Identity of the stream.
+			function: Creates the source iterator when no identical stream is in flight.
+
+		Returns:
+			tuple[Iterator[T], bool]: Items and whether they are shared from another caller.
+		"""
+		with self.__lock:
+			flight: _StreamFlight | None = self.__streams.get(key)
+			if flight is None:
+				flight = self.__streams[key] = _StreamFlight()
+				return self.__lead(key, flight, function), False
+			flight.followers += 1
+			self.__coalesced += 1
+		return self.__follow(flight), True
+
+	def __forget_task(self, tasks: dict[Hashable, asyncio.Task], key: Hashable, task: asyncio.Task) -> None:
+		"""Drop a finished task and retrieve its exception, so an unobserved failure is not reported."""
+		with self.__lock:
+			if tasks.get(key) is task:
+				del tasks[key]
+		if not task.cancelled():
+			task.exception()
+
+	def __lead(self, key: Hashable, flight: _StreamFlight, function: Callable[[], Iterator[T]]) -> Iterator[T]:
+		"""Drive the source, publishing every item to the followers."""
+		source: Iterator[T] = function()
+		try:
+			for item in source:
+				self.__publish(flight, item)
+				yield item
+		except GeneratorExit:
+			if flight.followers:
+				for item in source:
+					self.__publish(flight, item)
+			raise
+		except BaseException as error:
+			flight.error = error
+			raise
+		finally:
+			with self.__lock:
+				if self.__streams.get(key) is flight:
+					del self.__streams[key]
+			with flight.condition:
+				flight.finished = True
+				flight.condition.notify_all()
+
+	@staticmethod
+	def __publish(flight: _StreamFlight, item: Any) -> None:
+		"""Append an item to the buffer and wake the followers."""
+		with flight.condition:
+			flight.items.append(item)
+			flight.condition.notify_all()
+
+	@staticmethod
+	def __follow(flight: _StreamFlight) -> Iterator[Any]:
+		"""Yield the buffered items of a stream driven by another caller."""
+		index: int = 0
+		while True:
+			with flight.condition:
+				while index >= len(flight.items) and not flight.finished:
+					flight.condition.wait()
+				if index < len(flight.items):
+					item: Any = flight.items[index]
+					index += 1
+				elif flight.error is not None:
+					raise flight.error
+				else:
+					return
+			yield item
+
+
+single_flight: SingleFlight = SingleFlight()
@@ -0,0 +1,223 @@
+"""TraceRecorder: opt-in record of every AICore.ask call in a compact trace file, for replaying real traffic.
+
+A trace is a JSON-lines file with one line per call and short keys:
+	t    arrival, seconds since the epoch (millisecond precision)
+	s    stage, e.g. "explain" or "infer_profile"
+	c    conversation the call belongs to
+	h    hash of the prompt (16 hex digits), so repeated prompts stay recognizable
+	d    duration in seconds
+	i    input tokens, when reported
+	o    output tokens, when reported
+	e    error type when the call failed, or "cancelled" for a stream closed early
+	p, a prompt and answer texts, only with TRACE_PAYLOADS
+Keys without a value are left out.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Iterator, NamedTuple
+
+class TraceEntry(NamedTuple):
+	"""One recorded call."""
+	arrival: float
+	stage: str
+	conversation: str
+	prompt_hash: str
+	duration: float
+	input_tokens: int | None = None
+	output_tokens: int | None = None
+	error: str | None = None
+	prompt: str | None = None
+	answer: str | None = None
+
+
+def prompt_hash(prompt: str) -> str:
+	"""Return the short hash a trace records instead of the prompt.
+
+	Parameters:
+		prompt: Prompt text.
+
+	Returns:
+		str: First 16 hex digits of the SHA-256 of the prompt.
+	"""
+	return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class TraceCall:
+	"""A call being traced: its arrival is taken when it is created and it is written when it finishes.
+
+	Parameters:
+		recorder: Recorder the call is written to.
+		stage: Stage of the call.
+		conversation: Conversation the call belongs to.
+		prompt: Prompt text.
+	"""
+	__slots__ = ("recorder", "stage", "conversation", "prompt", "arrival", "started")
+
+	def __init__(self, recorder: "TraceRecorder", stage: str, conversation: str, prompt: str) -> None:
+		"""Start timing a call.
+
+		Parameters:
+			recorder: Recorder the call is written to.
+			stage: Stage of the call.
+			conversation: Conversation the call belongs to.
+			prompt: Prompt text.
+		"""
+		self.recorder: TraceRecorder = recorder
+		self.stage: str = stage
+		self.conversation: str = conversation
+		self.prompt: str = prompt
+		self.arrival: float = time.time()
+		self.started: float = time.perf_counter()
+
+	def finish(self, input_tokens: int | None = None, output_tokens: int | None = None, answer: str | None = None,
+			   error: BaseException | str | None = None) -> None:
+		"""Write the call to the trace.
+
+		Parameters:
+			input_tokens: Input tokens reported for the call.
+			output_tokens: Output tokens reported for the call.
+			answer: Answer text, written only when the recorder keeps payloads.
+			error: Error the call failed with, a label such as "cancelled", or None.
+		"""
+		payloads: bool = self.recorder.payloads
+		self.recorder.record(TraceEntry(
+			arrival=self.arrival,
+			stage=self.stage,
+			conversation=self.conversation,
+			prompt_hash=prompt_hash(self.prompt),
+			duration=time.perf_counter() - self.started,
+			input_tokens=input_tokens if isinstance(input_tokens, int) else None,
+			output_tokens=output_tokens if isinstance(output_tokens, int) else None,
+			error=error if isinstance(error, str) or error is None else type(error).__name__,
+			prompt=self.prompt if payloads else None,
+			answer=answer if payloads and error is None else None
+		))
+
+
+class TraceRecorder:
+	"""Append traced calls to a trace file.
+
+	Every call is one line written and flushed under a lock, so traces of
+	concurrent sessions interleave whole lines and a crash loses at most the
+	line being written.
+
+	Parameters:
+		path: Trace file, created if missing and appended to otherwise.
+		payloads: Whether prompt and answer texts are recorded.
+	"""
+
+	@property
+	def path(self) -> str:
+		"""Trace file."""
+		return self.__path
+
+	@property
+	def payloads(self) -> bool:
+		"""Whether prompt and answer texts are recorded."""
+		return self.__payloads
+
+	def __init__(self, path: str, payloads: bool = False) -> None:
+		"""Open the trace file for appending.
+
+		Parameters:
+			path: Trace file, created if missing and appended to otherwise.
+			payloads: Whether prompt and answer texts are recorded.
+		"""
+		if os.path.dirname(path):
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+		self.__path: str = path
+		self.__payloads: bool = payloads
+		self.__lock: threading.Lock = threading.Lock()
+		self.__file = open(path, "a", encoding="utf-8")
+		if self.__file.tell() > 0 and not _ends_with_newline(path):
+			# Terminate a line left partially written by a crash before appending.
+			self.__file.write("\n")
+
+	def start(self, stage: str, conversation: str, prompt: str) -> TraceCall:
+		"""Start timing a call.
+
+		Parameters:
+			stage: Stage of the call.
+			conversation: Conversation the call belongs to.
+			prompt: Prompt text.
+
+		Returns:
+			TraceCall: Call to finish once it has been answered or has failed.
+		"""
+		return TraceCall(self, stage, conversation, prompt)
+
+	def record(self, entry: TraceEntry) -> None:
+		"""Append one call to the trace.
+
+		Parameters:
+			entry: Recorded call.
+		"""
+		line: dict[str, Any] = {"t": round(entry.arrival, 3), "s": entry.stage, "c": entry.conversation,
+								"h": entry.prompt_hash, "d": round(entry.duration, 4)}
+		for key, value in (("i", entry.input_tokens), ("o", entry.output_tokens), ("e", entry.error),
+						   ("p", entry.prompt), ("a", entry.answer)):
+			if value is not None:
+				line[key] = value
+		data: str = json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n"
+		with self.__lock:
+			if self.__file.closed:
+				return
+			self.__file.write(data)
+			self.__file.flush()
+
+	def close(self) -> None:
+		"""Close the trace file; calls finishing afterwards are not recorded."""
+		with self.__lock:
+			self.__file.close()
+
+
+def read_trace(path: str) -> Iterator[TraceEntry]:
+	"""Read the calls of a trace file in the order they were written.
+
+	Lines that are not valid entries, such as one torn by a crash, are skipped.
+
+	Parameters:
+		path: Trace file.
+
+	Yields:
+		TraceEntry: Recorded call.
+	"""
+	with open(path, encoding="utf-8") as trace_file:
+		for line in trace_file:
+			try:
+				data: Any = json.loads(line)
+				yield TraceEntry(arrival=float(data["t"]), stage=str(data["s"]), conversation=str(data["c"]),
+								 prompt_hash=str(data["h"]), duration=float(data["d"]),
+								 input_tokens=data.get("i"), output_tokens=data.get("o"), error=data.get("e"),
+								 prompt=data.get("p"), answer=data.get("a"))
+			except (ValueError, TypeError, KeyError, AttributeError):
+				continue
+
+def _ends_with_newline(path: str) -> bool:
+	"""Return whether a non-empty file ends with a newline."""
+	with open(path, "rb") as existing_file:
+		existing_file.seek(-1, os.SEEK_END)
+		return existing_file.read(1) == b"\n"
+
+
+_recorders: dict[str, TraceRecorder] = {}
+_recorders_lock: threading.Lock = threading.Lock()
+
+def shared_recorder(path: str, payloads: bool = False) -> TraceRecorder:
+	"""Return the process-wide recorder of a trace file, so every session appends to one open file.
+
+	Parameters:
+		path: Trace file.
+		payloads: Whether prompt and answer texts are recorded; the first caller of a path decides.
+
+	Returns:
+		TraceRecorder: Recorder shared by every caller using the same file.
+	"""
+	key: str = os.path.abspath(path)
+	with _recorders_lock:
+		if key not in _recorders:
+			_recorders[key] = TraceRecorder(path, payloads)
+		return _recorders[key]
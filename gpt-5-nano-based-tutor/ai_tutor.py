@@ -1,44 +1,188 @@
 """AITutor: wrapper that uses AICore to provide tutoring behavior and dynamic role clarification."""
 
+import asyncio
+import contextvars
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 from openai.types.responses import Response
 from ai_core import AICore
 from ai_config import AIConfig
-from ai_self_reference import AISelfReference
-from typing import Any
+from ai_resilience import Cancellation, cancellable, deadline
+from ai_self_reference import AISelfReference, TutorProfile
+from ai_semantic_cache import SemanticCache
+from typing import Any, Iterator
+
+class SpeculationStats:
+	"""Counters for speculative explanations started before the tutor role was known."""
+
+	@property
+	def attempts(self) -> int:
+		"""Number of speculative explanations started."""
+		return self.__kept + self.__restarted
+
+	@property
+	def kept(self) -> int:
+		"""Number of speculative explanations returned to the user."""
+		return self.__kept
+
+	@property
+	def restarted(self) -> int:
+		"""Number of speculative explanations discarded because the role changed."""
+		return self.__restarted
+
+	@property
+	def success_rate(self) -> float:
+		"""Share of speculative explanations that were kept."""
+		return self.__kept / self.attempts if self.attempts else 0.0
+
+	def __init__(self) -> None:
+		"""Create zeroed counters."""
+		self.__kept: int = 0
+		self.__restarted: int = 0
+		self.__lock: threading.Lock = threading.Lock()
+
+	def record(self, kept: bool) -> None:
+		"""Record the outcome of one speculative explanation.
+
+		Parameters:
+			kept: Whether the speculative explanation was returned to the user.
+		"""
+		with self.__lock:
+			if kept:
+				self.__kept += 1
+			else:
+				self.__restarted += 1
+
+
+# Words of an inferred area of knowledge that do not name a particular subject.
+_GENERIC_AREA_WORDS: frozenset[str] = frozenset(("general", "knowledge", "everyday", "common", "miscellaneous",
+												 "various", "unknown", "none", "other"))
+
+def _area_words(area: str) -> set[str]:
+	"""Return the significant words of an area of knowledge."""
+	return {word for word in re.findall(r"[a-z]+", area.lower()) if len(word) > 3}
+
+def area_overlap(area: str, reference_area: str) -> float:
+	"""Return the share of an area's significant words that also appear in a reference area.
+
+	Parameters:
+		area: Newly inferred area of knowledge.
+		reference_area: Area of knowledge an answer was written for.
+
+	Returns:
+		float: Overlap between 0 and 1; 1 when the area has no significant words.
+	"""
+	words: set[str] = _area_words(area)
+	if not words:
+		return 1.0
+	return len(words & _area_words(reference_area)) / len(words)
+
+def is_generic_area(area: str) -> bool:
+	"""Whether an inferred area of knowledge names no particular subject, e.g. "General knowledge".
+
+	Parameters:
+		area: Inferred area of knowledge.
+
+	Returns:
+		bool: True when the base behavior answers the question as well as a tailored role would.
+	"""
+	return _area_words(area) <= _GENERIC_AREA_WORDS
+
+
+_speculation_executor: ThreadPoolExecutor | None = None
+_speculation_executor_lock: threading.Lock = threading.Lock()
+
+def _executor() -> ThreadPoolExecutor:
+	"""Return the worker threads, shared by every tutor, that run speculative explanations."""
+	global _speculation_executor
+	with _speculation_executor_lock:
+		if _speculation_executor is None:
+			_speculation_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="speculative-tutor")
+		return _speculation_executor
+
 
 class AITutor(AICore[str]):
 	"""Tutor that adapts system behavior based on the user's question.
 
 	Parameters:
 		config: AIBrochureConfig used to configure the underlying AICore.
+		semantic_cache: Optional cache that answers questions similar to earlier ones.
+		session_id: Stored session to resume or start when SESSION_STORE is set.
+		self_reference: Helper shared with other tutors, or None to create one.
 	"""
+	_default_stage: str = "explain"
+
+	@property
+	def _model(self) -> str:
+		"""Model that writes the explanations (TUTOR_MODEL)."""
+		return self.config.tutor_model
+
+	@property
+	def _reasoning_effort(self) -> str | None:
+		"""Reasoning effort of the explanation calls (TUTOR_REASONING_EFFORT)."""
+		return self.config.tutor_reasoning_effort
 
 	@property
 	def _clarified_system_behavior(self) -> str | None:
-		"""Optional adjusted system instructions for a specific knowledge area."""
-		return self.__clarified_system_behavior
+		"""Optional adjusted system instructions for a specific knowledge area, kept with the session state."""
+		return self.history_manager.tutor_role
 
 	@property
 	def _self_reference(self) -> AISelfReference:
 		"""AISelfReference instance used to infer and refine tutor role."""
 		return self.__self_reference
 
-	def __init__(self, config: AIConfig) -> None:
+	@property
+	def _semantic_cache(self) -> SemanticCache | None:
+		"""Optional SemanticCache consulted before running the explanation pipeline.
+
+		Cached answers match the question alone, so the cache is only used
+		while the conversation has no earlier turns that could shape the answer.
+		"""
+		return None if self.history_manager.has_history else self.__semantic_cache
+
+	@property
+	def speculation_stats(self) -> SpeculationStats:
+		"""Outcome counters of explain_this_speculative calls."""
+		return self.__speculation_stats
+
+	def __init__(self, config: AIConfig, semantic_cache: SemanticCache | None = None, session_id: str | None = None,
+				 self_reference: AISelfReference | None = None) -> None:
 		"""Create an AITutor with a base tutor system behavior.
 
 		Parameters:
 			config: Configuration for API keys and model selection.
+			semantic_cache: Optional cache that answers questions similar to earlier ones.
+			session_id: Stored session to resume or start when SESSION_STORE is set.
+			self_reference: Helper shared with other tutors, or None to create one. Only a stateless
+				helper (SELF_REFERENCE_HISTORY_WINDOW=0) may be shared between conversations.
 		"""
 		system_behavior: str = ("You are a helpful tutor, who excels at explaining complex concepts in simple terms."
 								" You will provide detailed explanations and examples to help the user understand."
 								" If it will be needed - use analogies.")
-		super().__init__(config, system_behavior)
-		self.__self_reference: AISelfReference = AISelfReference(config)
-		self.__clarified_system_behavior: str | None = None
+		super().__init__(config, system_behavior, session_id)
+		self.__self_reference: AISelfReference
+		if self_reference is not None:
+			self.__self_reference = self_reference
+		elif config.self_reference_backend == "ollama":
+			# Imported here so the ollama package is only needed when the local backend is selected.
+			from ai_ollama_self_reference import OllamaSelfReference
+			self.__self_reference = OllamaSelfReference(config)
+		else:
+			self.__self_reference = AISelfReference(config)
+		self.__semantic_cache: SemanticCache | None = semantic_cache
+		self.__speculation_stats: SpeculationStats = SpeculationStats()
 
 	def _form_call_configuration(self, request: str) -> dict[str, Any]:
 		"""Build call configuration, applying clarified behavior if present.
 
+		The clarified role is sent as a developer message right before the
+		question instead of replacing the instructions, so the instructions and
+		the earlier conversation stay a cacheable prefix.
+
 		Parameters:
 			request: Input text to send to the model.
 
@@ -47,7 +191,10 @@ class AITutor(AICore[str]):
 		"""
 		basic_call_configuration: dict[str, Any] = super()._form_call_configuration(request)
 		if self._clarified_system_behavior:
-			basic_call_configuration["instructions"] = self._clarified_system_behavior
+			basic_call_configuration["input"] = [
+				{"role": "developer", "content": f"For this question, act as follows: {self._clarified_system_behavior}"},
+				{"role": "user", "content": request}
+			]
 
 		return basic_call_configuration
 
@@ -71,11 +218,222 @@ class AITutor(AICore[str]):
 		Returns:
 			str: Tutor's explanation for the question.
 		"""
-		inferred_area_of_knowledge: str = self._self_reference.infer_area_of_knowledge(user_question)
-		if inferred_area_of_knowledge:
-			self.__clarified_system_behavior = self._self_reference.clarify_tutor_role(inferred_area_of_knowledge, self.history_manager.system_behavior)
-		response: str = self.ask(user_question)
-		return response
+		with deadline(self.config.request_deadline):
+			semantic_cache: SemanticCache | None = self._semantic_cache
+			if semantic_cache is not None:
+				started: float = time.perf_counter()
+				# The question is embedded once, for the lookup and for adding the answer after a miss.
+				query: np.ndarray = semantic_cache.embed([user_question])
+				cached: str | None = semantic_cache.lookup(user_question, query)
+				if cached is not None:
+					self._record_cache_hit(started)
+					return cached
+			self._clarify_system_behavior(user_question)
+			response: str = self.ask(user_question)
+			if semantic_cache is not None and response:
+				semantic_cache.add(user_question, response, query)
+			return response
+
+	async def explain_this_async(self, user_question: str) -> str:
+		"""Asynchronously explain a user question, adjusting the tutor role when helpful.
+
+		Parameters:
+			user_question: The user's question to explain.
+
+		Returns:
+			str: Tutor's explanation for the question.
+		"""
+		with deadline(self.config.request_deadline):
+			semantic_cache: SemanticCache | None = self._semantic_cache
+			if semantic_cache is not None:
+				started: float = time.perf_counter()
+				query: np.ndarray = await asyncio.to_thread(semantic_cache.embed, [user_question])
+				cached: str | None = await asyncio.to_thread(semantic_cache.lookup, user_question, query)
+				if cached is not None:
+					self._record_cache_hit(started)
+					return cached
+			await self._clarify_system_behavior_async(user_question)
+			response: str = await self.ask_async(user_question)
+			if semantic_cache is not None and response:
+				await asyncio.to_thread(semantic_cache.add, user_question, response, query)
+			return response
+
+	def explain_this_stream(self, user_question: str) -> Iterator[str]:
+		"""Explain a user question, yielding the explanation as it is generated.
+
+		Parameters:
+			user_question: The user's question to explain.
+
+		Yields:
+			str: Chunks of the tutor's explanation.
+		"""
+		semantic_cache: SemanticCache | None = self._semantic_cache
+		if semantic_cache is not None:
+			started: float = time.perf_counter()
+			query: np.ndarray = semantic_cache.embed([user_question])
+			cached: str | None = semantic_cache.lookup(user_question, query)
+			if cached is not None:
+				self._record_cache_hit(started)
+				yield cached
+				return
+		with deadline(self.config.request_deadline):
+			self._clarify_system_behavior(user_question)
+		chunks: list[str] = []
+		for chunk in self.ask_stream(user_question):
+			chunks.append(chunk)
+			yield chunk
+		if semantic_cache is not None and chunks:
+			semantic_cache.add(user_question, "".join(chunks), query)
+
+	def explain_this_speculative(self, user_question: str) -> str:
+		"""Explain a user question, answering with the session's last role while the role is being inferred.
+
+		The speculative answer is written with the role of the previous question,
+		or the base behavior on the first one. It is kept when the inferred area
+		of knowledge matches the area it was written for (SPECULATION_ROLE_OVERLAP),
+		or when there was none and the inferred area is generic or unknown;
+		otherwise the question is asked again with the clarified role and the
+		speculative answer is discarded.
+
+		Parameters:
+			user_question: The user's question to explain.
+
+		Returns:
+			str: Tutor's explanation for the question.
+		"""
+		with deadline(self.config.request_deadline):
+			speculated_area: str | None = self.__speculated_area()
+			# The copied context carries the deadline, stage and priority into the worker thread.
+			speculative_call_configuration: dict[str, Any] = self._form_call_configuration(user_question)
+			speculation: Cancellation = Cancellation()
+			speculative_response: Future[Response] = _executor().submit(
+				contextvars.copy_context().run, self.__send_speculative, speculative_call_configuration, speculation
+			)
+			try:
+				profile: TutorProfile = self._infer_profile(user_question)
+			except BaseException:
+				speculation.cancel()
+				raise
+			if self.__speculation_holds(profile, speculated_area):
+				response: Response = speculative_response.result()
+				self._commit_response(response, speculative_call_configuration)
+				self.speculation_stats.record(kept=True)
+				self.__remember(profile)
+				return self._process_response(response)
+			# Closes the speculative request, so it frees its scheduler slot and connection before the real answer is asked.
+			speculation.cancel()
+			self.speculation_stats.record(kept=False)
+			self.__remember(profile)
+			return self.ask(user_question)
+
+	def __send_speculative(self, call_configuration: dict[str, Any], speculation: Cancellation) -> Response:
+		"""Send the speculative call, stopping it as soon as the speculation is cancelled."""
+		with cancellable(speculation):
+			return self._send(call_configuration)
+
+	async def explain_this_speculative_async(self, user_question: str) -> str:
+		"""Asynchronously explain a user question, answering with the session's last role while the role is being inferred.
+
+		Parameters:
+			user_question: The user's question to explain.
+
+		Returns:
+			str: Tutor's explanation for the question.
+		"""
+		with deadline(self.config.request_deadline):
+			speculated_area: str | None = self.__speculated_area()
+			speculative_call_configuration: dict[str, Any] = self._form_call_configuration(user_question)
+			speculative_response: asyncio.Task[Response] = asyncio.create_task(
+				self._send_async(speculative_call_configuration)
+			)
+			try:
+				profile: TutorProfile = await self._infer_profile_async(user_question)
+			except BaseException:
+				speculative_response.cancel()
+				raise
+			if self.__speculation_holds(profile, speculated_area):
+				response: Response = await speculative_response
+				self._commit_response(response, speculative_call_configuration)
+				self.speculation_stats.record(kept=True)
+				self.__remember(profile)
+				return self._process_response(response)
+			speculative_response.cancel()
+			self.speculation_stats.record(kept=False)
+			self.__remember(profile)
+			return await self.ask_async(user_question)
+
+	def __speculated_area(self) -> str | None:
+		"""Return the area of knowledge a speculative answer is written for, or None when it uses the base behavior."""
+		return self.history_manager.area_of_knowledge if self._clarified_system_behavior else None
+
+	def __speculation_holds(self, profile: TutorProfile, speculated_area: str | None) -> bool:
+		"""Whether the inferred profile is close enough to the one the speculative answer was written for."""
+		if not profile.area_of_knowledge or not profile.tutor_role:
+			return True
+		if not speculated_area:
+			return is_generic_area(profile.area_of_knowledge)
+		return area_overlap(profile.area_of_knowledge, speculated_area) >= self.config.speculation_role_overlap
+
+	def __remember(self, profile: TutorProfile) -> None:
+		"""Keep an inferred profile with the session, so later questions are answered and speculated with its role."""
+		if profile.area_of_knowledge and profile.tutor_role:
+			self.history_manager.set_profile(profile.area_of_knowledge, profile.tutor_role)
+
+	def _infer_profile(self, user_question: str) -> TutorProfile:
+		"""Infer the tutor profile, or return an empty one when the helper call fails transiently.
+
+		The role only tailors the answer, so a helper call that timed out or
+		kept failing after its retries leaves the base behavior in place
+		instead of failing the whole explanation.
+
+		Parameters:
+			user_question: The user's question.
+
+		Returns:
+			TutorProfile: Inferred profile, or one with empty fields.
+		"""
+		try:
+			return self._self_reference.infer_profile(user_question, self.history_manager.system_behavior)
+		except Exception as error:
+			if not self._self_reference._is_retryable(error):
+				raise
+			return TutorProfile("", "")
+
+	async def _infer_profile_async(self, user_question: str) -> TutorProfile:
+		"""Asynchronously infer the tutor profile, or return an empty one when the helper call fails transiently.
+
+		Parameters:
+			user_question: The user's question.
+
+		Returns:
+			TutorProfile: Inferred profile, or one with empty fields.
+		"""
+		try:
+			return await self._self_reference.infer_profile_async(user_question, self.history_manager.system_behavior)
+		except Exception as error:
+			if not self._self_reference._is_retryable(error):
+				raise
+			return TutorProfile("", "")
+
+	def _clarify_system_behavior(self, user_question: str) -> None:
+		"""Infer the area of knowledge and adjust the tutor role for it.
+
+		Parameters:
+			user_question: The user's question to tailor the role for.
+		"""
+		profile: TutorProfile = self._infer_profile(user_question)
+		if profile.area_of_knowledge and profile.tutor_role:
+			self.history_manager.set_profile(profile.area_of_knowledge, profile.tutor_role)
+
+	async def _clarify_system_behavior_async(self, user_question: str) -> None:
+		"""Asynchronously infer the area of knowledge and adjust the tutor role for it.
+
+		Parameters:
+			user_question: The user's question to tailor the role for.
+		"""
+		profile: TutorProfile = await self._infer_profile_async(user_question)
+		if profile.area_of_knowledge and profile.tutor_role:
+			self.history_manager.set_profile(profile.area_of_knowledge, profile.tutor_role)
 
 if __name__ == "__main__":
     # Example usage
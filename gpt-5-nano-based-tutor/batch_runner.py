@@ -0,0 +1,161 @@
+"""Batch runner: pre-generate AITutor explanations for questions from a JSONL or CSV file."""
+import argparse
+import asyncio
+import csv
+import json
+import os
+from typing import Any, Iterator, TextIO
+from ai_config import AIConfig
+from ai_scheduler import Priority, call_priority
+from ai_tutor import AITutor
+
+def read_questions(path: str, id_field: str = "id",
+				   question_field: str = "question") -> Iterator[tuple[str, str, str | None]]:
+	"""Yield (id, question, error) triples from a JSONL or CSV file.
+
+	Rows without an ID are numbered by their position in the file. A JSONL
+	line that is not a JSON object is yielded with an empty question and the
+	reason, so one bad line does not stop the rest of the file.
+
+	Parameters:
+		path: Input file; ".csv" files are read as CSV, anything else as JSONL.
+		id_field: Name of the column or key holding the question ID.
+		question_field: Name of the column or key holding the question text.
+
+	Yields:
+		tuple[str, str, str | None]: Question ID, question text and, for a malformed line, the error.
+	"""
+	with open(path, newline="", encoding="utf-8") as input_file:
+		rows: Iterator[Any]
+		if path.lower().endswith(".csv"):
+			rows = csv.DictReader(input_file)
+		else:
+			rows = _json_rows(input_file)
+		for position, row in enumerate(rows, start=1):
+			if isinstance(row, ValueError):
+				yield str(position), "", f"Malformed input line: {row}"
+				continue
+			if not isinstance(row, dict):
+				yield str(position), "", f"Malformed input line: expected a JSON object, got {type(row).__name__}"
+				continue
+			question: Any = row.get(question_field)
+			if not question:
+				continue
+			question_id: Any = row.get(id_field)
+			yield (str(question_id) if question_id not in (None, "") else str(position)), str(question), None
+
+def _json_rows(input_file: TextIO) -> Iterator[Any]:
+	"""Yield the parsed non-blank lines of a JSONL file, or the error of a line that is not valid JSON."""
+	for line in input_file:
+		if not line.strip():
+			continue
+		try:
+			yield json.loads(line)
+		except ValueError as error:
+			yield error
+
+def read_completed_ids(path: str) -> set[str]:
+	"""Return the IDs already answered in an output JSONL file.
+
+	Rows that recorded an error are not treated as completed, so they are retried.
+
+	Parameters:
+		path: Output file written by run_batch.
+
+	Returns:
+		set[str]: IDs of successfully answered questions.
+	"""
+	completed: set[str] = set()
+	if not os.path.exists(path):
+		return completed
+	with open(path, encoding="utf-8") as output_file:
+		for line in output_file:
+			try:
+				row: Any = json.loads(line)
+			except ValueError:
+				# A partially written last line after a crash.
+				continue
+			if isinstance(row, dict) and "id" in row and "error" not in row:
+				completed.add(str(row["id"]))
+	return completed
+
+async def run_batch(config: AIConfig, input_path: str, output_path: str, concurrency: int = 8,
+					id_field: str = "id", question_field: str = "question") -> int:
+	"""Answer every not yet answered question with at most `concurrency` calls in flight.
+
+	Each question gets its own AITutor, so answers do not share conversation
+	state; clients and caches are shared process-wide. Results are appended
+	to the output file as they complete. The calls are scheduled as bulk
+	work, so interactive calls in the same process go first.
+
+	Parameters:
+		config: Configuration for API keys and model selection.
+		input_path: JSONL or CSV file with questions.
+		output_path: JSONL file the results are appended to.
+		concurrency: Maximum number of questions processed at once.
+		id_field: Name of the column or key holding the question ID.
+		question_field: Name of the column or key holding the question text.
+
+	Returns:
+		int: Number of questions processed in this run.
+	"""
+	if concurrency <= 0:
+		raise ValueError("Concurrency must be positive")
+	completed: set[str] = read_completed_ids(output_path)
+	pending: Iterator[tuple[str, str, str | None]] = (
+		(question_id, question, error) for question_id, question, error
+		in read_questions(input_path, id_field, question_field) if question_id not in completed
+	)
+	processed: int = 0
+
+	with open(output_path, "a", encoding="utf-8") as output_file:
+		if output_file.tell() > 0 and not _ends_with_newline(output_path):
+			# Terminate a line left partially written by a crash before appending.
+			output_file.write("\n")
+		async def worker() -> None:
+			nonlocal processed
+			# Workers share one iterator, so only `concurrency` questions are ever in memory.
+			for question_id, question, input_error in pending:
+				row: dict[str, Any] = {"id": question_id, "question": question}
+				if input_error is not None:
+					row["error"] = input_error
+					_write_row(output_file, row)
+					processed += 1
+					continue
+				try:
+					row["explanation"] = await AITutor(config).explain_this_async(question)
+				except Exception as error:
+					row["error"] = f"{type(error).__name__}: {error}"
+				_write_row(output_file, row)
+				processed += 1
+
+		with call_priority(Priority.BULK):
+			await asyncio.gather(*(worker() for _ in range(concurrency)))
+	return processed
+
+def _ends_with_newline(path: str) -> bool:
+	"""Return whether a non-empty file ends with a newline."""
+	with open(path, "rb") as existing_file:
+		existing_file.seek(-1, os.SEEK_END)
+		return existing_file.read(1) == b"\n"
+
+def _write_row(output_file: TextIO, row: dict[str, Any]) -> None:
+	"""Append one result row and flush it, so a crash loses at most the rows in flight."""
+	output_file.write(json.dumps(row, ensure_ascii=False) + "\n")
+	output_file.flush()
+
+def main(argv: list[str] | None = None) -> None:
+	"""Parse command line arguments and run the batch."""
+	parser: argparse.ArgumentParser = argparse.ArgumentParser(description=__doc__)
+	parser.add_argument("input", help="JSONL or CSV file with questions")
+	parser.add_argument("output", help="JSONL file to append results to; already answered IDs are skipped")
+	parser.add_argument("--concurrency", type=int, default=8, help="maximum number of questions processed at once")
+	parser.add_argument("--id-field", default="id", help="column or key holding the question ID")
+	parser.add_argument("--question-field", default="question", help="column or key holding the question text")
+	arguments: argparse.Namespace = parser.parse_args(argv)
+	processed: int = asyncio.run(run_batch(AIConfig(), arguments.input, arguments.output, arguments.concurrency,
+										   arguments.id_field, arguments.question_field))
+	print(f"Processed {processed} questions")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,82 @@
+"""Build the taxonomy file of the local area-of-knowledge classifier from logged model answers.
+
+The input is the JSONL log written when AREA_LOG_PATH is set; the output is
+the file AREA_TAXONOMY_PATH points at.
+
+Example:
+	python build_area_index.py areas.jsonl taxonomy.json --min-examples 5
+"""
+import argparse
+import json
+import os
+from typing import Any, Iterator
+from ai_area_classifier import AreaClassifier, build_taxonomy
+
+def read_examples(paths: list[str], question_field: str = "question",
+				  area_field: str = "area_of_knowledge") -> Iterator[tuple[str, str]]:
+	"""Yield (question, area of knowledge) pairs from JSONL logs, skipping unreadable lines.
+
+	Parameters:
+		paths: JSONL log files.
+		question_field: Key holding the question text.
+		area_field: Key holding the area of knowledge.
+
+	Yields:
+		tuple[str, str]: Question and area of knowledge.
+	"""
+	for path in paths:
+		with open(path, encoding="utf-8") as log_file:
+			for line in log_file:
+				try:
+					row: Any = json.loads(line)
+				except ValueError:
+					continue
+				if isinstance(row, dict) and row.get(question_field) and row.get(area_field):
+					yield str(row[question_field]), str(row[area_field])
+
+def merge_taxonomies(base: dict[str, list[str]], addition: dict[str, list[str]]) -> dict[str, list[str]]:
+	"""Add the keywords of one taxonomy to another, matching subjects case-insensitively.
+
+	Parameters:
+		base: Existing taxonomy; its subject spellings and keyword order are kept.
+		addition: Taxonomy with new subjects or keywords.
+
+	Returns:
+		dict[str, list[str]]: Merged taxonomy.
+	"""
+	merged: dict[str, list[str]] = {subject: list(keywords) for subject, keywords in base.items()}
+	subjects: dict[str, str] = {subject.lower(): subject for subject in merged}
+	for subject, keywords in addition.items():
+		target: str = subjects.setdefault(subject.lower(), subject)
+		existing: list[str] = merged.setdefault(target, [])
+		existing.extend(keyword for keyword in keywords if keyword not in existing)
+	return merged
+
+def main(argv: list[str] | None = None) -> None:
+	"""Parse arguments, build the taxonomy and write it."""
+	parser: argparse.ArgumentParser = argparse.ArgumentParser(description=__doc__,
+															  formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("logs", nargs="+", help="JSONL logs of model-inferred areas")
+	parser.add_argument("output", help="taxonomy JSON file to write")
+	parser.add_argument("--merge", action="store_true", help="add to the subjects already in the output file")
+	parser.add_argument("--min-examples", type=int, default=3, help="questions needed for an area to be kept")
+	parser.add_argument("--max-terms", type=int, default=50, help="maximal number of keywords per area")
+	parser.add_argument("--question-field", default="question")
+	parser.add_argument("--area-field", default="area_of_knowledge")
+	arguments: argparse.Namespace = parser.parse_args(argv)
+
+	examples: list[tuple[str, str]] = list(read_examples(arguments.logs, arguments.question_field, arguments.area_field))
+	taxonomy: dict[str, list[str]] = build_taxonomy(examples, arguments.min_examples, arguments.max_terms)
+	if arguments.merge and os.path.exists(arguments.output):
+		with open(arguments.output, encoding="utf-8") as existing_file:
+			taxonomy = merge_taxonomies(json.load(existing_file), taxonomy)
+	with open(arguments.output, "w", encoding="utf-8") as output_file:
+		json.dump(taxonomy, output_file, indent=2, ensure_ascii=False)
+
+	classifier: AreaClassifier = AreaClassifier(taxonomy)
+	answered: int = sum(1 for question, _ in examples if classifier.classify(question) is not None)
+	print(f"Wrote {len(taxonomy)} subjects to {arguments.output}; "
+		  f"{answered} of {len(examples)} logged questions are now answered locally")
+
+if __name__ == "__main__":
+	main()
@@ -1,34 +1,230 @@
+import hashlib
+import json
+from time import perf_counter
 from ollama import ChatResponse
 from ollama_ai_config import OllamaAIConfig
 from ollama_ai_core import AICore
+from ollama_ai_area_classifier import AreaClassifier, log_area, shared_classifier
+from ollama_ai_cache import ResponseCache, shared_cache
+from ollama_ai_instrumentation import staged
+from typing import Any, NamedTuple
+
+class TutorProfile(NamedTuple):
+    """Area of knowledge and tutor role inferred for a question."""
+    area_of_knowledge: str
+    tutor_role: str
+
+    @staticmethod
+    def parse(text: str) -> "TutorProfile | None":
+        """Parse a JSON profile produced by the model, or return None if it is not a valid profile."""
+        try:
+            data: Any = json.loads(text)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(data, dict):
+            return None
+        area_of_knowledge: Any = data.get("area_of_knowledge")
+        tutor_role: Any = data.get("tutor_role")
+        if not isinstance(area_of_knowledge, str) or not isinstance(tutor_role, str):
+            return None
+        if not area_of_knowledge.strip(" .,") or not tutor_role.strip(" .,"):
+            return None
+        return TutorProfile(area_of_knowledge.strip(" .,"), tutor_role.strip(" .,"))
+
+    def to_json(self) -> str:
+        return json.dumps({"area_of_knowledge": self.area_of_knowledge, "tutor_role": self.tutor_role})
+
+
+TUTOR_PROFILE_SCHEMA: dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "area_of_knowledge": {"type": "string"},
+        "tutor_role": {"type": "string"}
+    },
+    "required": ["area_of_knowledge", "tutor_role"]
+}
 
 class SelfReferencingAI(AICore[str]):
+    _default_stage: str = "self_reference"
+
+    @property
+    def _cache(self) -> ResponseCache | None:
+        return self.__cache
+
+    @property
+    def _area_classifier(self) -> AreaClassifier | None:
+        return self.__area_classifier
+
+    @property
+    def _model(self) -> str:
+        return self._config.self_reference_model
+
+    @property
+    def _reasoning_effort(self) -> str | None:
+        return self._config.self_reference_reasoning_effort
+
+    @property
+    def _keeps_history(self) -> bool:
+        """Without a history window helper calls bypass the history, so one helper can serve many sessions."""
+        return self._config.self_reference_history_window > 0
 
     def __init__(self, config: OllamaAIConfig) -> None:
         system_behavior: str = ("You are a companion for AI Tutor."
 								"You will provide self-referential information that will help the AI tutor to assume a proper role in proper area of knowledge.\n"
 								"Be as concrete as possible in your answers."
 								"Always answer concisely.")
-        super().__init__(system_behavior, config)
-    
+        super().__init__(system_behavior, config, config.self_reference_history_window)
+        self.__cache: ResponseCache | None = None
+        if config.self_reference_cache_size > 0:
+            self.__cache = shared_cache(config.self_reference_cache_size,
+                                        config.self_reference_cache_ttl,
+                                        config.self_reference_cache_path)
+        self.__area_classifier: AreaClassifier | None = None
+        if config.area_taxonomy_path:
+            self.__area_classifier = shared_classifier(config.area_taxonomy_path,
+                                                       config.area_classifier_min_score,
+                                                       config.area_classifier_min_margin)
+
     def _process_response(self, response: ChatResponse) -> str:
         return response.message.content.strip(" .,") if response.message.content else "No response was received."
 
+    @staged("infer_area_of_knowledge")
     def infer_area_of_knowledge(self, user_input: str) -> str:
-        prompt: str = (f"User question: {user_input}\n"
-                       f"Infer the area of knowledge required for AI Tutor to provide the best possible answer.\n"
-                       "Respond ONLY with area of knowledge.\n"
-                       "Area of knowledge:")
-        area: str = self.ask(prompt)
+        classified: str | None = self.__classify_area(user_input)
+        if classified is not None:
+            return classified
+        cache_key: str = self.__cache_key("area", user_input)
+        cached: str | None = self.__get_cached(cache_key)
+        if cached is not None:
+            return cached
+        area: str = self.ask(self._form_area_of_knowledge_prompt(user_input))
+        self.__set_cached(cache_key, area)
+        self.__log_area(user_input, area)
+        return area
+
+    @staged("infer_area_of_knowledge")
+    async def infer_area_of_knowledge_async(self, user_input: str) -> str:
+        classified: str | None = self.__classify_area(user_input)
+        if classified is not None:
+            return classified
+        cache_key: str = self.__cache_key("area", user_input)
+        cached: str | None = self.__get_cached(cache_key)
+        if cached is not None:
+            return cached
+        area: str = await self.ask_async(self._form_area_of_knowledge_prompt(user_input))
+        self.__set_cached(cache_key, area)
+        self.__log_area(user_input, area)
         return area
 
+    @staged("clarify_tutor_role")
     def clarify_tutor_role(self, area_of_knowledge: str, user_question: str) -> str:
-        prompt: str = (f"User question: {user_question}\n"
-                       f"Area of knowledge: {area_of_knowledge}\n"
-                       "Basing on area and question, provided above - infer the role,"
-                       "directly connected to the area of knowledge, that will allow the AI Tutor "
-                       "to provide the best possible answer on the question.\n"
-                       "Respond only with inferred role.\n"
-                       "Inferred role:")
-        role: str = self.ask(prompt)
-        return role
\ No newline at end of file
+        cache_key: str = self.__cache_key("role", area_of_knowledge, user_question)
+        cached: str | None = self.__get_cached(cache_key)
+        if cached is not None:
+            return cached
+        role: str = self.ask(self._form_tutor_role_prompt(area_of_knowledge, user_question))
+        self.__set_cached(cache_key, role)
+        return role
+
+    @staged("clarify_tutor_role")
+    async def clarify_tutor_role_async(self, area_of_knowledge: str, user_question: str) -> str:
+        cache_key: str = self.__cache_key("role", area_of_knowledge, user_question)
+        cached: str | None = self.__get_cached(cache_key)
+        if cached is not None:
+            return cached
+        role: str = await self.ask_async(self._form_tutor_role_prompt(area_of_knowledge, user_question))
+        self.__set_cached(cache_key, role)
+        return role
+
+    @staged("infer_profile")
+    def infer_profile(self, user_question: str) -> TutorProfile:
+        classified: str | None = self.__classify_area(user_question)
+        if classified is not None:
+            # Only the role is generated, which is shorter than the structured profile.
+            return TutorProfile(classified, self.clarify_tutor_role(classified, user_question))
+        cache_key: str = self.__cache_key("profile", user_question)
+        profile: TutorProfile | None = self.__get_cached_profile(cache_key)
+        if profile is not None:
+            return profile
+        profile = TutorProfile.parse(self.ask(self._form_profile_prompt(user_question), {"format": TUTOR_PROFILE_SCHEMA}))
+        if profile is None:
+            # The model ignored the schema; fall back to the two-call path.
+            area: str = self.infer_area_of_knowledge(user_question)
+            return TutorProfile(area, self.clarify_tutor_role(area, user_question))
+        self.__set_cached(cache_key, profile.to_json())
+        self.__log_area(user_question, profile.area_of_knowledge)
+        return profile
+
+    @staged("infer_profile")
+    async def infer_profile_async(self, user_question: str) -> TutorProfile:
+        classified: str | None = self.__classify_area(user_question)
+        if classified is not None:
+            return TutorProfile(classified, await self.clarify_tutor_role_async(classified, user_question))
+        cache_key: str = self.__cache_key("profile", user_question)
+        profile: TutorProfile | None = self.__get_cached_profile(cache_key)
+        if profile is not None:
+            return profile
+        profile = TutorProfile.parse(await self.ask_async(self._form_profile_prompt(user_question), {"format": TUTOR_PROFILE_SCHEMA}))
+        if profile is None:
+            area: str = await self.infer_area_of_knowledge_async(user_question)
+            return TutorProfile(area, await self.clarify_tutor_role_async(area, user_question))
+        self.__set_cached(cache_key, profile.to_json())
+        self.__log_area(user_question, profile.area_of_knowledge)
+        return profile
+
+    def __get_cached_profile(self, cache_key: str) -> TutorProfile | None:
+        cached: str | None = self.__get_cached(cache_key)
+        return TutorProfile.parse(cached) if cached is not None else None
+
+    def __classify_area(self, user_question: str) -> str | None:
+        if self._area_classifier is None:
+            return None
+        started: float = perf_counter()
+        area: str | None = self._area_classifier.classify(user_question)
+        if area is not None:
+            self._record_cache_hit(started)
+        return area
+
+    def __log_area(self, user_question: str, area: str) -> None:
+        if self._config.area_log_path and area and area != "No response was received":
+            log_area(self._config.area_log_path, user_question, area)
+
+    def __cache_key(self, *parts: str) -> str:
+        """Build a cache key scoped to the helper model and instructions, so changing either never reuses old answers."""
+        instructions: str = hashlib.sha256(self._history_manager.system_behavior.encode("utf-8")).hexdigest()[:16]
+        return ResponseCache.make_key(self._model, instructions, *parts)
+
+    def __get_cached(self, cache_key: str) -> str | None:
+        if self._cache is None:
+            return None
+        started: float = perf_counter()
+        cached: str | None = self._cache.get(cache_key)
+        if cached is not None:
+            self._record_cache_hit(started)
+        return cached
+
+    def __set_cached(self, cache_key: str, value: str) -> None:
+        if self._cache is not None and value and value != "No response was received":
+            self._cache.set(cache_key, value)
+
+    def _form_area_of_knowledge_prompt(self, user_input: str) -> str:
+        return ("Infer the area of knowledge required for AI Tutor to provide the best possible answer.\n"
+                "Respond ONLY with area of knowledge.\n"
+                f"User question: {user_input}\n"
+                "Area of knowledge:")
+
+    def _form_tutor_role_prompt(self, area_of_knowledge: str, user_question: str) -> str:
+        return ("Basing on area and question, provided below - infer the role,"
+                "directly connected to the area of knowledge, that will allow the AI Tutor "
+                "to provide the best possible answer on the question.\n"
+                "Respond only with inferred role.\n"
+                f"Area of knowledge: {area_of_knowledge}\n"
+                f"User question: {user_question}\n"
+                "Inferred role:")
+
+    def _form_profile_prompt(self, user_question: str) -> str:
+        return ("Infer the area of knowledge required for AI Tutor to provide the best possible answer, "
+                "and the role, directly connected to that area of knowledge, that will allow the AI Tutor "
+                "to provide the best possible answer on the question.\n"
+                "Respond ONLY with a JSON object with the keys \"area_of_knowledge\" and \"tutor_role\".\n"
+                f"User question: {user_question}")
\ No newline at end of file
@@ -1,30 +1,272 @@
-from ollama import ChatResponse
+import asyncio
+import contextvars
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
+from ollama import ChatResponse, Message
+from time import perf_counter
+from typing import Iterator
 from ollama_ai_config import OllamaAIConfig
 from ollama_ai_core import AICore
-from ai_self_reference import SelfReferencingAI
+from ollama_ai_resilience import Cancellation, cancellable, deadline
+from ai_self_reference import SelfReferencingAI, TutorProfile
+from ollama_ai_semantic_cache import SemanticCache
+
+class SpeculationStats:
+    """Counters for speculative explanations started before the tutor role was known."""
+
+    @property
+    def attempts(self) -> int:
+        return self.__kept + self.__restarted
+
+    @property
+    def kept(self) -> int:
+        return self.__kept
+
+    @property
+    def restarted(self) -> int:
+        return self.__restarted
+
+    @property
+    def success_rate(self) -> float:
+        return self.__kept / self.attempts if self.attempts else 0.0
+
+    def __init__(self) -> None:
+        self.__kept: int = 0
+        self.__restarted: int = 0
+        self.__lock: threading.Lock = threading.Lock()
+
+    def record(self, kept: bool) -> None:
+        with self.__lock:
+            if kept:
+                self.__kept += 1
+            else:
+                self.__restarted += 1
+
+
+# Words of an inferred area of knowledge that do not name a particular subject.
+_GENERIC_AREA_WORDS: frozenset[str] = frozenset(("general", "knowledge", "everyday", "common", "miscellaneous",
+                                                 "various", "unknown", "none", "other"))
+
+def _area_words(area: str) -> set[str]:
+    return {word for word in re.findall(r"[a-z]+", area.lower()) if len(word) > 3}
+
+def area_overlap(area: str, reference_area: str) -> float:
+    """Share of an area's significant words that also appear in a reference area (1 for an empty area)."""
+    words: set[str] = _area_words(area)
+    if not words:
+        return 1.0
+    return len(words & _area_words(reference_area)) / len(words)
+
+def is_generic_area(area: str) -> bool:
+    """Whether an inferred area names no particular subject, e.g. "General knowledge"."""
+    return _area_words(area) <= _GENERIC_AREA_WORDS
+
+
+_speculation_executor: ThreadPoolExecutor | None = None
+_speculation_executor_lock: threading.Lock = threading.Lock()
+
+def _executor() -> ThreadPoolExecutor:
+    """Worker threads, shared by every tutor, that run speculative explanations."""
+    global _speculation_executor
+    with _speculation_executor_lock:
+        if _speculation_executor is None:
+            _speculation_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="speculative-tutor")
+        return _speculation_executor
+
 
 class KnowledgeGuideAI(AICore[str]):
+    _default_stage: str = "explain"
+
+    @property
+    def _model(self) -> str:
+        return self._config.tutor_model
+
+    @property
+    def _reasoning_effort(self) -> str | None:
+        return self._config.tutor_reasoning_effort
 
     @property
     def _self_reference(self) -> SelfReferencingAI:
         return self.__self_reference
+
+    @property
+    def _semantic_cache(self) -> SemanticCache | None:
+        """The cache matches the question alone, so it is only used before the session has turns."""
+        return None if self._history_manager.has_history else self.__semantic_cache
+
+    @property
+    def speculation_stats(self) -> SpeculationStats:
+        return self.__speculation_stats
     
     def _process_response(self, response: ChatResponse) -> str:
         return response.message.content if response.message.content else "No response was received."
 
     def explain_this(self, user_question: str) -> str:
-        area: str = self._self_reference.infer_area_of_knowledge(user_question)
-        clarified_role: str = self._self_reference.clarify_tutor_role(area, user_question)
-        prompt: str = (f"As a {clarified_role} and an expert in the {area}, explain this question: {user_question}\nExplanation:")
-        explanation: str = self.ask(prompt)
-        return explanation
+        with deadline(self._config.request_deadline):
+            semantic_cache: SemanticCache | None = self._semantic_cache
+            if semantic_cache is not None:
+                started: float = perf_counter()
+                # The question is embedded once, for the lookup and for adding the answer after a miss.
+                query: np.ndarray = semantic_cache.embed([user_question])
+                cached: str | None = semantic_cache.lookup(user_question, query)
+                if cached is not None:
+                    self._record_cache_hit(started)
+                    return cached
+            prompt: str = self._form_prompt(user_question)
+            explanation: str = self.ask(prompt)
+            if semantic_cache is not None and explanation:
+                semantic_cache.add(user_question, explanation, query)
+            return explanation
+
+    async def explain_this_async(self, user_question: str) -> str:
+        with deadline(self._config.request_deadline):
+            semantic_cache: SemanticCache | None = self._semantic_cache
+            if semantic_cache is not None:
+                started: float = perf_counter()
+                query: np.ndarray = await asyncio.to_thread(semantic_cache.embed, [user_question])
+                cached: str | None = await asyncio.to_thread(semantic_cache.lookup, user_question, query)
+                if cached is not None:
+                    self._record_cache_hit(started)
+                    return cached
+            profile: TutorProfile = await self._infer_profile_async(user_question)
+            explanation: str = await self.ask_async(self._prompt_for(profile, user_question))
+            if semantic_cache is not None and explanation:
+                await asyncio.to_thread(semantic_cache.add, user_question, explanation, query)
+            return explanation
+
+    def explain_this_stream(self, user_question: str) -> Iterator[str]:
+        semantic_cache: SemanticCache | None = self._semantic_cache
+        if semantic_cache is not None:
+            started: float = perf_counter()
+            query: np.ndarray = semantic_cache.embed([user_question])
+            cached: str | None = semantic_cache.lookup(user_question, query)
+            if cached is not None:
+                self._record_cache_hit(started)
+                yield cached
+                return
+        with deadline(self._config.request_deadline):
+            prompt: str = self._form_prompt(user_question)
+        chunks: list[str] = []
+        for chunk in self.ask_stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        if semantic_cache is not None and chunks:
+            semantic_cache.add(user_question, "".join(chunks), query)
+
+    def explain_this_speculative(self, user_question: str) -> str:
+        """Answer with the session's last role while the role is inferred; restart if the area differs materially."""
+        with deadline(self._config.request_deadline):
+            speculated: TutorProfile = self.__last_profile()
+            speculative_prompt: str = self._prompt_for(speculated, user_question)
+            speculation: Cancellation = Cancellation()
+            # The copied context carries the deadline, stage and priority into the worker thread.
+            speculative_response: Future[ChatResponse] = _executor().submit(
+                contextvars.copy_context().run, self.__send_speculative, self._messages_with(speculative_prompt), speculation
+            )
+            try:
+                profile: TutorProfile = self._infer_profile(user_question)
+            except BaseException:
+                speculation.cancel()
+                raise
+            if self.__speculation_holds(profile, speculated):
+                response: ChatResponse = speculative_response.result()
+                self._commit_exchange(speculative_prompt, response)
+                self.speculation_stats.record(kept=True)
+                return self._process_response(response)
+            # Closes the speculative request, so it frees its scheduler slot and the GPU before the real answer is asked.
+            speculation.cancel()
+            self.speculation_stats.record(kept=False)
+            return self.ask(self._compose_prompt(profile.area_of_knowledge, profile.tutor_role, user_question))
+
+    def __send_speculative(self, messages: list[Message], speculation: Cancellation) -> ChatResponse:
+        """Send the speculative call, stopping it as soon as the speculation is cancelled."""
+        with cancellable(speculation):
+            return self._send(messages)
+
+    async def explain_this_speculative_async(self, user_question: str) -> str:
+        with deadline(self._config.request_deadline):
+            speculated: TutorProfile = self.__last_profile()
+            speculative_prompt: str = self._prompt_for(speculated, user_question)
+            speculative_response: asyncio.Task[ChatResponse] = asyncio.create_task(
+                self._send_async(self._messages_with(speculative_prompt))
+            )
+            try:
+                profile: TutorProfile = await self._infer_profile_async(user_question)
+            except BaseException:
+                speculative_response.cancel()
+                raise
+            if self.__speculation_holds(profile, speculated):
+                response: ChatResponse = await speculative_response
+                self._commit_exchange(speculative_prompt, response)
+                self.speculation_stats.record(kept=True)
+                return self._process_response(response)
+            speculative_response.cancel()
+            self.speculation_stats.record(kept=False)
+            return await self.ask_async(self._compose_prompt(profile.area_of_knowledge, profile.tutor_role, user_question))
+
+    def __last_profile(self) -> TutorProfile:
+        """Profile of the previous question, which a speculative answer is written with; empty on the first one."""
+        return TutorProfile(self._history_manager.area_of_knowledge or "", self._history_manager.tutor_role or "")
+
+    def __speculation_holds(self, profile: TutorProfile, speculated: TutorProfile) -> bool:
+        """Keep the speculative answer when the inferred area matches the one it was written for, or is generic."""
+        if not profile.area_of_knowledge or not profile.tutor_role:
+            return True
+        if not speculated.area_of_knowledge or not speculated.tutor_role:
+            return is_generic_area(profile.area_of_knowledge)
+        return area_overlap(profile.area_of_knowledge, speculated.area_of_knowledge) >= self._config.speculation_role_overlap
+
+    def _compose_base_prompt(self, user_question: str) -> str:
+        return f"Explain the question below.\nQuestion: {user_question}\nExplanation:"
+
+    def _form_prompt(self, user_question: str) -> str:
+        return self._prompt_for(self._infer_profile(user_question), user_question)
+
+    def _prompt_for(self, profile: TutorProfile, user_question: str) -> str:
+        if not profile.area_of_knowledge or not profile.tutor_role:
+            return self._compose_base_prompt(user_question)
+        return self._compose_prompt(profile.area_of_knowledge, profile.tutor_role, user_question)
+
+    def _infer_profile(self, user_question: str) -> TutorProfile:
+        """Infer the tutor profile; a helper call that timed out or kept failing leaves the base prompt in place."""
+        try:
+            return self.__remember(self._self_reference.infer_profile(user_question))
+        except Exception as error:
+            if not self._self_reference._is_retryable(error):
+                raise
+            return TutorProfile("", "")
+
+    async def _infer_profile_async(self, user_question: str) -> TutorProfile:
+        try:
+            return self.__remember(await self._self_reference.infer_profile_async(user_question))
+        except Exception as error:
+            if not self._self_reference._is_retryable(error):
+                raise
+            return TutorProfile("", "")
+
+    def __remember(self, profile: TutorProfile) -> TutorProfile:
+        """Keep an inferred profile with the session, so a resumed session knows its area and role."""
+        if profile.area_of_knowledge and profile.tutor_role:
+            self._history_manager.set_profile(profile.area_of_knowledge, profile.tutor_role)
+        return profile
+
+    def _compose_prompt(self, area: str, clarified_role: str, user_question: str) -> str:
+        # Static text first and the question last, so consecutive prompts share the longest possible prefix.
+        return (f"Explain the question below.\nAnswer as a {clarified_role} and an expert in the {area}.\n"
+                f"Question: {user_question}\nExplanation:")
 
-    def __init__(self, config: OllamaAIConfig) -> None:
+    def __init__(self, config: OllamaAIConfig, semantic_cache: SemanticCache | None = None,
+                 session_id: str | None = None, self_reference: SelfReferencingAI | None = None) -> None:
+        """Only a stateless helper (SELF_REFERENCE_HISTORY_WINDOW=0) may be shared between sessions as self_reference."""
         system_behavior = ("You are a helpful tutor, who excels at explaining complex concepts in simple terms."
 								" You will provide detailed explanations and examples to help the user understand."
 								" If it will be needed - use analogies.")
-        super().__init__(system_behavior, config)
-        self.__self_reference: SelfReferencingAI = SelfReferencingAI(config)
+        super().__init__(system_behavior, config, session_id=session_id)
+        self.__self_reference: SelfReferencingAI = self_reference or SelfReferencingAI(config)
+        self.__semantic_cache: SemanticCache | None = semantic_cache
+        self.__speculation_stats: SpeculationStats = SpeculationStats()
 
 if __name__ == "__main__":
     config: OllamaAIConfig = OllamaAIConfig()
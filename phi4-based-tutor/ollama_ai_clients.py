@@ -0,0 +1,53 @@
+"""Process-wide registry of pooled Ollama clients shared by all AICore instances."""
+import asyncio
+import threading
+import weakref
+import httpx
+from ollama import AsyncClient, Client
+from ollama_ai_config import OllamaAIConfig
+
+_ClientKey = tuple[str | None, int, int, float, float, bool]
+
+_clients: dict[_ClientKey, Client] = {}
+_async_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, dict[_ClientKey, AsyncClient]] = weakref.WeakKeyDictionary()
+_clients_lock: threading.Lock = threading.Lock()
+
+def _client_key(config: OllamaAIConfig) -> _ClientKey:
+    """Return the settings that identify a shared client."""
+    return (config.ollama_host,
+            config.http_max_connections,
+            config.http_max_keepalive_connections,
+            config.http_keepalive_expiry,
+            config.http_timeout,
+            config.http2_enabled)
+
+def _client_options(config: OllamaAIConfig) -> dict:
+    """Return the httpx options passed through the Ollama client constructor."""
+    return {"timeout": config.http_timeout,
+            "limits": httpx.Limits(max_connections=config.http_max_connections,
+                                   max_keepalive_connections=config.http_max_keepalive_connections,
+                                   keepalive_expiry=config.http_keepalive_expiry),
+            "http2": config.http2_enabled}
+
+def get_client(config: OllamaAIConfig) -> Client:
+    """Return the Ollama client shared by every caller with the same host and pool settings."""
+    key: _ClientKey = _client_key(config)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = Client(host=config.ollama_host, **_client_options(config))
+        return _clients[key]
+
+def get_async_client(config: OllamaAIConfig) -> AsyncClient:
+    """Return the asynchronous Ollama client shared on the running event loop.
+
+    Asynchronous connection pools are bound to the event loop that opened
+    them, so one client is kept per running loop and dropped with it.
+    Raises RuntimeError if called outside a running event loop.
+    """
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+    key: _ClientKey = _client_key(config)
+    with _clients_lock:
+        loop_clients: dict[_ClientKey, AsyncClient] = _async_clients.setdefault(loop, {})
+        if key not in loop_clients:
+            loop_clients[key] = AsyncClient(host=config.ollama_host, **_client_options(config))
+        return loop_clients[key]
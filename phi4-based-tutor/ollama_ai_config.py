@@ -3,62 +3,121 @@ from os import getenv
 
 class OllamaAIConfig:
 
-    def __get_config_value(self, key: str) -> str:
+    def __get_config_value(self, key: str, default: str | None = None) -> str:
         """
-        Get the value of an environment variable.
+        Get the value of an environment variable, or the default if it is not set.
         """
         if not key:
             raise ValueError("Key must be provided")
 
         value: str | None = getenv(key)
         if not value:
+            if default is not None:
+                return default
             raise ValueError(f"Environment variable '{key}' not found")
 
         return value
 
-    def _get_int_value(self, key: str) -> int:
+    def _get_str_value(self, key: str, default: str | None = None) -> str:
+        """
+        Get a string value from the environment variables.
+        """
+        return self.__get_config_value(key, default)
+
+    def _get_int_value(self, key: str, default: int | None = None) -> int:
         """
         Get an integer value from the environment variables.
         """
-        value = self.__get_config_value(key)
+        value = self.__get_config_value(key, None if default is None else str(default))
         try:
             return int(value)
         except ValueError:
             raise ValueError(f"Environment variable '{key}' must be an integer")
 
-    def _get_float_value(self, key: str) -> float:
+    def _get_float_value(self, key: str, default: float | None = None) -> float:
         """
         Get a float value from the environment variables.
         """
-        value = self.__get_config_value(key)
+        value = self.__get_config_value(key, None if default is None else str(default))
         try:
             return float(value)
         except ValueError:
             raise ValueError(f"Environment variable '{key}' must be a float")
 
+    def _get_bool_value(self, key: str, default: bool | None = None) -> bool:
+        """
+        Get a boolean value ("true"/"false", "1"/"0", "yes"/"no") from the environment variables.
+        """
+        value = self.__get_config_value(key, None if default is None else str(default)).strip().lower()
+        if value in ("1", "true", "yes", "on"):
+            return True
+        if value in ("0", "false", "no", "off"):
+            return False
+        raise ValueError(f"Environment variable '{key}' must be a boolean")
+
     def __get_model_id(self) -> str:
         """
         Get the model ID from the environment variables.
         """
         return self.__get_config_value("MODEL_ID")
 
-    def __get_temperature(self) -> float:
+    def __get_temperature(self) -> float | None:
         """
-        Get the temperature from the environment variables.
+        Get the temperature from the environment variables, or None when it is not set.
         """
+        if not self._get_str_value("TEMPERATURE", ""):
+            return None
         return self._get_float_value("TEMPERATURE")
 
     def __get_amount_before_summarizing(self) -> int:
         """
-        Get the amount before summarizing from the environment variables.
+        Get the amount before summarizing from the environment variables (0 disables summarizing).
         """
-        return self._get_int_value("AMOUNT_BEFORE_SUMMARIZING")
+        return self._get_int_value("AMOUNT_BEFORE_SUMMARIZING", 10)
 
     def __init__(self) -> None:
         load_dotenv()
         self.__model_id: str = ""
-        self.__temperature: float = 0.0
-        self.__amount_before_summarizing: int = 0
+        self.__temperature: float | None = None
+        self.__amount_before_summarizing: int | None = None
+        self.__tutor_model: str | None = None
+        self.__self_reference_model: str | None = None
+        self.__self_reference_cache_size: int | None = None
+        self.__self_reference_cache_ttl: float | None = None
+        self.__self_reference_history_window: int | None = None
+        self.__speculation_role_overlap: float | None = None
+        self.__area_classifier_min_score: float | None = None
+        self.__area_classifier_min_margin: float | None = None
+        self.__http_max_connections: int | None = None
+        self.__http_max_keepalive_connections: int | None = None
+        self.__http_keepalive_expiry: float | None = None
+        self.__http_timeout: float | None = None
+        self.__http2_enabled: bool | None = None
+        self.__model_warm_up: bool | None = None
+        self.__num_ctx: int | None = None
+        self.__num_ctx_min: int | None = None
+        self.__num_ctx_max: int | None = None
+        self.__num_predict: int | None = None
+        self.__num_thread: int | None = None
+        self.__single_flight_enabled: bool | None = None
+        self.__max_concurrent_calls: int | None = None
+        self.__interactive_reserved_calls: int | None = None
+        self.__rate_limit_rpm: float | None = None
+        self.__rate_limit_tpm: float | None = None
+        self.__call_timeout: float | None = None
+        self.__request_deadline: float | None = None
+        self.__max_attempts: int | None = None
+        self.__retry_backoff_base: float | None = None
+        self.__retry_backoff_max: float | None = None
+        self.__hedge_requests: bool | None = None
+        self.__hedge_quantile: float | None = None
+        self.__hedge_min_samples: int | None = None
+        self.__session_history_window: int | None = None
+        self.__session_max_chars: int | None = None
+        self.__session_pool_size: int | None = None
+        self.__session_idle_timeout: float | None = None
+        self.__trace_payloads: bool | None = None
+        self.__retry_timeouts: bool | None = None
 
     @property
     def model_id(self) -> str:
@@ -67,13 +126,333 @@ class OllamaAIConfig:
         return self.__model_id
 
     @property
-    def temperature(self) -> float:
-        if self.__temperature == 0.0:
+    def temperature(self) -> float | None:
+        """Sampling temperature (TEMPERATURE), or None to keep the model's own default; 0.0 is a valid setting."""
+        if self.__temperature is None:
             self.__temperature = self.__get_temperature()
         return self.__temperature
 
     @property
     def amount_before_summarizing(self) -> int:
-        if self.__amount_before_summarizing == 0:
+        if self.__amount_before_summarizing is None:
             self.__amount_before_summarizing = self.__get_amount_before_summarizing()
         return self.__amount_before_summarizing
+
+    @property
+    def tutor_model(self) -> str:
+        """Model that writes the explanations (TUTOR_MODEL, defaults to MODEL_ID)."""
+        if self.__tutor_model is None:
+            self.__tutor_model = self._get_str_value("TUTOR_MODEL", "") or self.model_id
+        return self.__tutor_model
+
+    @property
+    def tutor_reasoning_effort(self) -> str | None:
+        """Thinking setting of the explanation calls ("true", "false", "low", "medium", "high"), or None to send none."""
+        return self._get_str_value("TUTOR_REASONING_EFFORT", "") or None
+
+    @property
+    def self_reference_model(self) -> str:
+        """Model used for the self-reference helper calls (SELF_REFERENCE_MODEL, defaults to MODEL_ID)."""
+        if self.__self_reference_model is None:
+            self.__self_reference_model = self._get_str_value("SELF_REFERENCE_MODEL", "") or self.model_id
+        return self.__self_reference_model
+
+    @property
+    def self_reference_reasoning_effort(self) -> str | None:
+        """Thinking setting of the helper calls ("true", "false", "low", "medium", "high"), or None to send none."""
+        return self._get_str_value("SELF_REFERENCE_REASONING_EFFORT", "") or None
+
+    @property
+    def self_reference_cache_size(self) -> int:
+        """Maximum number of cached self-reference answers (0 disables the cache)."""
+        if self.__self_reference_cache_size is None:
+            self.__self_reference_cache_size = self._get_int_value("SELF_REFERENCE_CACHE_SIZE", 1024)
+        return self.__self_reference_cache_size
+
+    @property
+    def self_reference_cache_ttl(self) -> float:
+        """Lifetime of cached self-reference answers in seconds."""
+        if self.__self_reference_cache_ttl is None:
+            self.__self_reference_cache_ttl = self._get_float_value("SELF_REFERENCE_CACHE_TTL", 86400.0)
+        return self.__self_reference_cache_ttl
+
+    @property
+    def self_reference_cache_path(self) -> str | None:
+        """SQLite path used to persist self-reference answers, or None to keep them in memory only."""
+        return self._get_str_value("SELF_REFERENCE_CACHE_PATH", "") or None
+
+    @property
+    def self_reference_history_window(self) -> int:
+        """Number of previous self-reference turns sent with each helper call (0 makes helper calls stateless)."""
+        if self.__self_reference_history_window is None:
+            self.__self_reference_history_window = self._get_int_value("SELF_REFERENCE_HISTORY_WINDOW", 0)
+        return self.__self_reference_history_window
+
+    @property
+    def area_taxonomy_path(self) -> str | None:
+        """Taxonomy JSON file of the local area-of-knowledge classifier, or None to always ask the model."""
+        return self._get_str_value("AREA_TAXONOMY_PATH", "") or None
+
+    @property
+    def area_classifier_min_score(self) -> float:
+        """Share of a question the best subject must cover for the local classifier to answer."""
+        if self.__area_classifier_min_score is None:
+            self.__area_classifier_min_score = self._get_float_value("AREA_CLASSIFIER_MIN_SCORE", 0.5)
+        return self.__area_classifier_min_score
+
+    @property
+    def area_classifier_min_margin(self) -> float:
+        """Lead over the second subject, as a share of the best score, the local classifier requires."""
+        if self.__area_classifier_min_margin is None:
+            self.__area_classifier_min_margin = self._get_float_value("AREA_CLASSIFIER_MIN_MARGIN", 0.25)
+        return self.__area_classifier_min_margin
+
+    @property
+    def area_log_path(self) -> str | None:
+        """JSONL file that areas inferred by the model are appended to (for build_area_index.py), or None."""
+        return self._get_str_value("AREA_LOG_PATH", "") or None
+
+    @property
+    def speculation_role_overlap(self) -> float:
+        """Share of the inferred area's words that must appear in the area a speculative answer was written for to keep it."""
+        if self.__speculation_role_overlap is None:
+            self.__speculation_role_overlap = self._get_float_value("SPECULATION_ROLE_OVERLAP", 0.5)
+        return self.__speculation_role_overlap
+
+    @property
+    def ollama_host(self) -> str | None:
+        """Ollama server URL, or None to use the client's default (which honours OLLAMA_HOST)."""
+        return self._get_str_value("OLLAMA_HOST", "") or None
+
+    @property
+    def http_max_connections(self) -> int:
+        """Maximum number of connections in the shared HTTP pool."""
+        if self.__http_max_connections is None:
+            self.__http_max_connections = self._get_int_value("HTTP_MAX_CONNECTIONS", 100)
+        return self.__http_max_connections
+
+    @property
+    def http_max_keepalive_connections(self) -> int:
+        """Maximum number of idle keep-alive connections in the shared HTTP pool."""
+        if self.__http_max_keepalive_connections is None:
+            self.__http_max_keepalive_connections = self._get_int_value("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20)
+        return self.__http_max_keepalive_connections
+
+    @property
+    def http_keepalive_expiry(self) -> float:
+        """Number of seconds an idle keep-alive connection is kept open."""
+        if self.__http_keepalive_expiry is None:
+            self.__http_keepalive_expiry = self._get_float_value("HTTP_KEEPALIVE_EXPIRY", 30.0)
+        return self.__http_keepalive_expiry
+
+    @property
+    def http_timeout(self) -> float:
+        """HTTP timeout in seconds for model calls."""
+        if self.__http_timeout is None:
+            self.__http_timeout = self._get_float_value("HTTP_TIMEOUT", 600.0)
+        return self.__http_timeout
+
+    @property
+    def http2_enabled(self) -> bool:
+        """Whether HTTP/2 is used for model calls (requires the "h2" package)."""
+        if self.__http2_enabled is None:
+            self.__http2_enabled = self._get_bool_value("HTTP2_ENABLED", False)
+        return self.__http2_enabled
+
+    @property
+    def keep_alive(self) -> str | None:
+        """How long the server keeps the model loaded after a call, e.g. "30m" or "-1"; None uses the server default."""
+        return self._get_str_value("OLLAMA_KEEP_ALIVE", "30m") or None
+
+    @property
+    def model_warm_up(self) -> bool:
+        """Whether the model is loaded into the server in the background when the first AICore is created."""
+        if self.__model_warm_up is None:
+            self.__model_warm_up = self._get_bool_value("MODEL_WARM_UP", True)
+        return self.__model_warm_up
+
+    @property
+    def num_ctx(self) -> int:
+        """Fixed context window in tokens (0 sizes it from the history length)."""
+        if self.__num_ctx is None:
+            self.__num_ctx = self._get_int_value("NUM_CTX", 0)
+        return self.__num_ctx
+
+    @property
+    def num_ctx_min(self) -> int:
+        """Smallest context window used when it is sized from the history length."""
+        if self.__num_ctx_min is None:
+            self.__num_ctx_min = self._get_int_value("NUM_CTX_MIN", 2048)
+        return self.__num_ctx_min
+
+    @property
+    def num_ctx_max(self) -> int:
+        """Largest context window used when it is sized from the history length."""
+        if self.__num_ctx_max is None:
+            self.__num_ctx_max = self._get_int_value("NUM_CTX_MAX", 16384)
+        return self.__num_ctx_max
+
+    @property
+    def num_predict(self) -> int:
+        """Maximum number of generated tokens (0 uses the server default)."""
+        if self.__num_predict is None:
+            self.__num_predict = self._get_int_value("NUM_PREDICT", 0)
+        return self.__num_predict
+
+    @property
+    def num_thread(self) -> int:
+        """Number of CPU threads used for generation (0 uses the server default)."""
+        if self.__num_thread is None:
+            self.__num_thread = self._get_int_value("NUM_THREAD", 0)
+        return self.__num_thread
+
+    @property
+    def single_flight_enabled(self) -> bool:
+        """Whether identical calls in flight at the same time share one model call."""
+        if self.__single_flight_enabled is None:
+            self.__single_flight_enabled = self._get_bool_value("SINGLE_FLIGHT", True)
+        return self.__single_flight_enabled
+
+    @property
+    def max_concurrent_calls(self) -> int:
+        """Maximal number of calls in flight on the Ollama server at once (0 for no limit)."""
+        if self.__max_concurrent_calls is None:
+            self.__max_concurrent_calls = self._get_int_value("MAX_CONCURRENT_CALLS", 4)
+        return self.__max_concurrent_calls
+
+    @property
+    def interactive_reserved_calls(self) -> int:
+        """Number of concurrent call slots only interactive calls may use."""
+        if self.__interactive_reserved_calls is None:
+            self.__interactive_reserved_calls = self._get_int_value("INTERACTIVE_RESERVED_CALLS", 1)
+        return self.__interactive_reserved_calls
+
+    @property
+    def rate_limit_rpm(self) -> float:
+        """Client-side limit of requests per minute (0 for no limit)."""
+        if self.__rate_limit_rpm is None:
+            self.__rate_limit_rpm = self._get_float_value("RATE_LIMIT_RPM", 0.0)
+        return self.__rate_limit_rpm
+
+    @property
+    def rate_limit_tpm(self) -> float:
+        """Client-side limit of estimated tokens per minute (0 for no limit)."""
+        if self.__rate_limit_tpm is None:
+            self.__rate_limit_tpm = self._get_float_value("RATE_LIMIT_TPM", 0.0)
+        return self.__rate_limit_tpm
+
+    @property
+    def call_timeout(self) -> float:
+        """Seconds allowed per model call attempt (0 for the HTTP timeout only)."""
+        if self.__call_timeout is None:
+            self.__call_timeout = self._get_float_value("CALL_TIMEOUT", 300.0)
+        return self.__call_timeout
+
+    @property
+    def request_deadline(self) -> float:
+        """Seconds allowed for a whole explanation, all stages included (0 for no deadline)."""
+        if self.__request_deadline is None:
+            self.__request_deadline = self._get_float_value("REQUEST_DEADLINE", 0.0)
+        return self.__request_deadline
+
+    @property
+    def max_attempts(self) -> int:
+        """Number of attempts per model call, including the first."""
+        if self.__max_attempts is None:
+            self.__max_attempts = self._get_int_value("MAX_ATTEMPTS", 3)
+        return self.__max_attempts
+
+    @property
+    def retry_backoff_base(self) -> float:
+        """Upper bound of the first pause between attempts, in seconds."""
+        if self.__retry_backoff_base is None:
+            self.__retry_backoff_base = self._get_float_value("RETRY_BACKOFF_BASE", 0.5)
+        return self.__retry_backoff_base
+
+    @property
+    def retry_backoff_max(self) -> float:
+        """Largest upper bound of a pause between attempts, in seconds."""
+        if self.__retry_backoff_max is None:
+            self.__retry_backoff_max = self._get_float_value("RETRY_BACKOFF_MAX", 8.0)
+        return self.__retry_backoff_max
+
+    @property
+    def hedge_requests(self) -> bool:
+        """Whether a duplicate call is sent when the first one outlasts the hedge quantile."""
+        if self.__hedge_requests is None:
+            self.__hedge_requests = self._get_bool_value("HEDGE_REQUESTS", False)
+        return self.__hedge_requests
+
+    @property
+    def hedge_quantile(self) -> float:
+        """Latency quantile after which a call is hedged."""
+        if self.__hedge_quantile is None:
+            self.__hedge_quantile = self._get_float_value("HEDGE_QUANTILE", 0.95)
+        return self.__hedge_quantile
+
+    @property
+    def hedge_min_samples(self) -> int:
+        """Number of observed latencies needed before calls are hedged."""
+        if self.__hedge_min_samples is None:
+            self.__hedge_min_samples = self._get_int_value("HEDGE_MIN_SAMPLES", 20)
+        return self.__hedge_min_samples
+
+    @property
+    def session_store(self) -> str | None:
+        """Backend that persists tutoring sessions: "sqlite", "log", or None to keep them in memory only."""
+        backend: str = self._get_str_value("SESSION_STORE", "none").lower()
+        if backend not in ("none", "sqlite", "log"):
+            raise ValueError("Environment variable 'SESSION_STORE' must be 'none', 'sqlite' or 'log'")
+        return None if backend == "none" else backend
+
+    @property
+    def session_store_path(self) -> str:
+        """SQLite database file or log directory of the session store."""
+        return self._get_str_value("SESSION_STORE_PATH", "sessions.db" if self.session_store == "sqlite" else "sessions")
+
+    @property
+    def session_history_window(self) -> int:
+        """Most recent turns of a stored session loaded into memory when it is resumed."""
+        if self.__session_history_window is None:
+            self.__session_history_window = self._get_int_value("SESSION_HISTORY_WINDOW", 20)
+        return self.__session_history_window
+
+    @property
+    def session_max_chars(self) -> int:
+        """Most characters of conversation a session keeps in memory before dropping its oldest turns (0 for no cap)."""
+        if self.__session_max_chars is None:
+            self.__session_max_chars = self._get_int_value("SESSION_MAX_CHARS", 32000)
+        return self.__session_max_chars
+
+    @property
+    def session_pool_size(self) -> int:
+        """Number of sessions the tutor service keeps in memory before evicting the least recently used one."""
+        if self.__session_pool_size is None:
+            self.__session_pool_size = self._get_int_value("SESSION_POOL_SIZE", 20000)
+        return self.__session_pool_size
+
+    @property
+    def session_idle_timeout(self) -> float:
+        """Seconds after which the tutor service evicts an unused session (0 to evict only when the pool is full)."""
+        if self.__session_idle_timeout is None:
+            self.__session_idle_timeout = self._get_float_value("SESSION_IDLE_TIMEOUT", 1800.0)
+        return self.__session_idle_timeout
+
+    @property
+    def trace_path(self) -> str | None:
+        """Trace file every ask call is recorded to for replay, or None to record nothing."""
+        return self._get_str_value("TRACE_PATH", "") or None
+
+    @property
+    def trace_payloads(self) -> bool:
+        """Whether traces also record the prompt and answer texts, not only their hash and sizes."""
+        if self.__trace_payloads is None:
+            self.__trace_payloads = self._get_bool_value("TRACE_PAYLOADS", False)
+        return self.__trace_payloads
+
+    @property
+    def retry_timeouts(self) -> bool:
+        """Whether a call attempt that timed out is retried; off by default, as the local server is still busy with it."""
+        if self.__retry_timeouts is None:
+            self.__retry_timeouts = self._get_bool_value("RETRY_TIMEOUTS", False)
+        return self.__retry_timeouts
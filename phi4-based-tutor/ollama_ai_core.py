@@ -1,10 +1,164 @@
-from ollama import chat, ChatResponse, Message
+import httpx
+import logging
+from ollama import AsyncClient, ChatResponse, Client, Message, ResponseError
+from ollama_ai_cache import ResponseCache
 from ollama_ai_config import OllamaAIConfig
+from ollama_ai_clients import get_async_client, get_client
+from ollama_ai_instrumentation import CallRecord, instrumentation
+from ollama_ai_resilience import CallPolicy, Cancellation, current_cancellation, shared_policy
+from ollama_ai_scheduler import CallScheduler, Priority, Ticket, call_priority, shared_scheduler
+from ollama_ai_session_store import SessionRecord, SessionStore, StoredTurn, shared_session_store
+from ollama_ai_single_flight import single_flight
+from ollama_ai_trace import TraceCall, shared_recorder
 from abc import ABC, abstractmethod
-from typing import Any, Generic, TypeVar
+from hashlib import sha256
+from itertools import count
+from json import dumps
+from os import getpid
+from sys import intern
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock, Thread
+from time import perf_counter
+from typing import Any, Generic, Iterator, TypeVar
 
 TAiResponse = TypeVar("TAiResponse", default=Any)
 
+_logger: logging.Logger = logging.getLogger(__name__)
+
+# Rough size of a token, used to estimate how much context a conversation needs.
+_CHARACTERS_PER_TOKEN: int = 4
+# Context kept free for the answer when NUM_PREDICT does not bound it.
+_RESPONSE_TOKEN_RESERVE: int = 1024
+
+# Statuses worth another attempt: request timeout, overload and server errors.
+_RETRYABLE_STATUSES: frozenset[int] = frozenset((408, 429, 500, 502, 503, 504))
+
+# Numbers conversations without a session ID in traces.
+_trace_conversations: Iterator[int] = count(1)
+
+_warmed_up_models: set[tuple[str | None, str]] = set()
+_warm_up_lock: Lock = Lock()
+
+# num_ctx sent to each host and model, shared by every conversation, helper and summarizer of the process.
+_context_sizes: dict[tuple[str | None, str], int] = {}
+_context_sizes_lock: Lock = Lock()
+
+_system_messages: dict[str, Message] = {}
+_system_messages_lock: Lock = Lock()
+
+_summarizer: ThreadPoolExecutor | None = None
+_summarizer_lock: Lock = Lock()
+
+def _generation_options(config: OllamaAIConfig, num_ctx: int) -> dict[str, Any]:
+    """Return the Ollama options for a call with the given context window."""
+    options: dict[str, Any] = {"num_ctx": num_ctx}
+    if config.temperature is not None:
+        options["temperature"] = config.temperature
+    if config.num_predict > 0:
+        options["num_predict"] = config.num_predict
+    if config.num_thread > 0:
+        options["num_thread"] = config.num_thread
+    return options
+
+def _chat_cancellable(client: Client, arguments: dict[str, Any], cancellation: Cancellation) -> ChatResponse:
+    """Make a chat call as a stream and return the assembled response, stopping once the attempt is abandoned.
+
+    Leaving the stream closes the request, which makes the server stop
+    generating and frees the attempt's scheduler slot; a plain call would keep
+    both until the whole answer was generated.
+    """
+    content: list[str] = []
+    thinking: list[str] = []
+    last: ChatResponse | None = None
+    chunks: Iterator[ChatResponse] = client.chat(**{**arguments, "stream": True})
+    try:
+        for chunk in chunks:
+            if cancellation.cancelled:
+                raise TimeoutError("Model call abandoned")
+            content.append(chunk.message.content or "")
+            thinking.append(getattr(chunk.message, "thinking", None) or "")
+            last = chunk
+    finally:
+        close: Any = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+    if last is None:
+        raise ResponseError("The server sent no response", 502)
+    last.message.content = "".join(content)
+    if any(thinking):
+        last.message.thinking = "".join(thinking)
+    return last
+
+def _is_transient_error(error: BaseException) -> bool:
+    """Whether an Ollama error is worth another attempt: lost connections, overload and server errors."""
+    if isinstance(error, ResponseError):
+        return error.status_code in _RETRYABLE_STATUSES
+    return isinstance(error, (httpx.TransportError, ConnectionError))
+
+def _warm_up_model(config: OllamaAIConfig, model: str) -> None:
+    """Load a model into the server on a background thread, once per host and model."""
+    key: tuple[str | None, str] = (config.ollama_host, model)
+    with _warm_up_lock:
+        if key in _warmed_up_models:
+            return
+        _warmed_up_models.add(key)
+    Thread(target=_load_model, args=(config, key), name="model-warm-up", daemon=True).start()
+
+def _load_model(config: OllamaAIConfig, key: tuple[str | None, str]) -> None:
+    """Send an empty chat request, which makes the server load the model and keep it for keep_alive."""
+    # Load with the num_ctx of the real calls, since the server reloads the model when it changes.
+    try:
+        get_client(config).chat(model=key[1], messages=[], keep_alive=config.keep_alive,
+                                options=_generation_options(config, _context_size(config, key[1], 0)))
+    except Exception:
+        # The server may not be reachable yet; the next AICore retries and the first call loads the model otherwise.
+        with _warm_up_lock:
+            _warmed_up_models.discard(key)
+
+def _context_size(config: OllamaAIConfig, model: str, needed: int) -> int:
+    """Return num_ctx for a call to a model that needs `needed` tokens: NUM_CTX if set, otherwise the size of the model.
+
+    The server reloads the model whenever num_ctx changes, so every call to a
+    host and model sends the same size. It starts at NUM_CTX_MIN, doubles when
+    a call needs more, up to NUM_CTX_MAX, and never shrinks, so a process
+    reloads the model at most a few times however its calls are mixed.
+    """
+    if config.num_ctx > 0:
+        return config.num_ctx
+    key: tuple[str | None, str] = (config.ollama_host, model)
+    largest: int = max(config.num_ctx_max, config.num_ctx_min)
+    with _context_sizes_lock:
+        size: int = _context_sizes.get(key, max(config.num_ctx_min, 1))
+        while size < needed and size < largest:
+            size *= 2
+        size = min(size, largest)
+        _context_sizes[key] = size
+        return size
+
+def _system_message(system_behavior: str) -> Message:
+    """Return the system message of a behavior, one object shared by every conversation that uses it."""
+    with _system_messages_lock:
+        if system_behavior not in _system_messages:
+            _system_messages[intern(system_behavior)] = Message(role="system", content=system_behavior)
+        return _system_messages[system_behavior]
+
+def _summarizer_executor() -> ThreadPoolExecutor:
+    """Return the worker threads, shared by every conversation, that summarize histories in the background."""
+    global _summarizer
+    with _summarizer_lock:
+        if _summarizer is None:
+            _summarizer = ThreadPoolExecutor(max_workers=4, thread_name_prefix="history-summarizer")
+        return _summarizer
+
+class ChatTurn:
+    """One user or assistant turn, stored as two slots instead of a Message; roles are interned."""
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str) -> None:
+        self.role: str = intern(role)
+        self.content: str = content
+
+
 class HistoryManager:
     """
     Manage chat history and system behavior.
@@ -16,32 +170,257 @@ class HistoryManager:
 
     @property
     def chat_history(self) -> list[Message]:
-        """Chat history for the conversation."""
-        if not self.__chat_history[0].role == "system":
-            self.__chat_history.insert(0, self.__create_message_with_role("system", self.system_behavior))
-        return self.__chat_history
+        """Chat history for the conversation, with the running summary right after the system message.
+
+        The system message is the same object on every call and always comes first, so the
+        model server can reuse its processed prefix between calls. Turns are kept as ChatTurn
+        records and only become Message objects here.
+        """
+        with self.__lock:
+            history: list[Message] = [self.__system_message]
+            if self.__summary_message is not None:
+                history.append(self.__summary_message)
+            history.extend(Message(role=turn.role, content=turn.content) for turn in self.__chat_history)
+        return history
+
+    @property
+    def summary(self) -> str | None:
+        """Running summary of the turns folded out of the chat history."""
+        return self.__summary
+
+    @property
+    def needs_summarizing(self) -> bool:
+        """Whether the history holds more turns than AMOUNT_BEFORE_SUMMARIZING or more characters than SESSION_MAX_CHARS allows."""
+        if not self.__summarizes:
+            return False
+        with self.__lock:
+            turns: int = len(self.__chat_history)
+            chars: int = self.__chat_chars
+        max_chars: int = self.config.session_max_chars
+        return turns > self.config.amount_before_summarizing or (0 < max_chars < chars and turns > 1)
 
     @property
     def config(self) -> OllamaAIConfig:
         return self.__config
 
-    def __init__(self, system_behavior: str, config: OllamaAIConfig) -> None:
+    @property
+    def chat_chars(self) -> int:
+        """Characters of the turns kept in memory."""
+        return self.__chat_chars
+
+    @property
+    def has_history(self) -> bool:
+        """Whether the session has turns, in memory, summarized or stored."""
+        return self.__turn_count > 0
+
+    @property
+    def session_id(self) -> str | None:
+        """Identifier the session is stored under, or None when it lives in memory only."""
+        return self.__session_id
+
+    @property
+    def area_of_knowledge(self) -> str | None:
+        """Area of knowledge last inferred for the session."""
+        return self.__area_of_knowledge
+
+    @property
+    def tutor_role(self) -> str | None:
+        """Tutor role last inferred for the session."""
+        return self.__tutor_role
+
+    def __init__(self, system_behavior: str, config: OllamaAIConfig, history_window: int | None = None,
+                 session_store: SessionStore | None = None, session_id: str | None = None) -> None:
         """Create a HistoryManager with the given system behavior.
 
+        With a session store, every turn, the running summary and the inferred profile are saved
+        under the session ID, and a session saved earlier is resumed from its summary and the
+        turns after it; older turns stay on disk. Beyond SESSION_MAX_CHARS characters of turns
+        the oldest ones are folded into the summary; they are dropped instead by a windowed
+        history, which is never summarized, and when summarizing fails or falls behind.
+
         Parameters:
             system_behavior: System instruction string.
+            history_window: If set, keep only this many previous user/assistant turns.
+            session_store: Store that persists the session, or None to keep it in memory only.
+            session_id: Identifier of the session in the store.
         """
-        self.__system_behavior: str = system_behavior
-        self.__chat_history: list[Message] = []
+        if session_store is not None and not session_id:
+            raise ValueError("A session ID is required to persist the chat history")
+        self.__system_message: Message = _system_message(system_behavior)
+        self.__system_behavior: str = self.__system_message.content
+        self.__chat_history: list[ChatTurn] = []
+        self.__chat_chars: int = 0
         self.__config: OllamaAIConfig = config
+        self.__summary: str | None = None
+        self.__summary_message: Message | None = None
+        self.__lock: Lock = Lock()
+        self.__history_window: int | None = None if history_window is None else max(history_window, 0)
+        self.__session_store: SessionStore | None = session_store
+        self.__session_id: str | None = session_id
+        self.__turn_count: int = 0
+        # Number of the oldest turn still in memory; the ones before it were trimmed or summarized.
+        self.__first_turn: int = 0
+        self.__summarized_turns: int = 0
+        self.__area_of_knowledge: str | None = None
+        self.__tutor_role: str | None = None
+        if session_store is not None:
+            self.__restore()
 
     def add_user_message(self, message: str) -> None:
         """Add a user message to the chat history."""
-        self.__chat_history.append(self.__create_message_with_role("user", message))
+        self.__add_turn("user", message)
 
     def add_assistant_message(self, message: str) -> None:
         """Add an assistant message to the chat history."""
-        self.__chat_history.append(self.__create_message_with_role("assistant", message))
+        self.__add_turn("assistant", message)
+
+    def set_profile(self, area_of_knowledge: str, tutor_role: str) -> None:
+        """Remember the inferred area of knowledge and tutor role, saving them with the session."""
+        with self.__lock:
+            if (area_of_knowledge, tutor_role) == (self.__area_of_knowledge, self.__tutor_role):
+                return
+            # Sessions on the same topic share one copy of the area and role.
+            self.__area_of_knowledge = intern(area_of_knowledge)
+            self.__tutor_role = intern(tutor_role)
+            if self.__session_store is not None:
+                self.__session_store.save(self.__record())
+
+    def turns(self) -> Iterator[StoredTurn]:
+        """Iterate over every turn of the session, reading stored turns from disk as they are consumed."""
+        if self.__session_store is not None:
+            yield from self.__session_store.turns(self.__session_id)
+            return
+        with self.__lock:
+            turns: list[ChatTurn] = list(self.__chat_history)
+        for turn in turns:
+            yield turn.role, turn.content
+
+    def messages_to_summarize(self) -> tuple[list[ChatTurn], int]:
+        """Return the oldest turns and the number of the turn after them, for fold_into_summary.
+
+        The most recent half of the threshold stays verbatim, or fewer turns when they
+        hold more than SESSION_MAX_CHARS characters; the last turn always stays.
+        """
+        max_chars: int = self.config.session_max_chars
+        with self.__lock:
+            turns: list[ChatTurn] = list(self.__chat_history)
+            first_turn: int = self.__first_turn
+        keep: int = min(max(2, self.config.amount_before_summarizing // 2), len(turns))
+        if max_chars > 0:
+            kept_chars: int = sum(len(turn.content) for turn in turns[len(turns) - keep:])
+            while keep > 1 and kept_chars > max_chars:
+                kept_chars -= len(turns[len(turns) - keep].content)
+                keep -= 1
+        folded: int = len(turns) - keep
+        return turns[:folded], first_turn + folded
+
+    def fold_into_summary(self, summary: str, end_turn: int) -> None:
+        """Replace the oldest turns with a summary.
+
+        Turns are identified by number, not position, so turns added or trimmed while the
+        summary was being written are never folded without having been summarized.
+
+        Parameters:
+            summary: New running summary that covers the folded turns and the previous summary.
+            end_turn: Number of the first turn the summary does not cover, from messages_to_summarize.
+        """
+        with self.__lock:
+            self.__drop_oldest(end_turn - self.__first_turn)
+            self.__summarized_turns = max(self.__summarized_turns, self.__first_turn)
+            self.__summary = summary
+            self.__summary_message = self.__create_message_with_role(
+                "system", f"Summary of the earlier conversation: {summary}"
+            )
+            if self.__session_store is not None:
+                self.__session_store.save(self.__record())
+
+    def trim_unsummarized(self) -> None:
+        """Drop the oldest turns beyond SESSION_MAX_CHARS characters, for a history whose summary failed."""
+        with self.__lock:
+            self.__trim_to_max_chars(self.config.session_max_chars)
+
+    def __add_turn(self, role: str, content: str) -> None:
+        """Append a turn to the chat history and to the stored session."""
+        with self.__lock:
+            self.__chat_history.append(ChatTurn(role, content))
+            self.__chat_chars += len(content)
+            self.__turn_count += 1
+            self.__trim_to_window()
+            self.__trim_to_max_chars(self.__max_chars)
+            if self.__session_store is not None:
+                self.__session_store.save(self.__record(), [(role, content)])
+
+    def __record(self) -> SessionRecord:
+        """Return the stored header of the session."""
+        return SessionRecord(self.__session_id, self.__turn_count, self.__summary, self.__summarized_turns,
+                             self.__area_of_knowledge, self.__tutor_role)
+
+    def __restore(self) -> None:
+        """Load the summary, the profile and the turns after the summary of a stored session."""
+        record: SessionRecord | None = self.__session_store.load(self.__session_id)
+        if record is None:
+            return
+        self.__turn_count = record.turn_count
+        self.__summarized_turns = record.summarized_turns
+        self.__area_of_knowledge = intern(record.area_of_knowledge) if record.area_of_knowledge else None
+        self.__tutor_role = intern(record.tutor_role) if record.tutor_role else None
+        if record.summary is not None:
+            self.__summary = record.summary
+            self.__summary_message = self.__create_message_with_role(
+                "system", f"Summary of the earlier conversation: {record.summary}"
+            )
+        # Only what the next call would send is loaded: the window, or the turns awaiting summarizing.
+        limit: int = (2 * self.__history_window + 1 if self.__history_window is not None
+                      else max(self.config.session_history_window, self.config.amount_before_summarizing))
+        turns: list[StoredTurn] = self.__session_store.recent_turns(self.__session_id, limit, record.summarized_turns)
+        self.__chat_history = [ChatTurn(role, content) for role, content in turns]
+        self.__chat_chars = sum(len(content) for _, content in turns)
+        self.__first_turn = record.turn_count - len(turns)
+        self.__trim_to_max_chars(self.__max_chars)
+
+    def __trim_to_window(self) -> None:
+        """Drop turns older than the history window, keeping the system message."""
+        if self.__history_window is None:
+            return
+        excess: int = len(self.__chat_history) - (2 * self.__history_window + 1)
+        if excess > 0:
+            self.__drop_oldest(excess)
+
+    @property
+    def __max_chars(self) -> int:
+        """Characters of turns kept before the oldest are dropped.
+
+        A summarized history folds its oldest turns into the summary instead, so it is only cut
+        at twice SESSION_MAX_CHARS, in case summaries keep failing or fall behind.
+        """
+        return 2 * self.config.session_max_chars if self.__summarizes else self.config.session_max_chars
+
+    def __trim_to_max_chars(self, max_chars: int) -> None:
+        """Drop the oldest turns while the history holds more than max_chars characters, keeping the last turn."""
+        if max_chars <= 0:
+            return
+        count: int = 0
+        chars: int = self.__chat_chars
+        while chars > max_chars and count < len(self.__chat_history) - 1:
+            chars -= len(self.__chat_history[count].content)
+            count += 1
+        # Never start the history with the answer to a question that was dropped.
+        while count and self.__chat_history[count].role == "assistant" and count < len(self.__chat_history) - 1:
+            count += 1
+        self.__drop_oldest(count)
+
+    def __drop_oldest(self, count: int) -> None:
+        """Remove the oldest turns from memory; the caller holds the lock."""
+        if count <= 0:
+            return
+        self.__chat_chars -= sum(len(turn.content) for turn in self.__chat_history[:count])
+        del self.__chat_history[:count]
+        self.__first_turn += count
+
+    @property
+    def __summarizes(self) -> bool:
+        """Whether older turns are folded into a running summary rather than dropped."""
+        return self.__history_window is None and self.config.amount_before_summarizing > 0
 
     def __create_message_with_role(self, role: str, content: str) -> Message:
         """Create a message with the given role and content."""
@@ -49,6 +428,8 @@ class HistoryManager:
 
 
 class AICore(ABC, Generic[TAiResponse]):
+    # Stage reported to instrumentation hooks for calls made outside any stage block.
+    _default_stage: str = "ask"
 
     @property
     def _config(self) -> OllamaAIConfig:
@@ -58,17 +439,369 @@ class AICore(ABC, Generic[TAiResponse]):
     def _history_manager(self) -> HistoryManager:
         return self.__history_manager
 
-    def __init__(self, system_behavior: str, config: OllamaAIConfig) -> None:
+    @property
+    def _model(self) -> str:
+        """Model this instance sends its calls to."""
+        return self._config.model_id
+
+    @property
+    def _reasoning_effort(self) -> str | None:
+        """Thinking setting sent with every call, or None to send none."""
+        return None
+
+    @property
+    def _keeps_history(self) -> bool:
+        """Whether ask adds its request and answer to the history; otherwise each call is sent on its own."""
+        return True
+
+    @property
+    def _scheduler(self) -> CallScheduler:
+        """Return the shared scheduler that admits calls to the Ollama server."""
+        return shared_scheduler(f"ollama:{self._config.ollama_host or 'default'}", self._config.max_concurrent_calls,
+                                self._config.rate_limit_rpm, self._config.rate_limit_tpm,
+                                self._config.interactive_reserved_calls)
+
+    @property
+    def _policy(self) -> CallPolicy:
+        """Return the shared policy for timeouts, retries and hedging of calls to the Ollama server."""
+        return shared_policy(f"ollama:{self._config.ollama_host or 'default'}", _is_transient_error,
+                             self._config.call_timeout, self._config.max_attempts, self._config.retry_backoff_base,
+                             self._config.retry_backoff_max,
+                             self._config.hedge_quantile if self._config.hedge_requests else None,
+                             self._config.hedge_min_samples, self._config.retry_timeouts)
+
+    @property
+    def _client(self) -> Client:
+        """Return the shared, pooled Ollama client."""
+        return get_client(self._config)
+
+    @property
+    def _async_client(self) -> AsyncClient:
+        """Return the shared, pooled asynchronous Ollama client for the running event loop."""
+        return get_async_client(self._config)
+
+    def __init__(self, system_behavior: str, config: OllamaAIConfig, history_window: int | None = None,
+                 session_id: str | None = None) -> None:
         self.__config: OllamaAIConfig = config
-        self.__history_manager: HistoryManager = HistoryManager(system_behavior, self._config)
+        # A session is persisted only when it has an ID and SESSION_STORE names a backend.
+        session_store: SessionStore | None = (shared_session_store(config.session_store, config.session_store_path)
+                                              if session_id and config.session_store else None)
+        self.__history_manager: HistoryManager = HistoryManager(system_behavior, self._config, history_window,
+                                                                session_store, session_id)
+        self.__pending_summary: Future | None = None
+        self.__trace_conversation: str | None = None
+        if config.model_warm_up:
+            _warm_up_model(config, self._model)
+
+    def ask(self, request: str, call_overrides: dict[str, Any] | None = None) -> TAiResponse:
+        # The request joins the history only with its answer, so a failed call leaves the history as it was.
+        messages: list[Message] = self._messages_with(request)
+        trace: TraceCall | None = self._start_trace(request)
+        try:
+            response: ChatResponse = self._send_shared(messages, call_overrides)
+        except Exception as error:
+            if trace is not None:
+                trace.finish(error=error)
+            raise
+        if trace is not None:
+            self._finish_trace(trace, response)
+        if self._keeps_history:
+            self._commit_exchange(request, response)
+        return self._process_response(response)
+
+    async def ask_async(self, request: str, call_overrides: dict[str, Any] | None = None) -> TAiResponse:
+        # The request joins the history only with its answer, so a failed call leaves the history as it was.
+        messages: list[Message] = self._messages_with(request)
+        trace: TraceCall | None = self._start_trace(request)
+        try:
+            response: ChatResponse = await self._send_shared_async(messages, call_overrides)
+        except Exception as error:
+            if trace is not None:
+                trace.finish(error=error)
+            raise
+        if trace is not None:
+            self._finish_trace(trace, response)
+        if self._keeps_history:
+            self._commit_exchange(request, response)
+        return self._process_response(response)
+
+    def ask_stream(self, request: str) -> Iterator[str]:
+        """Send a request to the model and yield the answer as it is generated.
+
+        The request and answer are added to the history once the stream finishes; a stream the
+        caller closes early leaves the history unchanged and is traced as cancelled.
+        An identical stream already in flight is replayed instead of sending another call.
+        """
+        messages: list[Message] = self._messages_with(request)
+        trace: TraceCall | None = self._start_trace(request)
+        started: float = perf_counter()
+        content: list[str] = []
+        last: ChatResponse | None = None
+        try:
+            chunks: Iterator[ChatResponse] = self._send_stream(messages)
+            if self._config.single_flight_enabled:
+                shared: bool
+                chunks, shared = single_flight.stream(self._flight_key(messages), lambda: self._send_stream(messages))
+                if shared:
+                    self._record_cache_hit(started)
+            for last in chunks:
+                if last.message.content:
+                    content.append(last.message.content)
+                    yield last.message.content
+        except Exception as error:
+            if trace is not None:
+                trace.finish(error=error)
+            raise
+        except GeneratorExit:
+            if trace is not None:
+                trace.finish(error="cancelled")
+            raise
+        answer: str = "".join(content)
+        if trace is not None:
+            trace.finish(getattr(last, "prompt_eval_count", None), getattr(last, "eval_count", None), answer)
+        if self._keeps_history:
+            self._history_manager.add_user_message(request)
+            self._history_manager.add_assistant_message(answer if answer else "No response was received.")
+            self._schedule_summarizing()
+
+    def _send_stream(self, messages: list[Message]) -> Iterator[ChatResponse]:
+        """Call the model in streaming mode and yield its chunks; the call is recorded with the last one."""
+        arguments: dict[str, Any] = self._call_arguments(messages, {"stream": True})
+        ticket: Ticket
+        with self._scheduler.slot(self._estimate_tokens(messages)) as ticket:
+            started: float = perf_counter()
+            for chunk in self._client.chat(**arguments):
+                if getattr(chunk, "done", False):
+                    ticket.tokens = self._used_tokens(chunk, ticket.tokens)
+                    self._record_call(arguments["model"], started, chunk, ticket.queue_wait)
+                yield chunk
+
+    def _send_shared(self, messages: list[Message], call_overrides: dict[str, Any] | None = None) -> ChatResponse:
+        """Call the model, or wait for an identical call already in flight and share its response."""
+        if not self._config.single_flight_enabled:
+            return self._send(messages, call_overrides)
+        started: float = perf_counter()
+        response: ChatResponse
+        shared: bool
+        response, shared = single_flight.do(self._flight_key(messages, call_overrides),
+                                            lambda: self._send(messages, call_overrides))
+        if shared:
+            self._record_cache_hit(started)
+        return response
+
+    async def _send_shared_async(self, messages: list[Message], call_overrides: dict[str, Any] | None = None) -> ChatResponse:
+        """Asynchronously call the model, or wait for an identical call already in flight and share its response."""
+        if not self._config.single_flight_enabled:
+            return await self._send_async(messages, call_overrides)
+        started: float = perf_counter()
+        response: ChatResponse
+        shared: bool
+        response, shared = await single_flight.do_async(self._flight_key(messages, call_overrides),
+                                                        lambda: self._send_async(messages, call_overrides))
+        if shared:
+            self._record_cache_hit(started)
+        return response
+
+    def _flight_key(self, messages: list[Message], call_overrides: dict[str, Any] | None = None) -> str:
+        """Return the key under which identical calls share one in-flight call.
 
-    def ask(self, request: str) -> TAiResponse:
+        The key covers the model, the thinking setting, the overrides and every
+        message - system behavior, summary and earlier turns - with normalized
+        text, so conversations with different histories never share a call.
+        The context size is left out: it only changes how much history fits,
+        not the answer to the same messages.
+        """
+        payload: str = dumps({
+            "model": self._model,
+            "think": self._reasoning_effort,
+            "messages": [[message.role, ResponseCache.normalize(message.content or "")] for message in messages],
+            "overrides": call_overrides or {}
+        }, sort_keys=True, default=str)
+        return sha256(f"{type(self).__qualname__}\0{payload}".encode("utf-8")).hexdigest()
+
+    def _send(self, messages: list[Message], call_overrides: dict[str, Any] | None = None) -> ChatResponse:
+        """Call the model with the given messages without touching the chat history.
+
+        Attempts are timed out, retried and hedged by the CallPolicy within the current deadline.
+        Client.chat takes no per-call timeout, so attempts run on their own thread and one that is
+        abandoned closes its request at the next streamed chunk; only the returned response is ever
+        added to the history.
+        """
+        return self._policy.run(self._latency_key(call_overrides),
+                                lambda timeout: self._send_once(messages, call_overrides), enforces_timeout=False)
+
+    async def _send_async(self, messages: list[Message], call_overrides: dict[str, Any] | None = None) -> ChatResponse:
+        """Asynchronously call the model with the given messages without touching the chat history."""
+        return await self._policy.run_async(self._latency_key(call_overrides),
+                                            lambda timeout: self._send_once_async(messages, call_overrides))
+
+    def _latency_key(self, call_overrides: dict[str, Any] | None = None) -> str:
+        """Return the kind of a call for the hedging threshold: its stage and model."""
+        model: str = (call_overrides or {}).get("model", self._model)
+        return f"{instrumentation.current_stage(self._default_stage)}:{model}"
+
+    def _is_retryable(self, error: BaseException) -> bool:
+        """Whether a failed call is transient, so its stage may be skipped instead of failing the request."""
+        return self._policy.is_retryable(error)
+
+    def _send_once(self, messages: list[Message], call_overrides: dict[str, Any] | None = None) -> ChatResponse:
+        """Make one attempt of a chat call."""
+        arguments: dict[str, Any] = self._call_arguments(messages, call_overrides)
+        ticket: Ticket
+        with self._scheduler.slot(self._estimate_tokens(messages)) as ticket:
+            started: float = perf_counter()
+            cancellation: Cancellation | None = current_cancellation()
+            response: ChatResponse = (self._client.chat(**arguments) if cancellation is None
+                                      else _chat_cancellable(self._client, arguments, cancellation))
+            ticket.tokens = self._used_tokens(response, ticket.tokens)
+        self._record_call(arguments["model"], started, response, ticket.queue_wait)
+        return response
+
+    async def _send_once_async(self, messages: list[Message], call_overrides: dict[str, Any] | None = None) -> ChatResponse:
+        """Asynchronously make one attempt of a chat call."""
+        arguments: dict[str, Any] = self._call_arguments(messages, call_overrides)
+        ticket: Ticket
+        async with self._scheduler.slot_async(self._estimate_tokens(messages)) as ticket:
+            started: float = perf_counter()
+            response: ChatResponse = await self._async_client.chat(**arguments)
+            ticket.tokens = self._used_tokens(response, ticket.tokens)
+        self._record_call(arguments["model"], started, response, ticket.queue_wait)
+        return response
+
+    def _estimate_tokens(self, messages: list[Message]) -> int:
+        """Estimate the tokens of a call for the tokens-per-minute limit; corrected once the call returns."""
+        characters: int = sum(len(message.content or "") for message in messages)
+        return characters // _CHARACTERS_PER_TOKEN + max(self._config.num_predict, 0)
+
+    def _used_tokens(self, response: ChatResponse, estimated: int) -> int:
+        """Return the prompt and generated tokens reported by the server, or the estimate when it reports none."""
+        counts: list[Any] = [getattr(response, "prompt_eval_count", None), getattr(response, "eval_count", None)]
+        reported: list[int] = [count for count in counts if isinstance(count, int)]
+        return sum(reported) if reported else estimated
+
+    def _call_arguments(self, messages: list[Message], call_overrides: dict[str, Any] | None = None) -> dict[str, Any]:
+        """Return the keyword arguments of a chat call; "options" in the overrides are merged, not replaced."""
+        model: str = (call_overrides or {}).get("model", self._model)
+        arguments: dict[str, Any] = {
+            "model": model,
+            "messages": messages,
+            "options": _generation_options(self._config, self._context_size(model, messages))
+        }
+        if self._config.keep_alive is not None:
+            arguments["keep_alive"] = self._config.keep_alive
+        if self._reasoning_effort is not None:
+            think: str = self._reasoning_effort.lower()
+            arguments["think"] = {"true": True, "false": False}.get(think, think)
+        for key, value in (call_overrides or {}).items():
+            arguments[key] = {**arguments["options"], **value} if key == "options" else value
+        return arguments
+
+    def _context_size(self, model: str, messages: list[Message]) -> int:
+        """Return num_ctx for a call: NUM_CTX if set, otherwise the size the process uses for the model."""
+        reserve: int = self._config.num_predict if self._config.num_predict > 0 else _RESPONSE_TOKEN_RESERVE
+        needed: int = sum(len(message.content or "") for message in messages) // _CHARACTERS_PER_TOKEN + reserve
+        return _context_size(self._config, model, needed)
+
+    def _record_call(self, model: str, started: float, response: ChatResponse, queue_wait: float = 0.0) -> None:
+        """Report a finished model call to the instrumentation hooks, if any are registered.
+
+        Token counts and the generation time come from the final response of the Ollama server;
+        queue_wait is the time the call waited for the scheduler.
+        """
+        if not instrumentation.enabled:
+            return
+        eval_duration: int | None = getattr(response, "eval_duration", None)
+        instrumentation.emit(CallRecord(
+            stage=instrumentation.current_stage(self._default_stage),
+            model=model,
+            wall_time=perf_counter() - started,
+            queue_wait=queue_wait,
+            prompt_tokens=getattr(response, "prompt_eval_count", None),
+            completion_tokens=getattr(response, "eval_count", None),
+            eval_duration=eval_duration / 1e9 if eval_duration else None
+        ))
+
+    def _record_cache_hit(self, started: float) -> None:
+        """Report an answer served from a cache instead of a model call."""
+        if instrumentation.enabled:
+            instrumentation.emit(CallRecord(stage=instrumentation.current_stage(self._default_stage),
+                                            model=self._model, wall_time=perf_counter() - started,
+                                            cache_hit=True))
+
+    def _start_trace(self, request: str) -> TraceCall | None:
+        """Start tracing an ask call, or return None when TRACE_PATH is not set."""
+        if not self._config.trace_path:
+            return None
+        if self.__trace_conversation is None:
+            self.__trace_conversation = self._history_manager.session_id or f"{getpid()}-{next(_trace_conversations)}"
+        return shared_recorder(self._config.trace_path, self._config.trace_payloads).start(
+            instrumentation.current_stage(self._default_stage), self.__trace_conversation, request
+        )
+
+    def _finish_trace(self, trace: TraceCall, response: ChatResponse) -> None:
+        """Record a traced ask call with the token counts and answer of its response."""
+        trace.finish(getattr(response, "prompt_eval_count", None), getattr(response, "eval_count", None),
+                     response.message.content)
+
+    def _messages_with(self, request: str) -> list[Message]:
+        """Return the chat history followed by the request, without adding the request to the history."""
+        return self._history_manager.chat_history + [Message(role="user", content=request)]
+
+    def _commit_exchange(self, request: str, response: ChatResponse) -> None:
+        """Add a request sent with _send and its response to the chat history."""
         self._history_manager.add_user_message(request)
-        response: ChatResponse = chat(model=self._config.model_id, messages=self._history_manager.chat_history)
         self._history_manager.add_assistant_message(
             response.message.content if response.message.content else "No response was received."
         )
-        return self._process_response(response)
+        self._schedule_summarizing()
+
+    def _schedule_summarizing(self) -> None:
+        """Fold older turns into the running summary in the background once the history grows too long."""
+        if self.__pending_summary is not None and not self.__pending_summary.done():
+            return
+        if not self._history_manager.needs_summarizing:
+            return
+        self.__pending_summary = _summarizer_executor().submit(self._summarize_history)
+        self.__pending_summary.add_done_callback(self.__summary_done)
+
+    def __summary_done(self, summary: Future) -> None:
+        """Log a failed summary and drop the turns past SESSION_MAX_CHARS it would have folded."""
+        error: BaseException | None = summary.exception()
+        if error is not None:
+            _logger.error("Summarizing the chat history failed", exc_info=error)
+        if (error is not None or not summary.result()) and self._history_manager.needs_summarizing:
+            self._history_manager.trim_unsummarized()
+
+    def _summarize_history(self) -> bool:
+        """Summarize the oldest turns together with the previous summary and fold them out of the history.
+
+        A failed call leaves the turns within SESSION_MAX_CHARS in place; they are summarized after the next turn.
+
+        Returns:
+            False when the summary came back empty, True otherwise.
+        """
+        messages: list[ChatTurn]
+        end_turn: int
+        messages, end_turn = self._history_manager.messages_to_summarize()
+        if not messages:
+            return True
+        transcript: str = "\n".join(f"{message.role}: {message.content}" for message in messages)
+        previous_summary: str = self._history_manager.summary or "None"
+        prompt: str = (f"Previous summary: {previous_summary}\n"
+                       f"Conversation:\n{transcript}\n"
+                       "Write an updated summary of the conversation that keeps every fact, question and conclusion "
+                       "needed to continue it. Respond ONLY with the summary.\n"
+                       "Summary:")
+        # Summaries are a helper task, so they run on the helper model, after interactive and bulk calls.
+        with instrumentation.stage("summarize"), call_priority(Priority.BACKGROUND):
+            response: ChatResponse = self._send([
+                Message(role="system", content="You summarize tutoring conversations concisely and accurately."),
+                Message(role="user", content=prompt)
+            ], {"model": self._config.self_reference_model})
+        if not response.message.content:
+            return False
+        self._history_manager.fold_into_summary(response.message.content.strip(), end_turn)
+        return True
 
     @abstractmethod
     def _process_response(self, response: ChatResponse) -> TAiResponse:
@@ -0,0 +1,298 @@
+"""Instrumentation: per-stage timing and token-usage records for every model call, plus an aggregator."""
+import bisect
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import threading
+from typing import Any, Callable, Iterator, NamedTuple, TypeVar
+
+class CallRecord(NamedTuple):
+    """Measurements of one model call or cache lookup."""
+    stage: str
+    model: str
+    wall_time: float
+    queue_wait: float = 0.0
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    cached_tokens: int | None = None
+    eval_duration: float | None = None
+    cache_hit: bool = False
+
+CallHook = Callable[[CallRecord], None]
+
+_logger: logging.Logger = logging.getLogger(__name__)
+
+class Instrumentation:
+    """Registry of hooks notified about every model call.
+
+    With no hooks registered, `enabled` is False and AICore skips building
+    records altogether.
+    """
+
+    @property
+    def enabled(self) -> bool:
+        """Whether at least one hook is registered."""
+        return bool(self.__hooks)
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self.__hooks: tuple[CallHook, ...] = ()
+        self.__lock: threading.Lock = threading.Lock()
+        self.__stage: contextvars.ContextVar[str | None] = contextvars.ContextVar("instrumentation_stage", default=None)
+
+    def add_hook(self, hook: CallHook) -> None:
+        """Register a hook.
+
+        Parameters:
+            hook: Callable receiving a CallRecord after each call.
+        """
+        with self.__lock:
+            self.__hooks = self.__hooks + (hook,)
+
+    def remove_hook(self, hook: CallHook) -> None:
+        """Unregister a hook.
+
+        Parameters:
+            hook: Previously registered hook.
+        """
+        with self.__lock:
+            self.__hooks = tuple(registered for registered in self.__hooks if registered is not hook)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Attribute the model calls made inside the block to a pipeline stage.
+
+        Parameters:
+            name: Stage name, e.g. "infer_profile".
+        """
+        token: contextvars.Token = self.__stage.set(name)
+        try:
+            yield
+        finally:
+            self.__stage.reset(token)
+
+    def current_stage(self, default: str) -> str:
+        """Return the innermost active stage name, or the default.
+
+        Parameters:
+            default: Name used outside of any stage block.
+
+        Returns:
+            str: Stage name.
+        """
+        return self.__stage.get() or default
+
+    def emit(self, record: CallRecord) -> None:
+        """Pass a record to every registered hook.
+
+        A hook that raises is logged and skipped, so a faulty hook never fails
+        the model call it reports on or keeps the other hooks from running.
+
+        Parameters:
+            record: Measurements of one call.
+        """
+        for hook in self.__hooks:
+            try:
+                hook(record)
+            except Exception:
+                _logger.exception("Instrumentation hook %r failed", hook)
+
+
+instrumentation: Instrumentation = Instrumentation()
+
+TCallable = TypeVar("TCallable", bound=Callable[..., Any])
+
+def staged(name: str) -> Callable[[TCallable], TCallable]:
+    """Decorate a method so the model calls it makes are attributed to a stage.
+
+    Works for regular and async functions.
+
+    Parameters:
+        name: Stage name.
+
+    Returns:
+        Callable: Decorator.
+    """
+    def decorator(function: TCallable) -> TCallable:
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with instrumentation.stage(name):
+                    return await function(*args, **kwargs)
+            return async_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with instrumentation.stage(name):
+                return function(*args, **kwargs)
+        return wrapper  # type: ignore[return-value]
+    return decorator
+
+SECONDS_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS: tuple[float, ...] = (16, 64, 256, 1024, 4096, 16384, 65536)
+
+class _Histogram:
+    """Cumulative histogram with fixed bucket bounds."""
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds: tuple[float, ...]) -> None:
+        self.bounds: tuple[float, ...] = bounds
+        self.counts: list[int] = [0] * (len(bounds) + 1)
+        self.total: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        running: int = 0
+        buckets: list[tuple[str, int]] = []
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            running += count
+            buckets.append(("+Inf" if bound == float("inf") else repr(bound), running))
+        return buckets
+
+
+class MetricsAggregator:
+    """Hook that aggregates call records into histograms per stage and model.
+
+    Register it with `instrumentation.add_hook(aggregator)` and export with
+    `to_prometheus()` or `to_json()`.
+    """
+    __HISTOGRAMS: tuple[tuple[str, str, tuple[float, ...]], ...] = (
+        ("tutor_model_call_seconds", "Wall time of model calls in seconds.", SECONDS_BUCKETS),
+        ("tutor_queue_wait_seconds", "Time model calls waited before being sent, in seconds.", SECONDS_BUCKETS),
+        ("tutor_prompt_tokens", "Prompt tokens per model call.", TOKEN_BUCKETS),
+        ("tutor_completion_tokens", "Completion tokens per model call.", TOKEN_BUCKETS)
+    )
+    __COUNTERS: tuple[tuple[str, str], ...] = (
+        ("tutor_model_calls_total", "Number of model calls."),
+        ("tutor_cache_hits_total", "Number of answers served from a cache instead of a model call."),
+        ("tutor_cached_prompt_tokens_total", "Prompt tokens served from the provider's prompt cache."),
+        ("tutor_eval_seconds_total", "Generation time reported by the model server, in seconds.")
+    )
+
+    def __init__(self) -> None:
+        """Create an empty aggregator."""
+        self.__histograms: dict[tuple[str, str, str], _Histogram] = {}
+        self.__counters: dict[tuple[str, str, str], float] = {}
+        self.__lock: threading.Lock = threading.Lock()
+
+    def __call__(self, record: CallRecord) -> None:
+        """Aggregate one call record.
+
+        Parameters:
+            record: Measurements of one call.
+        """
+        labels: tuple[str, str] = (record.stage, record.model)
+        with self.__lock:
+            if record.cache_hit:
+                self.__add("tutor_cache_hits_total", labels, 1)
+                return
+            self.__add("tutor_model_calls_total", labels, 1)
+            self.__observe("tutor_model_call_seconds", labels, record.wall_time)
+            self.__observe("tutor_queue_wait_seconds", labels, record.queue_wait)
+            if record.prompt_tokens is not None:
+                self.__observe("tutor_prompt_tokens", labels, record.prompt_tokens)
+            if record.completion_tokens is not None:
+                self.__observe("tutor_completion_tokens", labels, record.completion_tokens)
+            if record.cached_tokens:
+                self.__add("tutor_cached_prompt_tokens_total", labels, record.cached_tokens)
+            if record.eval_duration:
+                self.__add("tutor_eval_seconds_total", labels, record.eval_duration)
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: Exposition text.
+        """
+        lines: list[str] = []
+        with self.__lock:
+            for name, description, _ in self.__HISTOGRAMS:
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, stage, model), histogram in sorted(self.__histograms.items()):
+                    if metric != name:
+                        continue
+                    label_text: str = f'stage="{_escape(stage)}",model="{_escape(model)}"'
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{label_text},le="{bound}"}} {count}')
+                    lines.append(f"{name}_sum{{{label_text}}} {histogram.total}")
+                    lines.append(f"{name}_count{{{label_text}}} {histogram.count}")
+            for name, description in self.__COUNTERS:
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} counter")
+                for (metric, stage, model), value in sorted(self.__counters.items()):
+                    if metric == name:
+                        lines.append(f'{name}{{stage="{_escape(stage)}",model="{_escape(model)}"}} {value}')
+            lines.append("# HELP tutor_cached_prompt_token_ratio Share of prompt tokens served from the provider's prompt cache.")
+            lines.append("# TYPE tutor_cached_prompt_token_ratio gauge")
+            for (stage, model), ratio in sorted(self.__cached_token_ratios().items()):
+                lines.append(f'tutor_cached_prompt_token_ratio{{stage="{_escape(stage)}",model="{_escape(model)}"}} {ratio}')
+        return "\n".join(lines) + "\n"
+
+    def cached_token_ratios(self) -> dict[tuple[str, str], float]:
+        """Return the share of prompt tokens served from the provider's prompt cache.
+
+        Returns:
+            dict: (stage, model) -> cached prompt tokens / prompt tokens, for series with prompt tokens.
+        """
+        with self.__lock:
+            return self.__cached_token_ratios()
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return all metrics as a JSON-serializable dictionary.
+
+        Returns:
+            dict: Metric name -> list of labelled series.
+        """
+        result: dict[str, list[dict[str, Any]]] = {}
+        with self.__lock:
+            for (metric, stage, model), histogram in sorted(self.__histograms.items()):
+                result.setdefault(metric, []).append({
+                    "stage": stage, "model": model, "count": histogram.count, "sum": histogram.total,
+                    "buckets": dict(histogram.cumulative())
+                })
+            for (metric, stage, model), value in sorted(self.__counters.items()):
+                result.setdefault(metric, []).append({"stage": stage, "model": model, "value": value})
+            for (stage, model), ratio in sorted(self.__cached_token_ratios().items()):
+                result.setdefault("tutor_cached_prompt_token_ratio", []).append({"stage": stage, "model": model, "value": ratio})
+        return result
+
+    def to_json(self) -> str:
+        """Return all metrics as a JSON document."""
+        return json.dumps(self.to_dict(), indent=2)
+
+    def __observe(self, metric: str, labels: tuple[str, str], value: float) -> None:
+        """Add a value to a labelled histogram."""
+        key: tuple[str, str, str] = (metric, labels[0], labels[1])
+        histogram: _Histogram | None = self.__histograms.get(key)
+        if histogram is None:
+            bounds: tuple[float, ...] = next(bounds for name, _, bounds in self.__HISTOGRAMS if name == metric)
+            histogram = self.__histograms[key] = _Histogram(bounds)
+        histogram.observe(value)
+
+    def __cached_token_ratios(self) -> dict[tuple[str, str], float]:
+        """Compute cached-token ratios; the caller holds the lock."""
+        ratios: dict[tuple[str, str], float] = {}
+        for (metric, stage, model), histogram in self.__histograms.items():
+            if metric == "tutor_prompt_tokens" and histogram.total > 0:
+                cached: float = self.__counters.get(("tutor_cached_prompt_tokens_total", stage, model), 0)
+                ratios[(stage, model)] = cached / histogram.total
+        return ratios
+
+    def __add(self, metric: str, labels: tuple[str, str], value: float) -> None:
+        """Increase a labelled counter."""
+        key: tuple[str, str, str] = (metric, labels[0], labels[1])
+        self.__counters[key] = self.__counters.get(key, 0) + value
+
+
+def _escape(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -0,0 +1,491 @@
+"""CallPolicy: deadlines, retries with jittered backoff and hedged requests for model calls."""
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import contextvars
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+class DeadlineExceeded(TimeoutError):
+    """The end-to-end deadline passed before the model call could finish."""
+
+
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("call_deadline", default=None)
+
+@contextlib.contextmanager
+def deadline(seconds: float | None) -> Iterator[None]:
+    """Make the model calls inside the block finish within `seconds`.
+
+    The deadline is a context variable, so it reaches every stage of a
+    pipeline, including calls made by helper objects and asyncio tasks. A
+    nested deadline never extends an outer one.
+
+    Parameters:
+        seconds: Time budget of the block; None or a non-positive value sets no deadline.
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+    outer: float | None = _deadline.get()
+    expires: float = time.monotonic() + seconds
+    token: contextvars.Token = _deadline.set(expires if outer is None else min(outer, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining() -> float | None:
+    """Return the seconds left until the current deadline, or None without one."""
+    expires: float | None = _deadline.get()
+    return None if expires is None else expires - time.monotonic()
+
+
+class Cancellation:
+    """Cancellation of an attempt that runs on its own thread and may be abandoned.
+
+    An abandoned attempt keeps its thread, its scheduler slot and its server
+    request unless it stops itself, so code running inside the attempt checks
+    `cancelled` or registers a callback that aborts what it is waiting for.
+    """
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether the attempt was abandoned."""
+        return self.__cancelled
+
+    def __init__(self) -> None:
+        """Create a cancellation that has not been triggered."""
+        self.__cancelled: bool = False
+        self.__callbacks: list[Callable[[], Any]] = []
+        self.__lock: threading.Lock = threading.Lock()
+
+    def add_callback(self, callback: Callable[[], Any]) -> None:
+        """Call `callback` when the attempt is abandoned, at once if it already was.
+
+        Parameters:
+            callback: Function without arguments, e.g. one that wakes a waiting thread.
+        """
+        with self.__lock:
+            if not self.__cancelled:
+                self.__callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self) -> None:
+        """Abandon the attempt and run its callbacks once."""
+        with self.__lock:
+            if self.__cancelled:
+                return
+            self.__cancelled = True
+            callbacks: list[Callable[[], Any]] = self.__callbacks
+            self.__callbacks = []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+
+_cancellation: contextvars.ContextVar[Cancellation | None] = contextvars.ContextVar("call_cancellation", default=None)
+
+def current_cancellation() -> Cancellation | None:
+    """Return the cancellation of the abandonable attempt running in the current context, or None."""
+    return _cancellation.get()
+
+@contextlib.contextmanager
+def cancellable(cancellation: Cancellation) -> Iterator[None]:
+    """Make the model calls inside the block stop when `cancellation` is cancelled.
+
+    A running attempt closes its server request and frees its scheduler slot,
+    and no further attempt is made; the call raises TimeoutError.
+
+    Parameters:
+        cancellation: Cancellation the caller triggers to abandon the calls.
+    """
+    token: contextvars.Token = _cancellation.set(cancellation)
+    try:
+        yield
+    finally:
+        _cancellation.reset(token)
+
+def _abandoned() -> bool:
+    """Whether the call running in the current context was cancelled."""
+    cancellation: Cancellation | None = _cancellation.get()
+    return cancellation is not None and cancellation.cancelled
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies per key, used as the hedging threshold.
+
+    Parameters:
+        window: Number of latencies kept per key.
+    """
+
+    def __init__(self, window: int = 200) -> None:
+        """Create an empty tracker.
+
+        Parameters:
+            window: Number of latencies kept per key.
+        """
+        self.__window: int = window
+        self.__latencies: dict[str, collections.deque[float]] = {}
+        self.__lock: threading.Lock = threading.Lock()
+
+    def observe(self, key: str, seconds: float) -> None:
+        """Add the latency of a successful call.
+
+        Parameters:
+            key: Kind of call, e.g. stage and model.
+            seconds: Wall time of the call.
+        """
+        with self.__lock:
+            latencies: collections.deque[float] | None = self.__latencies.get(key)
+            if latencies is None:
+                latencies = self.__latencies[key] = collections.deque(maxlen=self.__window)
+            latencies.append(seconds)
+
+    def quantile(self, key: str, q: float, min_samples: int = 20) -> float | None:
+        """Return a latency quantile, or None while fewer than `min_samples` latencies are known.
+
+        Parameters:
+            key: Kind of call.
+            q: Quantile between 0 and 1.
+            min_samples: Minimal number of latencies for a meaningful quantile.
+
+        Returns:
+            float | None: Latency in seconds.
+        """
+        with self.__lock:
+            latencies: list[float] = sorted(self.__latencies.get(key, ()))
+        if len(latencies) < max(min_samples, 1):
+            return None
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+
+class CallPolicy:
+    """Run model calls with a per-attempt timeout, retries and optional hedging, within the current deadline.
+
+    Every attempt gets the per-call timeout, cut to the time left before the
+    deadline. Failed attempts are retried when `is_retryable` accepts the
+    error; the pause is drawn uniformly between 0 and an exponentially
+    growing bound (full jitter), so clients do not retry in lockstep, and no
+    pause outlasts the deadline. With hedging, an attempt still running after
+    the observed latency quantile of its kind gets a duplicate, and the first
+    successful result wins. Attempts must not change conversation state; the
+    caller commits the winning response only, so the losing one is simply
+    never referenced.
+
+    Attempts that cannot time themselves out run on a thread of their own, so
+    their timeout starts when they do. A losing or timed-out attempt is
+    cancelled through its Cancellation and stops at its next check. Without
+    `retry_timeouts` an attempt that timed out is not retried: on a local
+    server the abandoned generation would still hold the capacity the retry
+    needs.
+
+    Parameters:
+        call_timeout: Seconds allowed per attempt (0 for no limit).
+        max_attempts: Attempts per call, including the first.
+        backoff_base: Upper bound of the first pause between attempts, in seconds.
+        backoff_max: Largest upper bound of a pause, in seconds.
+        is_retryable: Whether an error is worth another attempt.
+        hedge_quantile: Latency quantile after which a duplicate attempt is sent, or None to disable hedging.
+        hedge_min_samples: Latencies needed before hedging starts.
+        retry_timeouts: Whether an attempt that timed out is retried.
+    """
+
+    @property
+    def latencies(self) -> LatencyTracker:
+        """Latencies of successful attempts, per kind of call."""
+        return self.__latencies
+
+    def __init__(self, call_timeout: float = 0, max_attempts: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 8.0, is_retryable: Callable[[BaseException], bool] = lambda error: False,
+                 hedge_quantile: float | None = None, hedge_min_samples: int = 20, retry_timeouts: bool = True) -> None:
+        """Create a policy.
+
+        Parameters:
+            call_timeout: Seconds allowed per attempt (0 for no limit).
+            max_attempts: Attempts per call, including the first.
+            backoff_base: Upper bound of the first pause between attempts, in seconds.
+            backoff_max: Largest upper bound of a pause, in seconds.
+            is_retryable: Whether an error is worth another attempt.
+            hedge_quantile: Latency quantile after which a duplicate attempt is sent, or None to disable hedging.
+            hedge_min_samples: Latencies needed before hedging starts.
+            retry_timeouts: Whether an attempt that timed out is retried.
+        """
+        self.__call_timeout: float = call_timeout
+        self.__max_attempts: int = max(max_attempts, 1)
+        self.__backoff_base: float = backoff_base
+        self.__backoff_max: float = backoff_max
+        self.__is_retryable: Callable[[BaseException], bool] = is_retryable
+        self.__hedge_quantile: float | None = hedge_quantile
+        self.__hedge_min_samples: int = hedge_min_samples
+        self.__retry_timeouts: bool = retry_timeouts
+        self.__latencies: LatencyTracker = LatencyTracker()
+        self.__lock: threading.Lock = threading.Lock()
+        self.__counters: dict[str, int] = {"retries": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0}
+
+    def is_retryable(self, error: BaseException) -> bool:
+        """Whether an error is transient: a per-attempt timeout or an error accepted by `is_retryable`.
+
+        Parameters:
+            error: Error raised by an attempt.
+
+        Returns:
+            bool: True when another attempt may succeed.
+        """
+        if isinstance(error, DeadlineExceeded):
+            return False
+        return isinstance(error, TimeoutError) or self.__is_retryable(error)
+
+    def run(self, key: str, attempt: Callable[[float | None], T], enforces_timeout: bool = True) -> T:
+        """Run a call.
+
+        Parameters:
+            key: Kind of call, for the hedging threshold.
+            attempt: Makes one attempt, given its timeout in seconds or None.
+            enforces_timeout: Whether the attempt itself gives up after its timeout; otherwise
+                it runs on a thread of its own and is cancelled when the timeout passes.
+
+        Returns:
+            T: Result of the first successful attempt.
+
+        Raises:
+            DeadlineExceeded: If the deadline passes first.
+        """
+        attempt_number: int = 0
+        while True:
+            if _abandoned():
+                raise TimeoutError("Model call abandoned")
+            timeout: float | None = self.attempt_timeout()
+            try:
+                return self.__attempt(key, attempt, timeout, enforces_timeout)
+            except Exception as error:
+                delay: float = self.__retry_delay(attempt_number, error)
+            time.sleep(delay)
+            attempt_number += 1
+
+    async def run_async(self, key: str, attempt: Callable[[float | None], Awaitable[T]]) -> T:
+        """Asynchronously run a call; timed-out and losing attempts are cancelled.
+
+        Parameters:
+            key: Kind of call, for the hedging threshold.
+            attempt: Coroutine function making one attempt, given its timeout in seconds or None.
+
+        Returns:
+            T: Result of the first successful attempt.
+
+        Raises:
+            DeadlineExceeded: If the deadline passes first.
+        """
+        attempt_number: int = 0
+        while True:
+            timeout: float | None = self.attempt_timeout()
+            try:
+                return await self.__attempt_async(key, attempt, timeout)
+            except Exception as error:
+                delay: float = self.__retry_delay(attempt_number, error)
+            await asyncio.sleep(delay)
+            attempt_number += 1
+
+    def stats(self) -> dict[str, int]:
+        """Return the number of retries, hedged attempts, hedges that won and attempts that timed out."""
+        with self.__lock:
+            return dict(self.__counters)
+
+    def attempt_timeout(self) -> float | None:
+        """Return the timeout of the next attempt: the per-call timeout cut to the time left before the deadline.
+
+        Returns:
+            float | None: Seconds, or None when neither limit is set.
+
+        Raises:
+            DeadlineExceeded: If the deadline has passed.
+        """
+        left: float | None = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded("Deadline exceeded before the model call could be sent")
+        if self.__call_timeout > 0:
+            return self.__call_timeout if left is None else min(self.__call_timeout, left)
+        return left
+
+    def __count(self, name: str) -> None:
+        """Increase a counter."""
+        with self.__lock:
+            self.__counters[name] += 1
+
+    def __retry_delay(self, attempt_number: int, error: Exception) -> float:
+        """Return the pause before the next attempt, or re-raise the error when it must not be retried."""
+        if isinstance(error, TimeoutError) and not isinstance(error, DeadlineExceeded):
+            self.__count("timeouts")
+        if attempt_number + 1 >= self.__max_attempts or not self.is_retryable(error) or _abandoned():
+            raise error
+        if isinstance(error, TimeoutError) and not self.__retry_timeouts:
+            raise error
+        delay: float = random.uniform(0, min(self.__backoff_max, self.__backoff_base * 2 ** attempt_number))
+        left: float | None = remaining()
+        if left is not None and delay >= left:
+            raise DeadlineExceeded("Deadline exceeded while retrying the model call") from error
+        self.__count("retries")
+        return delay
+
+    def __hedge_after(self, key: str) -> float | None:
+        """Return the seconds after which a duplicate attempt is sent, or None."""
+        if self.__hedge_quantile is None:
+            return None
+        return self.__latencies.quantile(key, self.__hedge_quantile, self.__hedge_min_samples)
+
+    def __timed(self, key: str, attempt: Callable[[float | None], T], timeout: float | None) -> T:
+        """Make an attempt and record its latency when it succeeds."""
+        started: float = time.perf_counter()
+        result: T = attempt(timeout)
+        self.__latencies.observe(key, time.perf_counter() - started)
+        return result
+
+    async def __timed_async(self, key: str, attempt: Callable[[float | None], Awaitable[T]], timeout: float | None) -> T:
+        """Asynchronously make an attempt and record its latency when it succeeds."""
+        started: float = time.perf_counter()
+        result: T = await attempt(timeout)
+        self.__latencies.observe(key, time.perf_counter() - started)
+        return result
+
+    def __attempt(self, key: str, attempt: Callable[[float | None], T], timeout: float | None,
+                  enforces_timeout: bool) -> T:
+        """Make one attempt, hedged when it outlasts the threshold."""
+        hedge_after: float | None = self.__hedge_after(key)
+        if hedge_after is None and (enforces_timeout or timeout is None):
+            return self.__timed(key, attempt, timeout)
+        # Every attempt starts at once on its own thread, so no time is spent waiting for a worker.
+        expires: float | None = None if timeout is None else time.monotonic() + timeout
+        attempts: list[tuple[concurrent.futures.Future, Cancellation]] = [self.__start(key, attempt, timeout)]
+        try:
+            if hedge_after is not None and (timeout is None or hedge_after < timeout):
+                done, _ = concurrent.futures.wait([attempts[0][0]], timeout=hedge_after)
+                if not done:
+                    self.__count("hedges")
+                    attempts.append(self.__start(key, attempt, None if expires is None else expires - time.monotonic()))
+            winner: int
+            result: T
+            winner, result = self.__first_result([future for future, _ in attempts], expires)
+        finally:
+            # Losing and timed-out attempts stop instead of holding their slot and server request.
+            for future, cancellation in attempts:
+                if not future.done():
+                    cancellation.cancel()
+        if winner > 0:
+            self.__count("hedge_wins")
+        return result
+
+    def __start(self, key: str, attempt: Callable[[float | None], T],
+                timeout: float | None) -> tuple[concurrent.futures.Future, Cancellation]:
+        """Start an attempt on a thread of its own with a copy of the caller's context and a Cancellation."""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        cancellation: Cancellation = Cancellation()
+        caller: Cancellation | None = current_cancellation()
+        if caller is not None:
+            # A caller that abandons the whole call abandons this attempt too.
+            caller.add_callback(cancellation.cancel)
+        context: contextvars.Context = contextvars.copy_context()
+        context.run(_cancellation.set, cancellation)
+
+        def run() -> None:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(context.run(self.__timed, key, attempt, timeout))
+            except BaseException as error:
+                future.set_exception(error)
+
+        threading.Thread(target=run, name="model-call", daemon=True).start()
+        return future, cancellation
+
+    @staticmethod
+    def __first_result(futures: list[concurrent.futures.Future], expires: float | None) -> tuple[int, Any]:
+        """Wait for the first successful attempt; raise the first error when all fail, TimeoutError when time runs out."""
+        pending: set[concurrent.futures.Future] = set(futures)
+        first_error: BaseException | None = None
+        while pending:
+            wait_for: float | None = None if expires is None else max(expires - time.monotonic(), 0.0)
+            done, pending = concurrent.futures.wait(pending, timeout=wait_for, return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError("Model call timed out")
+            for future in done:
+                error: BaseException | None = future.exception()
+                if error is None:
+                    return futures.index(future), future.result()
+                first_error = first_error or error
+        raise first_error
+
+    async def __attempt_async(self, key: str, attempt: Callable[[float | None], Awaitable[T]], timeout: float | None) -> T:
+        """Asynchronously make one attempt, hedged when it outlasts the threshold."""
+        hedge_after: float | None = self.__hedge_after(key)
+        if hedge_after is None:
+            if timeout is None:
+                return await self.__timed_async(key, attempt, timeout)
+            return await asyncio.wait_for(self.__timed_async(key, attempt, timeout), timeout)
+        started: float = time.monotonic()
+        expires: float | None = None if timeout is None else started + timeout
+        tasks: list[asyncio.Task] = [asyncio.ensure_future(self.__timed_async(key, attempt, timeout))]
+        try:
+            if timeout is None or hedge_after < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+                if not done:
+                    self.__count("hedges")
+                    tasks.append(asyncio.ensure_future(
+                        self.__timed_async(key, attempt, None if expires is None else expires - time.monotonic())
+                    ))
+            pending: set[asyncio.Task] = set(tasks)
+            first_error: BaseException | None = None
+            while pending:
+                wait_for: float | None = None if expires is None else max(expires - time.monotonic(), 0.0)
+                done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError("Model call timed out")
+                for task in done:
+                    error: BaseException | None = task.exception()
+                    if error is None:
+                        if tasks.index(task) > 0:
+                            self.__count("hedge_wins")
+                        return task.result()
+                    first_error = first_error or error
+            raise first_error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+_policies: dict[tuple[Any, ...], CallPolicy] = {}
+_policies_lock: threading.Lock = threading.Lock()
+
+def shared_policy(backend: str, is_retryable: Callable[[BaseException], bool], call_timeout: float = 0,
+                  max_attempts: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                  hedge_quantile: float | None = None, hedge_min_samples: int = 20,
+                  retry_timeouts: bool = True) -> CallPolicy:
+    """Return the process-wide CallPolicy of a backend with the given settings, so latencies are shared.
+
+    Parameters:
+        backend: Name of the backend, e.g. "ollama:<host>".
+        is_retryable: Whether an error of the backend is worth another attempt.
+        call_timeout: Seconds allowed per attempt (0 for no limit).
+        max_attempts: Attempts per call, including the first.
+        backoff_base: Upper bound of the first pause between attempts, in seconds.
+        backoff_max: Largest upper bound of a pause, in seconds.
+        hedge_quantile: Latency quantile after which a duplicate attempt is sent, or None to disable hedging.
+        hedge_min_samples: Latencies needed before hedging starts.
+        retry_timeouts: Whether an attempt that timed out is retried.
+
+    Returns:
+        CallPolicy: Policy shared by every caller using the same settings.
+    """
+    key: tuple[Any, ...] = (backend, call_timeout, max_attempts, backoff_base, backoff_max, hedge_quantile, hedge_min_samples,
+                            retry_timeouts)
+    with _policies_lock:
+        if key not in _policies:
+            _policies[key] = CallPolicy(call_timeout, max_attempts, backoff_base, backoff_max, is_retryable,
+                                        hedge_quantile, hedge_min_samples, retry_timeouts)
+        return _policies[key]
@@ -0,0 +1,407 @@
+"""CallScheduler: client-side rate limits, concurrency caps and priority classes for model calls."""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from enum import IntEnum
+from typing import Any, AsyncIterator, Iterator
+from ollama_ai_resilience import Cancellation, DeadlineExceeded, current_cancellation, remaining
+
+class Priority(IntEnum):
+    """Priority class of a model call; lower values are served first."""
+    INTERACTIVE = 0
+    BULK = 1
+    BACKGROUND = 2
+
+_priority: contextvars.ContextVar[Priority] = contextvars.ContextVar("call_priority", default=Priority.INTERACTIVE)
+
+@contextlib.contextmanager
+def call_priority(level: Priority) -> Iterator[None]:
+    """Schedule the model calls made inside the block with a priority class.
+
+    Calls outside any block are interactive. Tasks and threads started with a
+    copy of the context, like asyncio.gather, inherit the priority.
+
+    Parameters:
+        level: Priority class.
+    """
+    token: contextvars.Token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> Priority:
+    """Return the priority class of calls made in the current context."""
+    return _priority.get()
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at a per-minute rate.
+
+    A request larger than the bucket is let through when the bucket is full,
+    leaving it in debt, so oversized calls are slowed down rather than blocked
+    forever.
+
+    Parameters:
+        per_minute: Refill rate in units per minute.
+        burst_seconds: Seconds of refill the bucket holds when full.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0) -> None:
+        """Create a full bucket.
+
+        Parameters:
+            per_minute: Refill rate in units per minute.
+            burst_seconds: Seconds of refill the bucket holds when full.
+        """
+        self.__rate: float = per_minute / 60.0
+        self.__capacity: float = max(self.__rate * burst_seconds, 1.0)
+        self.__level: float = self.__capacity
+        self.__updated: float = time.monotonic()
+
+    def delay(self, amount: float) -> float:
+        """Return the seconds until `amount` can be taken, 0 when it can be taken now.
+
+        Parameters:
+            amount: Units needed.
+
+        Returns:
+            float: Seconds to wait.
+        """
+        now: float = time.monotonic()
+        self.__level = min(self.__capacity, self.__level + (now - self.__updated) * self.__rate)
+        self.__updated = now
+        needed: float = min(amount, self.__capacity)
+        return 0.0 if self.__level >= needed else (needed - self.__level) / self.__rate
+
+    def take(self, amount: float) -> None:
+        """Remove units from the bucket; a negative amount returns units.
+
+        Parameters:
+            amount: Units used.
+        """
+        self.__level = min(self.__capacity, self.__level - amount)
+
+
+class Ticket:
+    """Admission of one call, returned by CallScheduler.slot."""
+    __slots__ = ("priority", "tokens", "queue_wait")
+
+    def __init__(self, priority: Priority, tokens: int) -> None:
+        self.priority: Priority = priority
+        self.tokens: int = tokens
+        self.queue_wait: float = 0.0
+
+
+class _Waiter:
+    """Queued call waiting for admission."""
+    __slots__ = ("ticket", "enqueued", "event", "loop", "future", "granted", "cancelled")
+
+    def __init__(self, ticket: Ticket, loop: asyncio.AbstractEventLoop | None = None) -> None:
+        self.ticket: Ticket = ticket
+        self.enqueued: float = time.monotonic()
+        self.event: threading.Event | None = None if loop else threading.Event()
+        self.loop: asyncio.AbstractEventLoop | None = loop
+        self.future: asyncio.Future | None = loop.create_future() if loop else None
+        self.granted: bool = False
+        self.cancelled: bool = False
+
+    def grant(self) -> None:
+        """Wake the waiting caller; safe from any thread."""
+        self.granted = True
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future) -> None:
+    """Resolve an admission future unless its waiter was cancelled."""
+    if not future.done():
+        future.set_result(None)
+
+
+class CallScheduler:
+    """Admit model calls of one backend in priority order within rate and concurrency limits.
+
+    Calls wait in a priority queue; the first call of the highest class is
+    admitted as soon as a concurrency slot is free and both token buckets -
+    requests per minute and estimated tokens per minute - allow it. Bulk and
+    background calls may only use the slots not reserved for interactive
+    calls, so a batch job saturating the backend never makes an interactive
+    call wait for a running one. Token estimates are corrected with the usage
+    reported after the call. A call that can be admitted at once is not
+    delayed.
+
+    Parameters:
+        max_concurrency: Maximal number of calls in flight (0 for no limit).
+        requests_per_minute: Request rate limit (0 for no limit).
+        tokens_per_minute: Token rate limit (0 for no limit).
+        interactive_reserve: Slots only interactive calls may use.
+    """
+
+    @property
+    def active(self) -> int:
+        """Number of calls in flight."""
+        return self.__active
+
+    @property
+    def queue_depth(self) -> dict[Priority, int]:
+        """Number of calls waiting, per priority class."""
+        with self.__lock:
+            return dict(self.__queued)
+
+    def __init__(self, max_concurrency: int = 0, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 interactive_reserve: int = 0) -> None:
+        """Create a scheduler with no calls in flight.
+
+        Parameters:
+            max_concurrency: Maximal number of calls in flight (0 for no limit).
+            requests_per_minute: Request rate limit (0 for no limit).
+            tokens_per_minute: Token rate limit (0 for no limit).
+            interactive_reserve: Slots only interactive calls may use.
+        """
+        self.__max_concurrency: int = max_concurrency
+        self.__shared_concurrency: int = max(max_concurrency - interactive_reserve, 1) if max_concurrency > 0 else 0
+        self.__requests: TokenBucket | None = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.__tokens: TokenBucket | None = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.__lock: threading.Lock = threading.Lock()
+        self.__queue: list[tuple[int, int, _Waiter]] = []
+        self.__sequence: Iterator[int] = itertools.count()
+        self.__queued: dict[Priority, int] = {level: 0 for level in Priority}
+        self.__active: int = 0
+        self.__timer: threading.Timer | None = None
+        self.__timer_deadline: float = 0.0
+        self.__admitted: dict[Priority, int] = {level: 0 for level in Priority}
+        self.__wait_seconds: dict[Priority, float] = {level: 0.0 for level in Priority}
+        self.__max_queue_depth: int = 0
+
+    @contextlib.contextmanager
+    def slot(self, tokens: int = 0, priority: Priority | None = None) -> Iterator[Ticket]:
+        """Wait for admission and hold a slot for the duration of the block.
+
+        The wait ends with DeadlineExceeded when the current deadline passes, and
+        with TimeoutError when the attempt waiting is cancelled by its CallPolicy.
+
+        Parameters:
+            tokens: Estimated tokens of the call.
+            priority: Priority class; the context's priority when None.
+
+        Yields:
+            Ticket: Admission with the time spent queued; set `tokens` to the actual usage to correct the estimate.
+        """
+        ticket: Ticket = Ticket(current_priority() if priority is None else priority, tokens)
+        if not self.__try_admit(ticket):
+            waiter: _Waiter = _Waiter(ticket)
+            cancellation: Cancellation | None = current_cancellation()
+            self.__enqueue(waiter)
+            if cancellation is not None:
+                cancellation.add_callback(waiter.event.set)
+            left: float | None = remaining()
+            waiter.event.wait(None if left is None else max(left, 0.0))
+            with self.__lock:
+                waiter.cancelled = not waiter.granted
+            if waiter.cancelled:
+                if cancellation is not None and cancellation.cancelled:
+                    raise TimeoutError("Model call abandoned while waiting for admission")
+                raise DeadlineExceeded("Deadline exceeded while waiting for admission")
+        estimated: int = ticket.tokens
+        try:
+            yield ticket
+        finally:
+            self.__release(ticket, estimated)
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self, tokens: int = 0, priority: Priority | None = None) -> AsyncIterator[Ticket]:
+        """Asynchronously wait for admission and hold a slot for the duration of the block.
+
+        Parameters:
+            tokens: Estimated tokens of the call.
+            priority: Priority class; the context's priority when None.
+
+        Yields:
+            Ticket: Admission with the time spent queued; set `tokens` to the actual usage to correct the estimate.
+        """
+        ticket: Ticket = Ticket(current_priority() if priority is None else priority, tokens)
+        if not self.__try_admit(ticket):
+            waiter: _Waiter = _Waiter(ticket, asyncio.get_running_loop())
+            self.__enqueue(waiter)
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                with self.__lock:
+                    waiter.cancelled = not waiter.granted
+                if waiter.granted:
+                    self.__release(ticket, ticket.tokens)
+                raise
+        estimated: int = ticket.tokens
+        try:
+            yield ticket
+        finally:
+            self.__release(ticket, estimated)
+
+    def stats(self) -> dict[str, Any]:
+        """Return queue depth, concurrency and wait-time figures.
+
+        Returns:
+            dict: JSON-serializable statistics, with per-priority entries keyed by class name.
+        """
+        with self.__lock:
+            return {
+                "active": self.__active,
+                "max_concurrency": self.__max_concurrency,
+                "max_queue_depth": self.__max_queue_depth,
+                "queued": {level.name.lower(): count for level, count in self.__queued.items()},
+                "admitted": {level.name.lower(): count for level, count in self.__admitted.items()},
+                "wait_seconds": {level.name.lower(): total for level, total in self.__wait_seconds.items()}
+            }
+
+    def __limit(self, priority: Priority) -> int:
+        """Return the concurrency available to a priority class (0 for no limit)."""
+        return self.__max_concurrency if priority == Priority.INTERACTIVE else self.__shared_concurrency
+
+    def __try_admit(self, ticket: Ticket) -> bool:
+        """Admit a call at once when nothing is queued ahead of it and the limits allow it."""
+        with self.__lock:
+            if any(priority <= ticket.priority for priority, _, _ in self.__queue[:1]):
+                return False
+            return self.__admit_now(ticket)
+
+    def __admit_now(self, ticket: Ticket) -> bool:
+        """Take a slot and tokens for a call if the limits allow it; the caller holds the lock."""
+        limit: int = self.__limit(ticket.priority)
+        if limit and self.__active >= limit:
+            return False
+        delay: float = max(self.__requests.delay(1) if self.__requests else 0.0,
+                           self.__tokens.delay(ticket.tokens) if self.__tokens else 0.0)
+        if delay > 0:
+            self.__retry_in(delay)
+            return False
+        if self.__requests:
+            self.__requests.take(1)
+        if self.__tokens:
+            self.__tokens.take(ticket.tokens)
+        self.__active += 1
+        self.__admitted[ticket.priority] += 1
+        return True
+
+    def __enqueue(self, waiter: _Waiter) -> None:
+        """Queue a call and admit whatever the limits allow."""
+        with self.__lock:
+            heapq.heappush(self.__queue, (waiter.ticket.priority, next(self.__sequence), waiter))
+            self.__queued[waiter.ticket.priority] += 1
+            self.__max_queue_depth = max(self.__max_queue_depth, len(self.__queue))
+            self.__dispatch()
+
+    def __release(self, ticket: Ticket, estimated: int) -> None:
+        """Free a slot, correct the token estimate and admit the next calls."""
+        with self.__lock:
+            self.__active -= 1
+            if self.__tokens and ticket.tokens != estimated:
+                self.__tokens.take(ticket.tokens - estimated)
+            self.__dispatch()
+
+    def __dispatch(self) -> None:
+        """Admit queued calls in priority order while the limits allow; the caller holds the lock."""
+        while self.__queue:
+            waiter: _Waiter = self.__queue[0][2]
+            if waiter.cancelled:
+                heapq.heappop(self.__queue)
+                self.__queued[waiter.ticket.priority] -= 1
+                continue
+            if not self.__admit_now(waiter.ticket):
+                return
+            heapq.heappop(self.__queue)
+            self.__queued[waiter.ticket.priority] -= 1
+            waiter.ticket.queue_wait = time.monotonic() - waiter.enqueued
+            self.__wait_seconds[waiter.ticket.priority] += waiter.ticket.queue_wait
+            waiter.grant()
+
+    def __retry_in(self, delay: float) -> None:
+        """Dispatch again once the token buckets have refilled; the caller holds the lock."""
+        deadline: float = time.monotonic() + delay
+        if self.__timer is not None and self.__timer_deadline <= deadline:
+            return
+        if self.__timer is not None:
+            self.__timer.cancel()
+        self.__timer_deadline = deadline
+        self.__timer = threading.Timer(delay, self.__on_timer)
+        self.__timer.daemon = True
+        self.__timer.start()
+
+    def __on_timer(self) -> None:
+        """Dispatch after a rate-limit delay."""
+        with self.__lock:
+            self.__timer = None
+            self.__dispatch()
+
+
+_schedulers: dict[tuple[str, int, float, float, int], CallScheduler] = {}
+_schedulers_lock: threading.Lock = threading.Lock()
+
+def shared_scheduler(backend: str, max_concurrency: int = 0, requests_per_minute: float = 0,
+                     tokens_per_minute: float = 0, interactive_reserve: int = 0) -> CallScheduler:
+    """Return the process-wide CallScheduler of a backend with the given limits.
+
+    Parameters:
+        backend: Name of the backend, e.g. "ollama:<host>".
+        max_concurrency: Maximal number of calls in flight (0 for no limit).
+        requests_per_minute: Request rate limit (0 for no limit).
+        tokens_per_minute: Token rate limit (0 for no limit).
+        interactive_reserve: Slots only interactive calls may use.
+
+    Returns:
+        CallScheduler: Scheduler shared by every caller using the same settings.
+    """
+    key: tuple[str, int, float, float, int] = (backend, max_concurrency, requests_per_minute,
+                                               tokens_per_minute, interactive_reserve)
+    with _schedulers_lock:
+        if key not in _schedulers:
+            _schedulers[key] = CallScheduler(max_concurrency, requests_per_minute, tokens_per_minute, interactive_reserve)
+        return _schedulers[key]
+
+def scheduler_stats() -> dict[str, dict[str, Any]]:
+    """Return the statistics of every shared scheduler, keyed by backend.
+
+    Returns:
+        dict: Backend -> CallScheduler.stats().
+    """
+    with _schedulers_lock:
+        schedulers: list[tuple[str, CallScheduler]] = [(key[0], scheduler) for key, scheduler in _schedulers.items()]
+    return {backend: scheduler.stats() for backend, scheduler in schedulers}
+
+def schedulers_to_prometheus() -> str:
+    """Render the queue depth, in-flight calls and wait times of the shared schedulers as Prometheus text.
+
+    Per-call wait times are also reported as CallRecord.queue_wait.
+
+    Returns:
+        str: Exposition text.
+    """
+    lines: list[str] = [
+        "# HELP tutor_scheduler_queue_depth Model calls waiting for admission.",
+        "# TYPE tutor_scheduler_queue_depth gauge"
+    ]
+    stats: dict[str, dict[str, Any]] = scheduler_stats()
+    for backend, backend_stats in sorted(stats.items()):
+        for level, count in backend_stats["queued"].items():
+            lines.append(f'tutor_scheduler_queue_depth{{backend="{backend}",priority="{level}"}} {count}')
+    lines.append("# HELP tutor_scheduler_active_calls Model calls in flight.")
+    lines.append("# TYPE tutor_scheduler_active_calls gauge")
+    for backend, backend_stats in sorted(stats.items()):
+        lines.append(f'tutor_scheduler_active_calls{{backend="{backend}"}} {backend_stats["active"]}')
+    lines.append("# HELP tutor_scheduler_wait_seconds_total Time model calls spent queued, in seconds.")
+    lines.append("# TYPE tutor_scheduler_wait_seconds_total counter")
+    for backend, backend_stats in sorted(stats.items()):
+        for level, total in backend_stats["wait_seconds"].items():
+            lines.append(f'tutor_scheduler_wait_seconds_total{{backend="{backend}",priority="{level}"}} {total}')
+    lines.append("# HELP tutor_scheduler_admitted_total Model calls admitted.")
+    lines.append("# TYPE tutor_scheduler_admitted_total counter")
+    for backend, backend_stats in sorted(stats.items()):
+        for level, count in backend_stats["admitted"].items():
+            lines.append(f'tutor_scheduler_admitted_total{{backend="{backend}",priority="{level}"}} {count}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,231 @@
+"""SessionPool: keep many tutoring sessions in memory, sharing their helpers and evicting idle ones."""
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from ollama_ai_config import OllamaAIConfig
+from ai_self_reference import SelfReferencingAI
+from ollama_ai_semantic_cache import SemanticCache
+from ollama_ai_session_store import shared_session_store
+from ai_tutor import KnowledgeGuideAI
+from typing import Any, Iterator
+
+class _PooledSession:
+    """A tutor in the pool with its lock and last use; the tutor is None until the session is built."""
+    __slots__ = ("tutor", "ready", "lock", "last_used", "users", "closing", "forget")
+
+    def __init__(self) -> None:
+        self.tutor: KnowledgeGuideAI | None = None
+        self.ready: threading.Event = threading.Event()
+        self.lock: threading.Lock = threading.Lock()
+        self.last_used: float = time.monotonic()
+        self.users: int = 0
+        self.closing: bool = False
+        self.forget: bool = False
+
+
+class SessionPool:
+    """Pool of KnowledgeGuideAI sessions keyed by session ID.
+
+    A session is created on its first request and kept until it has been
+    unused for SESSION_IDLE_TIMEOUT seconds, or until the pool holds more than
+    SESSION_POOL_SIZE sessions and it is the least recently used one. Sessions
+    in use are never evicted. With a SESSION_STORE an evicted session loses
+    nothing: its next request resumes it from the store; without one it starts
+    over.
+
+    Requests of one session run one at a time, requests of different sessions
+    concurrently. Every session shares the configuration, clients, caches and,
+    when helper calls are stateless (SELF_REFERENCE_HISTORY_WINDOW=0), one
+    SelfReferencingAI, so a session costs little more than its history, which
+    SESSION_MAX_CHARS caps.
+
+    Parameters:
+        config: Configuration shared by every session.
+        semantic_cache: Optional cache shared by every session.
+    """
+
+    @property
+    def config(self) -> OllamaAIConfig:
+        """Configuration shared by every session."""
+        return self.__config
+
+    def __init__(self, config: OllamaAIConfig, semantic_cache: SemanticCache | None = None) -> None:
+        """Create an empty pool.
+
+        Parameters:
+            config: Configuration shared by every session.
+            semantic_cache: Optional cache shared by every session.
+        """
+        self.__config: OllamaAIConfig = config
+        self.__semantic_cache: SemanticCache | None = semantic_cache
+        self.__self_reference: SelfReferencingAI | None = None
+        if config.self_reference_history_window <= 0:
+            self.__self_reference = SelfReferencingAI(config)
+        self.__max_sessions: int = max(config.session_pool_size, 1)
+        self.__idle_timeout: float = config.session_idle_timeout
+        self.__sessions: OrderedDict[str, _PooledSession] = OrderedDict()
+        self.__lock: threading.Lock = threading.Lock()
+        self.__counters: dict[str, int] = {"created": 0, "reused": 0, "evicted_idle": 0, "evicted_full": 0, "closed": 0}
+
+    @contextmanager
+    def session(self, session_id: str) -> Iterator[KnowledgeGuideAI]:
+        """Use the tutor of a session, creating or resuming it if it is not in the pool.
+
+        Parameters:
+            session_id: Identifier of the session.
+
+        Yields:
+            KnowledgeGuideAI: Tutor of the session, used by no other caller until the block exits.
+        """
+        entry: _PooledSession = self.__check_out(session_id)
+        try:
+            with entry.lock:
+                yield entry.tutor
+        finally:
+            with self.__lock:
+                entry.users -= 1
+                entry.last_used = time.monotonic()
+                released: bool = entry.closing and not entry.users
+                if self.__sessions.get(session_id) is entry:
+                    if released:
+                        del self.__sessions[session_id]
+                    else:
+                        self.__sessions.move_to_end(session_id)
+            if released and entry.forget:
+                self.__forget(session_id)
+
+    def close(self, session_id: str, forget: bool = False) -> bool:
+        """Remove a session from the pool.
+
+        A session in use is only marked closed and removed when its last request
+        finishes; requests arriving meanwhile still join it rather than starting a
+        second tutor for the same ID, and are forgotten with it.
+
+        Parameters:
+            session_id: Identifier of the session.
+            forget: Also delete the session from the SESSION_STORE.
+
+        Returns:
+            bool: Whether the session was in the pool.
+        """
+        with self.__lock:
+            entry: _PooledSession | None = self.__sessions.get(session_id)
+            busy: bool = entry is not None and entry.users > 0
+            if entry is not None:
+                if not entry.closing:
+                    self.__counters["closed"] += 1
+                entry.closing = True
+                entry.forget = entry.forget or forget
+                if not busy:
+                    del self.__sessions[session_id]
+        if forget and not busy:
+            self.__forget(session_id)
+        return entry is not None
+
+    def evict_idle(self) -> int:
+        """Remove the sessions unused for longer than SESSION_IDLE_TIMEOUT.
+
+        Returns:
+            int: Number of sessions removed.
+        """
+        with self.__lock:
+            return self.__evict_idle(time.monotonic())
+
+    def stats(self) -> dict[str, Any]:
+        """Return the size, capacity and counters of the pool.
+
+        Returns:
+            dict: JSON-serializable statistics.
+        """
+        with self.__lock:
+            entries: list[_PooledSession] = list(self.__sessions.values())
+            counters: dict[str, int] = dict(self.__counters)
+        return {
+            "sessions": len(entries),
+            "busy": sum(1 for entry in entries if entry.users),
+            "max_sessions": self.__max_sessions,
+            "idle_timeout": self.__idle_timeout,
+            "persistent": self.__config.session_store is not None,
+            "shared_self_reference": self.__self_reference is not None,
+            "history_chars": sum(entry.tutor._history_manager.chat_chars for entry in entries if entry.tutor is not None),
+            **counters
+        }
+
+    def __forget(self, session_id: str) -> None:
+        """Delete a session from the SESSION_STORE, if there is one."""
+        if self.__config.session_store is not None:
+            shared_session_store(self.__config.session_store, self.__config.session_store_path).delete(session_id)
+
+    def __check_out(self, session_id: str) -> _PooledSession:
+        """Return the pooled session of an ID, marked in use, creating it and evicting others as needed.
+
+        A new session is reserved under the pool lock but built outside it, so loading it from the
+        store holds up only the requests of that session; they wait until it is ready.
+        """
+        while True:
+            now: float = time.monotonic()
+            with self.__lock:
+                self.__evict_idle(now)
+                entry: _PooledSession | None = self.__sessions.get(session_id)
+                build: bool = entry is None
+                if entry is None:
+                    entry = _PooledSession()
+                    self.__sessions[session_id] = entry
+                    self.__counters["created"] += 1
+                    self.__evict_least_recently_used()
+                else:
+                    entry.last_used = now
+                    self.__sessions.move_to_end(session_id)
+                    self.__counters["reused"] += 1
+                entry.users += 1
+            if build:
+                self.__build(session_id, entry)
+                return entry
+            entry.ready.wait()
+            if entry.tutor is not None:
+                return entry
+            # The session failed to build and was removed; try again with a new one.
+
+    def __build(self, session_id: str, entry: _PooledSession) -> None:
+        """Create the tutor of a reserved session, removing the reservation if that fails."""
+        try:
+            entry.tutor = KnowledgeGuideAI(self.__config, self.__semantic_cache, session_id, self.__self_reference)
+        except BaseException:
+            with self.__lock:
+                if self.__sessions.get(session_id) is entry:
+                    del self.__sessions[session_id]
+                self.__counters["created"] -= 1
+            raise
+        finally:
+            entry.ready.set()
+
+    def __evict_idle(self, now: float) -> int:
+        """Remove the idle sessions at the least recently used end; the caller holds the lock."""
+        if self.__idle_timeout <= 0:
+            return 0
+        idle: list[str] = []
+        for session_id, entry in self.__sessions.items():
+            if entry.last_used > now - self.__idle_timeout:
+                break
+            if not entry.users:
+                idle.append(session_id)
+        for session_id in idle:
+            del self.__sessions[session_id]
+        self.__counters["evicted_idle"] += len(idle)
+        return len(idle)
+
+    def __evict_least_recently_used(self) -> None:
+        """Remove the least recently used unused sessions while the pool is over capacity; the caller holds the lock."""
+        excess: int = len(self.__sessions) - self.__max_sessions
+        if excess <= 0:
+            return
+        unused: list[str] = []
+        for session_id, entry in self.__sessions.items():
+            if not entry.users:
+                unused.append(session_id)
+                if len(unused) == excess:
+                    break
+        for session_id in unused:
+            del self.__sessions[session_id]
+        self.__counters["evicted_full"] += len(unused)
@@ -0,0 +1,437 @@
+"""SessionStore: persist tutoring sessions in SQLite or append-only log files, loading them lazily."""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Iterator, NamedTuple, Sequence
+
+# Turns are (role, content) pairs, the oldest first.
+StoredTurn = tuple[str, str]
+
+class SessionRecord(NamedTuple):
+    """Header of a stored session: everything but the turns themselves."""
+    session_id: str
+    turn_count: int = 0
+    summary: str | None = None
+    summarized_turns: int = 0
+    area_of_knowledge: str | None = None
+    tutor_role: str | None = None
+    response_id: str | None = None
+
+
+class SessionStore(ABC):
+    """Durable storage of tutoring sessions.
+
+    A session is a header (SessionRecord) and its turns, numbered from 0.
+    Resuming a session reads the header and the most recent turns only, so
+    its cost depends on the window asked for and not on the length of the
+    session; older turns stay on disk until `turns` is iterated.
+    """
+
+    @abstractmethod
+    def load(self, session_id: str) -> SessionRecord | None:
+        """Return the header of a session, or None when it was never saved.
+
+        Parameters:
+            session_id: Identifier of the session.
+
+        Returns:
+            SessionRecord | None: Stored header.
+        """
+
+    @abstractmethod
+    def recent_turns(self, session_id: str, count: int, start: int = 0) -> list[StoredTurn]:
+        """Return the last turns of a session.
+
+        Parameters:
+            session_id: Identifier of the session.
+            count: Maximal number of turns to return.
+            start: Number of the oldest turn that may be returned, e.g. the first one not yet summarized.
+
+        Returns:
+            list[StoredTurn]: Turns, the oldest first.
+        """
+
+    @abstractmethod
+    def turns(self, session_id: str) -> Iterator[StoredTurn]:
+        """Iterate over every turn of a session, the oldest first, reading them as they are consumed.
+
+        Parameters:
+            session_id: Identifier of the session.
+
+        Yields:
+            StoredTurn: Role and content of a turn.
+        """
+
+    @abstractmethod
+    def save(self, record: SessionRecord, new_turns: Sequence[StoredTurn] = ()) -> None:
+        """Store a session header together with the turns added since the last save.
+
+        Parameters:
+            record: New header; its turn_count includes the new turns.
+            new_turns: Turns numbered record.turn_count - len(new_turns) onwards.
+        """
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Remove a session and its turns.
+
+        Parameters:
+            session_id: Identifier of the session.
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release the files held by the store."""
+
+
+class SQLiteSessionStore(SessionStore):
+    """SessionStore in one SQLite database.
+
+    Headers are rows keyed by session and turns are rows keyed by session and
+    turn number, so resuming is a primary-key lookup plus an index range scan
+    of the window. The database runs in WAL mode, and each save is one
+    transaction.
+
+    Parameters:
+        path: Database file.
+    """
+
+    def __init__(self, path: str) -> None:
+        """Open or create the database.
+
+        Parameters:
+            path: Database file.
+        """
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.__lock: threading.Lock = threading.Lock()
+        self.__connection: sqlite3.Connection = sqlite3.connect(path, check_same_thread=False)
+        self.__connection.execute("PRAGMA journal_mode=WAL")
+        self.__connection.execute("PRAGMA synchronous=NORMAL")
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, turn_count INTEGER NOT NULL,"
+            " summary TEXT, summarized_turns INTEGER NOT NULL, area_of_knowledge TEXT, tutor_role TEXT, response_id TEXT)"
+        )
+        self.__connection.execute(
+            "CREATE TABLE IF NOT EXISTS turns (session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL,"
+            " content TEXT NOT NULL, PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+        self.__connection.commit()
+
+    def load(self, session_id: str) -> SessionRecord | None:
+        """Return the header of a session, or None when it was never saved.
+
+        Parameters:
+            session_id: Identifier of the session.
+
+        Returns:
+            SessionRecord | None: Stored header.
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT session_id, turn_count, summary, summarized_turns, area_of_knowledge, tutor_role, response_id"
+                " FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return None if row is None else SessionRecord(*row)
+
+    def recent_turns(self, session_id: str, count: int, start: int = 0) -> list[StoredTurn]:
+        """Return the last turns of a session.
+
+        Parameters:
+            session_id: Identifier of the session.
+            count: Maximal number of turns to return.
+            start: Number of the oldest turn that may be returned.
+
+        Returns:
+            list[StoredTurn]: Turns, the oldest first.
+        """
+        if count <= 0:
+            return []
+        with self.__lock:
+            rows: list[tuple[str, str]] = self.__connection.execute(
+                "SELECT role, content FROM turns WHERE session_id = ? AND seq >= ? ORDER BY seq DESC LIMIT ?",
+                (session_id, start, count)
+            ).fetchall()
+        rows.reverse()
+        return rows
+
+    def turns(self, session_id: str) -> Iterator[StoredTurn]:
+        """Iterate over every turn of a session, the oldest first, reading them in pages.
+
+        Parameters:
+            session_id: Identifier of the session.
+
+        Yields:
+            StoredTurn: Role and content of a turn.
+        """
+        seq: int = 0
+        while True:
+            with self.__lock:
+                rows: list[tuple[int, str, str]] = self.__connection.execute(
+                    "SELECT seq, role, content FROM turns WHERE session_id = ? AND seq >= ? ORDER BY seq LIMIT 256",
+                    (session_id, seq)
+                ).fetchall()
+            if not rows:
+                return
+            for row_seq, role, content in rows:
+                yield role, content
+            seq = rows[-1][0] + 1
+
+    def save(self, record: SessionRecord, new_turns: Sequence[StoredTurn] = ()) -> None:
+        """Store a session header together with the turns added since the last save.
+
+        Parameters:
+            record: New header; its turn_count includes the new turns.
+            new_turns: Turns numbered record.turn_count - len(new_turns) onwards.
+        """
+        first: int = record.turn_count - len(new_turns)
+        with self.__lock, self.__connection:
+            self.__connection.executemany(
+                "INSERT OR REPLACE INTO turns (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(record.session_id, first + index, role, content) for index, (role, content) in enumerate(new_turns)]
+            )
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, turn_count, summary, summarized_turns, area_of_knowledge,"
+                " tutor_role, response_id) VALUES (?, ?, ?, ?, ?, ?, ?)", tuple(record)
+            )
+
+    def delete(self, session_id: str) -> None:
+        """Remove a session and its turns.
+
+        Parameters:
+            session_id: Identifier of the session.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            self.__connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def close(self) -> None:
+        """Close the database."""
+        with self.__lock:
+            self.__connection.close()
+
+
+class LogSessionStore(SessionStore):
+    """SessionStore of append-only log files, one per session.
+
+    Every save appends the new turns and then a commit line with the new
+    turn count as JSON lines, in one write, and nothing is ever rewritten.
+    The full header, with the summary, is appended instead of the commit
+    line only when something besides the turn count changed. Resuming reads
+    the file backwards from its end: the last commit or header holds the
+    turn count, the last header the rest, and the turns before them are the
+    most recent ones, so only the window is read however long the log is.
+    Turns carry their number, so turns of a save cut short by a crash, which
+    have nothing committing them, are ignored.
+
+    Parameters:
+        directory: Directory holding the log files; created if missing.
+    """
+
+    # Size of the blocks read from the end of a log.
+    _BLOCK_SIZE: int = 8192
+    # Sessions whose last written header is remembered; a session not among them writes its full header on its next save.
+    _HEADER_CACHE_SIZE: int = 4096
+
+    def __init__(self, directory: str) -> None:
+        """Create the directory if needed.
+
+        Parameters:
+            directory: Directory holding the log files.
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.__directory: str = directory
+        self.__lock: threading.Lock = threading.Lock()
+        self.__headers: OrderedDict[str, SessionRecord] = OrderedDict()
+
+    def load(self, session_id: str) -> SessionRecord | None:
+        """Return the header of a session from the end of its log, or None when it has no log.
+
+        Parameters:
+            session_id: Identifier of the session.
+
+        Returns:
+            SessionRecord | None: Stored header.
+        """
+        turn_count: int | None = None
+        for entry in self.__entries_backwards(session_id):
+            if turn_count is None:
+                turn_count = self.__committed(entry)
+            if "header" in entry:
+                return SessionRecord(**entry["header"])._replace(turn_count=turn_count)
+        return None
+
+    def recent_turns(self, session_id: str, count: int, start: int = 0) -> list[StoredTurn]:
+        """Return the last turns of a session, reading its log backwards.
+
+        Parameters:
+            session_id: Identifier of the session.
+            count: Maximal number of turns to return.
+            start: Number of the oldest turn that may be returned.
+
+        Returns:
+            list[StoredTurn]: Turns, the oldest first.
+        """
+        if count <= 0:
+            return []
+        turns: list[StoredTurn] = []
+        expected: int | None = None
+        for entry in self.__entries_backwards(session_id):
+            committed: int | None = self.__committed(entry)
+            if committed is not None:
+                if expected is None:
+                    expected = committed - 1
+            elif expected is not None and entry["seq"] == expected:
+                turns.append((entry["role"], entry["content"]))
+                expected -= 1
+            if expected is not None and (len(turns) >= count or expected < start):
+                break
+        turns.reverse()
+        return turns
+
+    def turns(self, session_id: str) -> Iterator[StoredTurn]:
+        """Iterate over every turn of a session, reading its log from the start.
+
+        Parameters:
+            session_id: Identifier of the session.
+
+        Yields:
+            StoredTurn: Role and content of a turn.
+        """
+        path: str = self.__path(session_id)
+        if not os.path.exists(path):
+            return
+        committed: int = 0
+        pending: list[StoredTurn] = []
+        with open(path, "rb") as log:
+            for line in log:
+                entry: dict[str, Any] | None = self.__decode(line)
+                if entry is None:
+                    continue
+                turn_count: int | None = self.__committed(entry)
+                if turn_count is not None:
+                    yield from pending
+                    committed = turn_count
+                    pending = []
+                elif entry["seq"] == committed + len(pending):
+                    pending.append((entry["role"], entry["content"]))
+                elif entry["seq"] == committed:
+                    # The pending turns belong to a save that never wrote its header.
+                    pending = [(entry["role"], entry["content"])]
+
+    def save(self, record: SessionRecord, new_turns: Sequence[StoredTurn] = ()) -> None:
+        """Append the new turns to the session's log, then the header, or only the turn count if nothing else changed.
+
+        Parameters:
+            record: New header; its turn_count includes the new turns.
+            new_turns: Turns added since the last save.
+        """
+        first: int = record.turn_count - len(new_turns)
+        lines: list[str] = [json.dumps({"seq": first + index, "role": role, "content": content})
+                            for index, (role, content) in enumerate(new_turns)]
+        with self.__lock:
+            written: SessionRecord | None = self.__headers.pop(record.session_id, None)
+            if written is not None and written._replace(turn_count=record.turn_count) == record:
+                lines.append(json.dumps({"commit": record.turn_count}))
+            else:
+                lines.append(json.dumps({"header": record._asdict()}))
+            data: bytes = ("\n".join(lines) + "\n").encode("utf-8")
+            with open(self.__path(record.session_id), "a+b") as log:
+                if log.seek(0, os.SEEK_END) > 0:
+                    log.seek(-1, os.SEEK_END)
+                    if log.read(1) != b"\n":
+                        # The last save was cut short by a crash; start on a line of its own.
+                        data = b"\n" + data
+                log.write(data)
+            self.__headers[record.session_id] = record
+            if len(self.__headers) > self._HEADER_CACHE_SIZE:
+                self.__headers.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        """Remove the log of a session.
+
+        Parameters:
+            session_id: Identifier of the session.
+        """
+        with self.__lock:
+            self.__headers.pop(session_id, None)
+            try:
+                os.remove(self.__path(session_id))
+            except FileNotFoundError:
+                pass
+
+    def close(self) -> None:
+        """Logs are opened per write, so there is nothing to release."""
+
+    def __path(self, session_id: str) -> str:
+        """Return the log file of a session; identifiers that are not safe file names are hashed."""
+        name: str = session_id if re.fullmatch(r"[A-Za-z0-9_.-]{1,128}", session_id) and not session_id.startswith(".") \
+            else hashlib.sha256(session_id.encode("utf-8")).hexdigest()
+        return os.path.join(self.__directory, f"{name}.log")
+
+    def __entries_backwards(self, session_id: str) -> Iterator[dict[str, Any]]:
+        """Yield the entries of a session's log from the last one, reading it in blocks from its end."""
+        path: str = self.__path(session_id)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as log:
+            position: int = log.seek(0, os.SEEK_END)
+            remainder: bytes = b""
+            while position > 0:
+                size: int = min(self._BLOCK_SIZE, position)
+                position -= size
+                log.seek(position)
+                lines: list[bytes] = (log.read(size) + remainder).split(b"\n")
+                remainder = lines.pop(0)
+                for line in reversed(lines):
+                    entry: dict[str, Any] | None = self.__decode(line)
+                    if entry is not None:
+                        yield entry
+            entry = self.__decode(remainder)
+            if entry is not None:
+                yield entry
+
+    @staticmethod
+    def __committed(entry: dict[str, Any]) -> int | None:
+        """Return the turn count a header or commit line commits, or None for a turn."""
+        if "header" in entry:
+            return entry["header"]["turn_count"]
+        return entry.get("commit")
+
+    @staticmethod
+    def __decode(line: bytes) -> dict[str, Any] | None:
+        """Parse a log line, or return None for an empty line or one cut short by a crash."""
+        try:
+            return json.loads(line) if line.strip() else None
+        except ValueError:
+            return None
+
+
+_shared_stores: dict[tuple[str, str], SessionStore] = {}
+_shared_stores_lock: threading.Lock = threading.Lock()
+
+def shared_session_store(backend: str, path: str) -> SessionStore:
+    """Return the process-wide SessionStore of a backend and path.
+
+    Parameters:
+        backend: "sqlite" for a database file, or "log" for a directory of append-only logs.
+        path: Database file or log directory.
+
+    Returns:
+        SessionStore: Store shared by every caller using the same settings.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend not in ("sqlite", "log"):
+        raise ValueError(f"Unknown session store backend '{backend}'")
+    key: tuple[str, str] = (backend, path)
+    with _shared_stores_lock:
+        if key not in _shared_stores:
+            _shared_stores[key] = SQLiteSessionStore(path) if backend == "sqlite" else LogSessionStore(path)
+        return _shared_stores[key]
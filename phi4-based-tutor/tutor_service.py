@@ -0,0 +1,153 @@
+"""Tutor service: serve many KnowledgeGuideAI sessions over local HTTP from one SessionPool.
+
+Endpoints:
+    POST /sessions/<id>/explain   {"question": "..."} -> {"session_id": ..., "explanation": ...}
+    DELETE /sessions/<id>         ends the session and deletes it from the SESSION_STORE
+    GET /health                   pool and scheduler statistics
+"""
+import argparse
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+from ollama_ai_config import OllamaAIConfig
+from ollama_ai_scheduler import scheduler_stats
+from ollama_ai_session_pool import SessionPool
+from ai_tutor import KnowledgeGuideAI
+from typing import Any
+
+# Longest session ID accepted in a URL.
+_MAX_SESSION_ID_LENGTH: int = 128
+# Largest request body accepted, in bytes.
+_MAX_BODY_BYTES: int = 64 * 1024
+
+class TutorServer(ThreadingHTTPServer):
+    """HTTP server that answers every request on its own thread from a shared SessionPool.
+
+    Parameters:
+        address: Host and port to listen on.
+        pool: Pool of tutor sessions.
+    """
+    daemon_threads: bool = True
+
+    @property
+    def pool(self) -> SessionPool:
+        """Pool of tutor sessions."""
+        return self.__pool
+
+    @property
+    def uptime(self) -> float:
+        """Seconds since the server was created."""
+        return time.monotonic() - self.__started
+
+    def __init__(self, address: tuple[str, int], pool: SessionPool) -> None:
+        """Bind the server.
+
+        Parameters:
+            address: Host and port to listen on.
+            pool: Pool of tutor sessions.
+        """
+        super().__init__(address, TutorRequestHandler)
+        self.__pool: SessionPool = pool
+        self.__started: float = time.monotonic()
+
+
+class TutorRequestHandler(BaseHTTPRequestHandler):
+    """Route the requests of a TutorServer."""
+    server: TutorServer
+
+    def do_GET(self) -> None:
+        """Answer GET /health."""
+        if self.path.rstrip("/") != "/health":
+            self.__send_json(404, {"error": "Not found"})
+            return
+        self.server.pool.evict_idle()
+        self.__send_json(200, {"status": "ok",
+                               "uptime_seconds": round(self.server.uptime, 3),
+                               "pool": self.server.pool.stats(),
+                               "schedulers": scheduler_stats()})
+
+    def do_POST(self) -> None:
+        """Answer POST /sessions/<id>/explain."""
+        session_id: str | None = self.__session_id("explain")
+        if session_id is None:
+            self.__send_json(404, {"error": "Not found"})
+            return
+        body: dict[str, Any] | None = self.__read_json()
+        question: Any = body.get("question") if body is not None else None
+        if not isinstance(question, str) or not question.strip():
+            self.__send_json(400, {"error": "Expected a JSON object with a non-empty 'question'"})
+            return
+        try:
+            tutor: KnowledgeGuideAI
+            with self.server.pool.session(session_id) as tutor:
+                explanation: str = tutor.explain_this(question)
+        except TimeoutError as error:
+            self.__send_json(504, {"error": f"{type(error).__name__}: {error}"})
+            return
+        except Exception as error:
+            self.__send_json(502, {"error": f"{type(error).__name__}: {error}"})
+            return
+        self.__send_json(200, {"session_id": session_id, "explanation": explanation})
+
+    def do_DELETE(self) -> None:
+        """Answer DELETE /sessions/<id>."""
+        session_id: str | None = self.__session_id(None)
+        if session_id is None:
+            self.__send_json(404, {"error": "Not found"})
+            return
+        self.__send_json(200, {"session_id": session_id, "closed": self.server.pool.close(session_id, forget=True)})
+
+    def log_message(self, format: str, *args: Any) -> None:
+        """Keep the per-request access log off stderr; /health reports the traffic."""
+
+    def __session_id(self, action: str | None) -> str | None:
+        """Return the session ID of a /sessions/<id>[/<action>] path, or None when the path does not match."""
+        parts: list[str] = self.path.split("?", 1)[0].strip("/").split("/")
+        expected: int = 2 if action is None else 3
+        if len(parts) != expected or parts[0] != "sessions" or (action is not None and parts[2] != action):
+            return None
+        session_id: str = unquote(parts[1])
+        return session_id if 0 < len(session_id) <= _MAX_SESSION_ID_LENGTH else None
+
+    def __read_json(self) -> dict[str, Any] | None:
+        """Return the JSON object in the request body, or None when it is missing, too large or invalid."""
+        try:
+            length: int = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            return None
+        if length <= 0 or length > _MAX_BODY_BYTES:
+            return None
+        try:
+            body: Any = json.loads(self.rfile.read(length))
+        except ValueError:
+            return None
+        return body if isinstance(body, dict) else None
+
+    def __send_json(self, status: int, payload: dict[str, Any]) -> None:
+        """Send a JSON response."""
+        data: bytes = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+def main(argv: list[str] | None = None) -> None:
+    """Parse command line arguments and serve until interrupted."""
+    parser: argparse.ArgumentParser = argparse.ArgumentParser(description=__doc__,
+                                                              formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    arguments: argparse.Namespace = parser.parse_args(argv)
+    server: TutorServer = TutorServer((arguments.host, arguments.port), SessionPool(OllamaAIConfig()))
+    print(f"Serving tutor sessions on http://{arguments.host}:{arguments.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()